@@ -27,13 +27,76 @@ from kivy.uix.image import Image
 import cv2
 import numpy as np
 import os
+import threading
+import time
 from datetime import datetime
+from frame_buffer import FrameRingBuffer, DROP_OLDEST
+from rate_controller import RateController
+from metrics import Metrics, metrics_port
+from detector_core import DetectorConfig, MotionDetector, STABILIZING
+from screenshot_writer import ScreenshotWriter
+from battery_monitor import BatteryMonitor
 
 class MotionDetectorApp(App):
     def build(self):
-        self.camera = None
-        self.background_subtractor = cv2.createBackgroundSubtractorMOG2()
         self.is_detecting = False
+        self.worker = None
+        self.stop_event = threading.Event()
+        self.display_event = None
+        
+        # Захват и детекция идут в рабочем потоке; UI получает через кольцевой
+        # буфер только готовые к показу кадры RGB и обновляет одну текстуру
+        self.display_buffer = None
+        self.display_frame = None
+        self.display_seq = 0
+        self.texture = None
+        
+        # 30 кадров/с при движении, 5 в простое; при разряженной батарее
+        # частоты снижаются по профилям BatteryMonitor
+        self.rate_controller = RateController(active_fps=30, idle_fps=5, pipelined=False)
+        self.battery_monitor = BatteryMonitor()
+        
+        # Камера снимает в уменьшенном разрешении - это дешевле и для захвата,
+        # и для перевода в RGB, и для текстуры
+        self.capture_width = 640
+        self.capture_height = 480
+        
+        # Скриншоты при движении - не чаще раза в screenshot_interval секунд;
+        # на Android - во внешнее хранилище (Pictures/Motion_Screenshots)
+        if platform == 'android':
+            request_permissions([Permission.CAMERA, Permission.WRITE_EXTERNAL_STORAGE])
+            pictures_path = os.path.join(primary_external_storage_path(), "Pictures")
+        else:
+            pictures_path = os.path.join(os.path.expanduser("~"), "Desktop")
+        self.screenshots_dir = os.path.join(pictures_path, "Motion_Screenshots")
+        self.save_screenshots = True
+        self.screenshot_interval = 3
+        self.last_screenshot_time = 0
+        self.status_text = None
+        
+        # Метрики этапов в формате Prometheus на http://127.0.0.1:9110/metrics;
+        # на Android сокету нужно разрешение INTERNET, поэтому сервер там
+        # не запускается. metrics_dump_path - JSON с метриками при выходе
+        self.metrics = Metrics()
+        self.metrics_port = None if platform == 'android' else metrics_port(9110)
+        self.metrics_dump_path = None
+        self.metrics.register_gauge("capture_fps", lambda: self.rate_controller.fps)
+        self.metrics.register_gauge("display_skipped", lambda: self.display_buffer.stats()["skipped"])
+        self.metrics.register_gauge("battery_percent", lambda: self.battery_monitor.percent)
+        if self.metrics_port:
+            self.metrics.start_server(self.metrics_port)
+        
+        # Детекция движения - общий детектор без GUI (detector_core); кадр
+        # с движением - кадр с объектом от 1% площади. На телефоне MOG2 и
+        # контуры считаются по кадру шириной 320 пикселей
+        self.motion_detector = MotionDetector(
+            DetectorConfig(min_area_ratio=0.01, aspect_min=0, aspect_max=None, extent_min=0,
+                           var_threshold=16, processing_width=320),
+            metrics=self.metrics)
+        
+        # Скриншоты кодируются и пишутся в фоне, чтобы диск не тормозил детекцию
+        self.screenshot_writer = ScreenshotWriter(fmt="jpg", quality=85, encoder_threads=1,
+                                                  metrics=self.metrics)
         
         layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
         
@@ -59,35 +122,173 @@ class MotionDetectorApp(App):
             self.stop_detection()
     
     def start_detection(self):
-        try:
-            self.camera = cv2.VideoCapture(0)
-            self.is_detecting = True
-            Clock.schedule_interval(self.process_frame, 1.0 / 30.0)  # 30 FPS
-        except Exception as e:
-            self.status_label.text = f'Ошибка: {str(e)}'
-            self.detection_switch.active = False
+        self.is_detecting = True
+        self.stop_event.clear()
+        self.rate_controller.reset()
+        self.motion_detector.reset()
+        self.display_seq = 0
+        self.last_screenshot_time = 0
+        self.status_text = None
+        self.battery_monitor.last_check = None
+        if self.save_screenshots:
+            try:
+                os.makedirs(self.screenshots_dir, exist_ok=True)
+            except OSError as e:
+                print(f"Не удалось создать папку для скриншотов: {e}")
+                self.save_screenshots = False
+        # Камера открывается в рабочем потоке - это тоже не должно блокировать UI
+        self.worker = threading.Thread(target=self.capture_loop, name="capture")
+        self.worker.daemon = True
+        self.worker.start()
+        self.display_event = Clock.schedule_interval(
+            self.update_display, 1.0 / self.rate_controller.active_fps)
     
     def stop_detection(self):
         self.is_detecting = False
-        if self.camera:
-            self.camera.release()
-            self.camera = None
+        self.stop_event.set()
+        if self.display_event is not None:
+            self.display_event.cancel()
+            self.display_event = None
+        if self.worker is not None:
+            self.worker.join(2.0)
+            self.worker = None
+    
+    def set_status(self, text):
+        """Обновляет строку состояния из рабочего потока (только при смене текста)"""
+        if text != self.status_text:
+            self.status_text = text
+            Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', text))
+    
+    def apply_power_profile(self):
+        """Подстраивает частоты кадров под заряд батареи"""
+        if not self.battery_monitor.poll():
+            return
+        active_fps, idle_fps = self.battery_monitor.current
+        self.rate_controller.active_fps = active_fps
+        self.rate_controller.idle_fps = idle_fps
+        battery = self.battery_monitor.stats()
+        print(f"Батарея: {battery['percent']}%, зарядка: {battery['charging']}, "
+              f"частота {active_fps}/{idle_fps} кадр/с")
     
-    def process_frame(self, dt):
-        if not self.is_detecting or not self.camera:
+    def on_motion(self, frame, motion_boxes, largest_area):
+        """Событие движения: строка состояния и скриншот (рабочий поток)"""
+        current_time = time.time()
+        if (not self.save_screenshots or
+                current_time - self.last_screenshot_time <= self.screenshot_interval):
+            self.set_status(f"Движение: {len(motion_boxes)} объект(ов)")
+            return
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Ставим кадр в очередь фоновой записи
+        screenshot_path = self.screenshot_writer.save(frame, self.screenshots_dir,
+                                                      f"motion_detected_{timestamp}")
+        self.last_screenshot_time = current_time
+        self.metrics.inc("motion_events")
+        self.set_status(f"ДВИЖЕНИЕ! Объект: {int(largest_area)} пикс")
+        print(f"Движение обнаружено! Размер объекта: {int(largest_area)} пикселей")
+        if screenshot_path:
+            print(f"Скриншот сохраняется: {os.path.basename(screenshot_path)}")
+        else:
+            print("Очередь записи переполнена, скриншот пропущен")
+    
+    def on_capture_error(self, message):
+        self.status_label.text = f'Ошибка: {message}'
+        self.detection_switch.active = False
+    
+    def capture_loop(self):
+        """Рабочий поток: захват, детекция и подготовка кадра к показу"""
+        try:
+            camera = cv2.VideoCapture(0)
+            if not camera.isOpened():
+                raise RuntimeError("камера недоступна")
+            camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.capture_width)
+            camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.capture_height)
+        except Exception as e:
+            Clock.schedule_once(lambda dt, message=str(e): self.on_capture_error(message))
             return
         
-        ret, frame = self.camera.read()
-        if ret:
-            # Обработка кадра
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            fg_mask = self.background_subtractor.apply(gray)
-            
-            # Конвертация для отображения в Kivy
-            buf = cv2.flip(frame, 0).tostring()
-            texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='bgr')
-            texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-            self.image.texture = texture
+        frame = None
+        try:
+            while not self.stop_event.is_set():
+                started = time.perf_counter()
+                lap = self.metrics.lap_timer()
+                motion = False
+                self.apply_power_profile()
+                # Кадр читается в один и тот же буфер
+                ret, frame = camera.read(frame)
+                lap("capture")
+                if ret:
+                    # Обработка кадра; этапы детектора он замеряет сам
+                    detection = self.motion_detector.detect(frame)
+                    motion = detection is not None
+                    lap.skip()
+                    if motion:
+                        self.on_motion(frame, *detection)
+                    elif self.motion_detector.state == STABILIZING:
+                        self.set_status("Стабилизация фона...")
+                    else:
+                        self.set_status("Движение не обнаружено")
+                    lap("event")
+                    
+                    # Перевод в RGB сразу пишет кадр в слот буфера показа
+                    if self.display_buffer is None:
+                        self.display_buffer = FrameRingBuffer(3, frame.shape, policy=DROP_OLDEST)
+                    self.display_buffer.ensure_shape(frame.shape)
+                    index, out = self.display_buffer.reserve()
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=out)
+                    # Рамки рисуются только на кадре для показа, скриншот остается чистым
+                    if motion:
+                        for x, y, w, h in detection[0]:
+                            cv2.rectangle(out, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                    self.display_buffer.commit(index)
+                    lap("prepare")
+                    self.metrics.mark_frame()
+                    if motion:
+                        self.metrics.inc("motion_frames")
+                else:
+                    self.metrics.inc("capture_failures")
+                    frame = None
+                
+                # Следующий кадр - с учетом времени обработки этого
+                elapsed = time.perf_counter() - started
+                self.metrics.observe("frame", elapsed)
+                self.rate_controller.record("frame", elapsed)
+                self.rate_controller.update(motion)
+                self.stop_event.wait(max(0, self.rate_controller.interval() - elapsed))
+        finally:
+            camera.release()
+    
+    def update_display(self, dt):
+        """Показывает новый кадр из рабочего потока (поток UI)"""
+        if self.display_buffer is None:
+            return
+        started = time.perf_counter()
+        result = self.display_buffer.get_latest(self.display_frame, self.display_seq, timeout=0)
+        if result is None:
+            return
+        self.display_frame, self.display_seq = result[:2]
+        
+        # Текстура создается один раз и обновляется на месте; кадр OpenCV
+        # идет сверху вниз, поэтому текстура переворачивается координатами
+        height, width = self.display_frame.shape[:2]
+        if self.texture is None or self.texture.size != (width, height):
+            self.texture = Texture.create(size=(width, height), colorfmt='rgb')
+            self.texture.flip_vertical()
+            self.image.texture = self.texture
+        self.texture.blit_buffer(self.display_frame.reshape(-1), colorfmt='rgb', bufferfmt='ubyte')
+        self.image.canvas.ask_update()
+        self.metrics.observe("display", time.perf_counter() - started)
+    
+    def on_stop(self):
+        self.stop_detection()
+        self.screenshot_writer.close()
+        print(f"Статистика записи скриншотов: {self.screenshot_writer.stats()}")
+        print(f"Батарея: {self.battery_monitor.stats()}")
+        self.metrics.stop_server()
+        if self.metrics_dump_path:
+            try:
+                self.metrics.dump_json(self.metrics_dump_path)
+            except OSError as e:
+                print(f"Не удалось сохранить метрики: {e}")
 
 if __name__ == '__main__':
     MotionDetectorApp().run()
@@ -7,17 +7,59 @@ import os
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
 import threading
+from frame_buffer import FrameRingBuffer, CaptureThread, DROP_OLDEST
+from screen_capture import create_backend
+from screenshot_writer import ScreenshotWriter
+from screenshot_index import ScreenshotIndex
+from event_recorder import EventRecorder
+from rate_controller import RateController
+from motion_pipeline import MotionPipeline
+from region_tracker import TRACKERS, create_tracker
+from detector_core import ACTIVE, IDLE, DetectorConfig, MotionDetector
+from metrics import Metrics, metrics_port
 
 class AdaptiveMotionDetectorScreen:
     def __init__(self):
-        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(
-            detectShadows=True, varThreshold=50, history=500)
-        self.min_contour_area = 5000
+        # Буфер серого кадра захвата (для отслеживания области и детекции)
+        self.motion_pipeline = MotionPipeline()
         self.last_screenshot_time = 0
         self.screenshot_interval = 3
         self.is_running = False
         self.frame_count = 0
         
+        # Параметры потока захвата
+        self.capture_fps = 20
+        self.frame_buffer_size = 4
+        self.frame_drop_policy = DROP_OLDEST
+        self.frame_buffer = None
+        self.capture_thread = None
+        
+        # Частота захвата подстраивается под движение и время обработки:
+        # capture_fps при движении, idle_fps после idle_after секунд простоя
+        self.idle_fps = 4
+        self.idle_after = 5.0
+        self.rate_controller = RateController(active_fps=self.capture_fps, idle_fps=self.idle_fps,
+                                              idle_after=self.idle_after)
+        
+        # Время этапов, частота кадров и глубина очередей отдаются в формате
+        # Prometheus на http://127.0.0.1:<metrics_port>/metrics (None - без
+        # сервера); если задан metrics_dump_path, при выходе сохраняется JSON.
+        # У каждого интерфейса свой порт, чтобы их можно было запустить вместе
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port(9108)
+        self.metrics_dump_path = None
+        
+        # Параметры и конвейер детекции движения общие для всех интерфейсов
+        # (detector_core); минимальная площадь объекта - доля площади области,
+        # детекция идет на копии шириной не больше processing_width
+        self.detector_config = DetectorConfig(min_area_ratio=0.02, processing_width=640,
+                                              aspect_min=0.2, aspect_max=5.0, extent_min=0.3)
+        self.motion_detector = MotionDetector(self.detector_config, metrics=self.metrics)
+        
+        # Источник захвата экрана: auto, xshm, pyautogui или synthetic
+        self.capture_backend_name = "auto"
+        self.capture_backend = create_backend(self.capture_backend_name)
+        
         # Параметры для адаптивного отслеживания
         self.adaptive_tracking = True
         self.template_update_interval = 30  # Обновляем шаблон каждые 30 кадров
@@ -27,21 +69,53 @@ class AdaptiveMotionDetectorScreen:
         self.tracking_confidence_threshold = 0.6
         self.max_region_drift = 100  # Максимальное смещение области за раз
         
+        # Трекер области (region_tracker.TRACKERS): pyramid - шаблон от
+        # грубого к точному, phase - фазовая корреляция, orb - ключевые точки
+        # со сдвигом и масштабом. Поиск дешевый, поэтому область отслеживается
+        # каждые tracking_interval кадров (1 - на каждом кадре)
+        self.tracker_name = "pyramid"
+        self.region_tracker = create_tracker(self.tracker_name, metrics=self.metrics)
+        self.tracking_interval = 1
+        self.tracking_failures = 0
+        # Область последнего обработанного кадра (для сдвига модели фона)
+        self.detection_region = None
+        
         # Сохраняем оригинальную область
         self.original_capture_region = None
         self.capture_region = None
         
-        # Инициализация параметров фильтрации
-        self.aspect_min = 0.2
-        self.aspect_max = 5.0
-        self.extent_min = 0.3
-        
         # Создаем папку для скриншотов
         desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
         self.screenshots_dir = os.path.join(desktop_path, "Motion_Screenshots")
         if not os.path.exists(self.screenshots_dir):
             os.makedirs(self.screenshots_dir)
         
+        # Скриншоты кодируются и пишутся в фоне, чтобы диск не тормозил детекцию
+        self.screenshot_format = "jpg"
+        self.screenshot_quality = 90
+        
+        # Вместо одиночных скриншотов записываются клипы: pre_roll секунд до
+        # движения и post_roll секунд после него
+        self.record_clips = True
+        self.pre_roll = 3.0
+        self.post_roll = 3.0
+        self.clip_extension = ".mp4"
+        
+        # Счетчик скриншотов ведется в памяти: папка сканируется один раз,
+        # дальше индекс обновляет запись скриншотов и наблюдатель за папкой
+        self.watch_screenshots_dir = True
+        self.screenshot_index = ScreenshotIndex(self.screenshots_dir,
+                                                ("." + self.screenshot_format, self.clip_extension),
+                                                watch=self.watch_screenshots_dir)
+        self.shown_screenshot_count = None
+        self.screenshot_writer = ScreenshotWriter(fmt=self.screenshot_format,
+                                                  quality=self.screenshot_quality,
+                                                  on_saved=self.screenshot_index.add,
+                                                  metrics=self.metrics)
+        self.event_recorder = EventRecorder(fps=self.capture_fps, pre_roll=self.pre_roll,
+                                            post_roll=self.post_roll, extension=self.clip_extension,
+                                            on_saved=self.screenshot_index.add)
+        
         self.setup_gui()
     
     def setup_gui(self):
@@ -122,14 +196,23 @@ class AdaptiveMotionDetectorScreen:
         self.max_drift_var = tk.StringVar(value=str(self.max_region_drift))
         tk.Entry(adaptive_tab, textvariable=self.max_drift_var, width=10).pack(pady=5)
         
+        tk.Label(adaptive_tab, text="Трекер области:").pack(pady=5)
+        self.tracker_var = tk.StringVar(value=self.tracker_name)
+        ttk.Combobox(adaptive_tab, textvariable=self.tracker_var, width=10, state="readonly",
+                     values=list(TRACKERS)).pack(pady=5)
+        
         # Расширенные настройки
-        tk.Label(advanced_tab, text="Чувствительность (площадь объекта):").pack(pady=5)
-        self.sensitivity_var = tk.StringVar(value=str(self.min_contour_area))
+        tk.Label(advanced_tab, text="Чувствительность (площадь объекта, % области):").pack(pady=5)
+        self.sensitivity_var = tk.StringVar(value=str(self.detector_config.min_area_ratio * 100))
         tk.Entry(advanced_tab, textvariable=self.sensitivity_var, width=10).pack(pady=5)
         
+        tk.Label(advanced_tab, text="Ширина кадра для детекции (0 - исходная):").pack(pady=5)
+        self.processing_width_var = tk.StringVar(value=str(self.detector_config.processing_width))
+        tk.Entry(advanced_tab, textvariable=self.processing_width_var, width=10).pack(pady=5)
+        
         tk.Label(advanced_tab, text="Фильтр по соотношению сторон (min-max):").pack(pady=5)
-        self.aspect_min_var = tk.StringVar(value=str(self.aspect_min))
-        self.aspect_max_var = tk.StringVar(value=str(self.aspect_max))
+        self.aspect_min_var = tk.StringVar(value=str(self.detector_config.aspect_min))
+        self.aspect_max_var = tk.StringVar(value=str(self.detector_config.aspect_max))
         aspect_frame = tk.Frame(advanced_tab)
         aspect_frame.pack()
         tk.Entry(aspect_frame, textvariable=self.aspect_min_var, width=5).pack(side=tk.LEFT)
@@ -137,9 +220,17 @@ class AdaptiveMotionDetectorScreen:
         tk.Entry(aspect_frame, textvariable=self.aspect_max_var, width=5).pack(side=tk.LEFT)
         
         tk.Label(advanced_tab, text="Минимальный экстент (0-1):").pack(pady=5)
-        self.extent_min_var = tk.StringVar(value=str(self.extent_min))
+        self.extent_min_var = tk.StringVar(value=str(self.detector_config.extent_min))
         tk.Entry(advanced_tab, textvariable=self.extent_min_var, width=5).pack(pady=5)
         
+        self.record_clips_var = tk.BooleanVar(value=self.record_clips)
+        tk.Checkbutton(advanced_tab, text="Записывать клипы вместо скриншотов",
+                      variable=self.record_clips_var).pack(pady=5)
+        
+        self.prefilter_var = tk.BooleanVar(value=self.detector_config.prefilter)
+        tk.Checkbutton(advanced_tab, text="Быстрый предфильтр движения",
+                      variable=self.prefilter_var).pack(pady=5)
+        
         tk.Button(adaptive_tab, text="Применить настройки", 
                  command=self.apply_adaptive_settings).pack(pady=10)
         
@@ -197,23 +288,33 @@ class AdaptiveMotionDetectorScreen:
             self.search_margin = int(self.search_margin_var.get())
             self.tracking_confidence_threshold = float(self.confidence_var.get())
             self.max_region_drift = int(self.max_drift_var.get())
+            self.set_tracker(self.tracker_var.get())
             
             messagebox.showinfo("Успешно", 
                               f"Настройки адаптивного отслеживания применены:\n"
                               f"Отслеживание: {'Вкл' if self.adaptive_tracking else 'Выкл'}\n"
                               f"Интервал обновления: {self.template_update_interval}\n"
                               f"Область поиска: ±{self.search_margin} пикс\n"
-                              f"Порог уверенности: {self.tracking_confidence_threshold}")
+                              f"Порог уверенности: {self.tracking_confidence_threshold}\n"
+                              f"Трекер: {self.tracker_name}")
         except ValueError:
             messagebox.showerror("Ошибка", "Введите корректные числовые значения")
     
     def apply_settings(self):
         """Применяет расширенные настройки"""
         try:
-            self.min_contour_area = int(self.sensitivity_var.get())
-            self.aspect_min = float(self.aspect_min_var.get())
-            self.aspect_max = float(self.aspect_max_var.get())
-            self.extent_min = float(self.extent_min_var.get())
+            # При смене ширины обработки или предфильтра детектор заново
+            # строит модель фона и проходит стабилизацию
+            self.motion_detector.configure(
+                min_area_ratio=float(self.sensitivity_var.get()) / 100,
+                processing_width=int(self.processing_width_var.get()),
+                aspect_min=float(self.aspect_min_var.get()),
+                aspect_max=float(self.aspect_max_var.get()),
+                extent_min=float(self.extent_min_var.get()),
+                prefilter=self.prefilter_var.get())
+            self.record_clips = self.record_clips_var.get()
+            if not self.record_clips:
+                self.event_recorder.end_clip()
             
             messagebox.showinfo("Успешно", "Расширенные настройки применены!")
         except ValueError:
@@ -233,78 +334,131 @@ class AdaptiveMotionDetectorScreen:
         if self.capture_region is None:
             return None
         
-        x, y, w, h = self.capture_region
-        screenshot = pyautogui.screenshot(region=(x, y, w, h))
-        frame = np.array(screenshot)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        return frame
+        return self.capture_backend.grab(self.capture_region)
+    
+    def get_capture_rect(self, region):
+        """Прямоугольник единого захвата: область плюс поля для поиска шаблона"""
+        if not self.adaptive_tracking:
+            return region
+        
+        x, y, w, h = region
+        return (max(0, x - self.search_margin), max(0, y - self.search_margin),
+                w + 2 * self.search_margin, h + 2 * self.search_margin)
+    
+    def grab_frame_into(self, out):
+        """Захватывает кадр в буфер out (выполняется в потоке захвата).
+        
+        Захватывается область вместе с полями поиска, поэтому за итерацию
+        нужен ровно один снимок экрана. Возвращает метаданные слота:
+        (захваченный прямоугольник, область детекции).
+        """
+        region = self.capture_region
+        if region is None:
+            return False
+        
+        capture_rect = self.get_capture_rect(region)
+        x, y, w, h = capture_rect
+        if out.shape[:2] != (h, w):
+            # Размер захвата изменился - перевыделяем буфер
+            self.frame_buffer.ensure_shape((h, w, 3))
+            return False
+        
+        # Источник пишет кадр прямо в слот буфера, без промежуточных копий
+        if not self.capture_backend.grab_into(capture_rect, out):
+            return False
+        return capture_rect, region
+    
+    def region_views(self, wide_frame, wide_gray, capture_rect, region):
+        """Возвращает срезы (BGR, серый) области внутри общего захвата или None"""
+        x, y, w, h = region
+        offset_x = x - capture_rect[0]
+        offset_y = y - capture_rect[1]
+        if (offset_x < 0 or offset_y < 0 or
+                offset_x + w > capture_rect[2] or offset_y + h > capture_rect[3]):
+            return None
+        
+        rows = slice(offset_y, offset_y + h)
+        cols = slice(offset_x, offset_x + w)
+        return wide_frame[rows, cols], wide_gray[rows, cols]
     
-    def update_region_template(self, frame):
+    def update_region_template(self, gray):
         """Обновляет шаблон для отслеживания области"""
-        # Используем центральную часть кадра как шаблон
-        h, w = frame.shape[:2]
+        # Используем центральную часть кадра (в градациях серого) как шаблон
+        h, w = gray.shape[:2]
         center_h, center_w = h // 4, w // 4
-        template = frame[center_h:h-center_h, center_w:w-center_w]
-        
-        # Конвертируем в градации серого для лучшего matching
-        self.region_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+        self.region_template = gray[center_h:h-center_h, center_w:w-center_w].copy()
+        self.region_tracker.set_template(self.region_template)
     
-    def track_region(self):
-        """Отслеживает и корректирует положение области захвата"""
-        if not self.adaptive_tracking or self.region_template is None:
+    def set_tracker(self, name):
+        """Переключает трекер области; текущий шаблон переходит к новому"""
+        if name == self.tracker_name:
             return
+        tracker = create_tracker(name, metrics=self.metrics)
+        if self.region_template is not None:
+            tracker.set_template(self.region_template)
+        self.tracker_name = name
+        self.region_tracker = tracker
+        self.tracking_failures = 0
+    
+    def track_region(self, search_gray, capture_rect, region):
+        """Отслеживает и корректирует положение области захвата.
+        
+        search_gray - захват области с полями поиска в градациях серого.
+        Возвращает новую область или None, если смещения нет.
+        """
+        if not self.adaptive_tracking or self.region_template is None:
+            return None
         
-        # Делаем скриншот большей области для поиска
-        x, y, w, h = self.capture_region
-        search_x = max(0, x - self.search_margin)
-        search_y = max(0, y - self.search_margin)
-        search_w = w + 2 * self.search_margin
-        search_h = h + 2 * self.search_margin
+        x, y, w, h = region
+        search_x, search_y = capture_rect[:2]
         
         try:
-            search_screenshot = pyautogui.screenshot(region=(search_x, search_y, search_w, search_h))
-            search_frame = np.array(search_screenshot)
-            search_frame = cv2.cvtColor(search_frame, cv2.COLOR_RGB2BGR)
-            search_gray = cv2.cvtColor(search_frame, cv2.COLOR_BGR2GRAY)
-            
-            # Ищем шаблон в области поиска
-            result = cv2.matchTemplate(search_gray, self.region_template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            # Первая догадка - положение шаблона при текущей области (предыдущее
+            # найденное смещение); после неудачи ищем по всей области поиска
+            prior = None
+            if not self.tracking_failures:
+                prior = (x - search_x + w // 4, y - search_y + h // 4)
+            found = self.region_tracker.locate(search_gray, prior)
             
             # Если найдено хорошее совпадение
-            if max_val > self.tracking_confidence_threshold:
-                # Вычисляем новые координаты
-                template_h, template_w = self.region_template.shape
-                new_x_offset = max_loc[0]
-                new_y_offset = max_loc[1]
+            if found is None or found[2] <= self.tracking_confidence_threshold:
+                self.tracking_failures += 1
+                self.metrics.inc("tracking_failures")
+                return None
+            self.tracking_failures = 0
+            
+            # Центр шаблона (с учетом масштаба) - центр области; размер
+            # области не меняется, чтобы не пересоздавать буферы и модель фона
+            new_x_offset, new_y_offset, _, scale = found
+            template_h, template_w = self.region_template.shape
+            center_x = search_x + new_x_offset + template_w * scale / 2
+            center_y = search_y + new_y_offset + template_h * scale / 2
+            new_x = int(round(center_x - w / 2))
+            new_y = int(round(center_y - h / 2))
+            
+            # Ограничиваем максимальное смещение
+            drift_x = new_x - x
+            drift_y = new_y - y
+            
+            if abs(drift_x) <= self.max_region_drift and abs(drift_y) <= self.max_region_drift:
+                # Плавное смещение (используем только часть найденного смещения)
+                smooth_factor = 0.3
+                final_x = int(x + drift_x * smooth_factor)
+                final_y = int(y + drift_y * smooth_factor)
                 
-                # Переводим в глобальные координаты
-                new_x = search_x + new_x_offset - w//4  # Корректируем на смещение шаблона
-                new_y = search_y + new_y_offset - h//4
+                self.capture_region = (final_x, final_y, w, h)
                 
-                # Ограничиваем максимальное смещение
-                drift_x = new_x - x
-                drift_y = new_y - y
+                # Обновляем информацию о смещении в GUI
+                total_drift_x = final_x - self.original_capture_region[0]
+                total_drift_y = final_y - self.original_capture_region[1]
+                self.root.after(0, self.update_drift_info, total_drift_x, total_drift_y)
                 
-                if abs(drift_x) <= self.max_region_drift and abs(drift_y) <= self.max_region_drift:
-                    # Плавное смещение (используем только часть найденного смещения)
-                    smooth_factor = 0.3
-                    final_x = int(x + drift_x * smooth_factor)
-                    final_y = int(y + drift_y * smooth_factor)
-                    
-                    self.capture_region = (final_x, final_y, w, h)
-                    
-                    # Обновляем информацию о смещении в GUI
-                    total_drift_x = final_x - self.original_capture_region[0]
-                    total_drift_y = final_y - self.original_capture_region[1]
-                    self.root.after(0, self.update_drift_info, total_drift_x, total_drift_y)
-                    
-                    return True
+                return self.capture_region
         
         except Exception as e:
             print(f"Ошибка при отслеживании области: {e}")
         
-        return False
+        return None
     
     def update_drift_info(self, drift_x, drift_y):
         """Обновляет информацию о смещении области"""
@@ -312,84 +466,115 @@ class AdaptiveMotionDetectorScreen:
     
     def detect_motion(self):
         """Основной цикл детекции движения с адаптивным отслеживанием"""
+        wide_frame = None
+        last_seq = 0
         while self.is_running:
             try:
-                frame = self.capture_screen_region()
-                if frame is None:
-                    time.sleep(0.1)
+                # Берем самый свежий кадр, более старые отбрасываются
+                result = self.frame_buffer.get_latest(wide_frame, last_seq, timeout=0.5)
+                if result is None:
                     continue
+                wide_frame, last_seq, frame_time, (capture_rect, region) = result
+                processing_started = time.perf_counter()
+                motion_detected = False
+                self.metrics.observe("frame_age", time.time() - frame_time)
+                lap = self.metrics.lap_timer()
+                
+                # Кадр области и область поиска шаблона - срезы одного захвата
+                wide_gray = self.motion_pipeline.gray(wide_frame)
+                lap("gray")
+                views = self.region_views(wide_frame, wide_gray, capture_rect, region)
+                if views is None:
+                    continue
+                frame, gray = views
                 
                 self.frame_count += 1
                 self.template_update_counter += 1
                 
-                # Обновляем шаблон для отслеживания
+                # Обновляем шаблон для отслеживания. Пока в области есть
+                # движение, обновление откладывается: иначе шаблон захватывает
+                # движущийся объект и область начинает за ним "уплывать"
                 if (self.adaptive_tracking and 
                     (self.region_template is None or 
-                     self.template_update_counter >= self.template_update_interval)):
-                    self.update_region_template(frame)
+                     (self.template_update_counter >= self.template_update_interval and
+                      self.motion_detector.state != ACTIVE))):
+                    self.update_region_template(gray)
                     self.template_update_counter = 0
                 
                 # Выполняем отслеживание области
-                if self.frame_count > 30 and self.frame_count % 5 == 0:  # Каждые 5 кадров
-                    tracking_success = self.track_region()
-                    if tracking_success:
-                        # Получаем обновленный кадр после корректировки области
-                        frame = self.capture_screen_region()
-                        if frame is None:
+                if self.frame_count > 30 and self.frame_count % self.tracking_interval == 0:
+                    new_region = self.track_region(wide_gray, capture_rect, region)
+                    if new_region is not None:
+                        # Берем срез скорректированной области из того же захвата
+                        views = self.region_views(wide_frame, wide_gray,
+                                                  capture_rect, new_region)
+                        if views is None:
                             continue
+                        frame, gray = views
+                        region = new_region
                 
-                # Применяем детекцию движения после стабилизации
-                if self.frame_count > 30:
-                    # Конвертируем в grayscale для более стабильной обработки
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    
-                    # Применяем Gaussian blur для уменьшения шума
-                    blurred = cv2.GaussianBlur(gray, (21, 21), 0)
-                    
-                    fg_mask = self.background_subtractor.apply(blurred)
-                    
-                    # Убираем шум
-                    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-                    fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_CLOSE, kernel)
-                    fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, kernel)
-                    
-                    # Находим контуры
-                    contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, 
-                                                 cv2.CHAIN_APPROX_SIMPLE)
-                    
-                    # Проверяем наличие крупного движения с дополнительными критериями
-                    motion_detected = False
-                    largest_area = 0
+                # Область сместилась (отслеживание или сброс) - модель фона
+                # сдвигается вместе с ней, иначе весь кадр выглядит как движение
+                if self.detection_region is not None and region[:2] != self.detection_region[:2]:
+                    self.motion_detector.shift(region[0] - self.detection_region[0],
+                                               region[1] - self.detection_region[1])
+                self.detection_region = region
+                
+                lap("tracking")
+                
+                # Кадр области попадает в буфер предзаписи или в текущий клип
+                if self.record_clips:
+                    self.event_recorder.push(frame, frame_time)
+                    lap("clip_buffer")
+                
+                # Детекция движения общим детектором без GUI: уменьшенная копия
+                # области, предфильтр, MOG2, морфология и фильтр контуров по форме
+                detection = self.motion_detector.detect_gray(gray)
+                # Этапы детектора он замеряет сам
+                lap.skip()
+                
+                if self.motion_detector.state == IDLE:
+                    # Сцена неподвижна: MOG2 только изредка обновляет фон
+                    self.metrics.inc("prefilter_skipped")
+                    status_text = "Ожидание движения..."
+                    if self.adaptive_tracking:
+                        status_text += " [Отслеживание активно]"
+                    self.root.after(0, self.update_status, status_text)
+                
+                # Детекция движения после стабилизации
+                elif self.motion_detector.state == ACTIVE:
+                    # Площадь и области движения - в координатах исходного кадра
+                    motion_detected = detection is not None
+                    largest_area = detection[1] if motion_detected else 0
                     
-                    for contour in contours:
-                        area = cv2.contourArea(contour)
-                        
-                        if area > self.min_contour_area:
-                            # Вычисляем соотношение сторон bounding box
-                            x, y, w, h = cv2.boundingRect(contour)
-                            aspect_ratio = w / h if h > 0 else 0
-                            
-                            # Вычисляем экстент
-                            rect_area = w * h
-                            extent = float(area) / rect_area if rect_area > 0 else 0
-                            
-                            # Фильтруем по форме и экстенту
-                            if (self.aspect_min < aspect_ratio < self.aspect_max and 
-                                extent > self.extent_min):
-                                motion_detected = True
-                                largest_area = max(largest_area, area)
+                    # Каждый кадр с движением продлевает текущий клип,
+                    # новый клип начинается только после завершения текущего
+                    clip_path = None
+                    if motion_detected and self.record_clips:
+                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                        clip_path = self.event_recorder.trigger(self.screenshots_dir,
+                                                                f"motion_{timestamp}", frame_time)
                     
                     # Делаем скриншот при обнаружении движения
                     current_time = time.time()
-                    if (motion_detected and 
-                        (current_time - self.last_screenshot_time) > self.screenshot_interval):
+                    if clip_path is not None:
+                        status_text = f"ДВИЖЕНИЕ! Объект: {int(largest_area)} пикс"
+                        if self.adaptive_tracking:
+                            status_text += " [Адаптивное отслеживание]"
+                        
+                        self.root.after(0, self.update_status, status_text)
+                        print(f"Движение обнаружено! Размер объекта: {int(largest_area)} пикселей")
+                        print(f"Записывается клип: {os.path.basename(clip_path)}")
+                    
+                    elif (motion_detected and not self.record_clips and
+                          (current_time - self.last_screenshot_time) > self.screenshot_interval):
                         
                         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        screenshot_filename = f"motion_detected_{timestamp}.jpg"
-                        screenshot_path = os.path.join(self.screenshots_dir, screenshot_filename)
+                        screenshot_filename = f"motion_detected_{timestamp}"
                         
-                        # Сохраняем полный скриншот области
-                        cv2.imwrite(screenshot_path, frame)
+                        # Ставим полный скриншот области в очередь фоновой записи
+                        screenshot_path = self.screenshot_writer.save(frame, self.screenshots_dir,
+                                                                      screenshot_filename)
                         
                         self.last_screenshot_time = current_time
                         
@@ -401,10 +586,16 @@ class AdaptiveMotionDetectorScreen:
                         # Обновляем GUI в основном потоке
                         self.root.after(0, self.update_status, status_text)
                         print(f"Движение обнаружено! Размер объекта: {int(largest_area)} пикселей")
-                        print(f"Скриншот сохранен: {screenshot_filename}")
+                        if screenshot_path:
+                            print(f"Скриншот сохраняется: {os.path.basename(screenshot_path)}")
+                        else:
+                            print("Очередь записи переполнена, скриншот пропущен")
                     
                     elif motion_detected:
-                        status_text = "Движение (недавний скриншот)"
+                        if self.record_clips:
+                            status_text = "Движение (запись клипа)"
+                        else:
+                            status_text = "Движение (недавний скриншот)"
                         if self.adaptive_tracking:
                             status_text += " [Отслеживание]"
                         self.root.after(0, self.update_status, status_text)
@@ -416,19 +607,30 @@ class AdaptiveMotionDetectorScreen:
                 
                 else:
                     # Стабилизация фона
-                    self.background_subtractor.apply(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
                     self.root.after(0, self.update_status, 
-                                  f"Стабилизация... {30 - self.frame_count}")
+                                  f"Стабилизация... {self.motion_detector.stabilization_left}")
                 
-                # Обновляем счетчик скриншотов
-                try:
-                    screenshot_count = len([f for f in os.listdir(self.screenshots_dir) 
-                                          if f.endswith('.jpg')])
+                # Сохранение, клипы и обновление статуса
+                lap("events")
+                
+                # Обновляем счетчик скриншотов, только если он изменился
+                screenshot_count = self.screenshot_index.count
+                if screenshot_count != self.shown_screenshot_count:
+                    self.shown_screenshot_count = screenshot_count
                     self.root.after(0, self.update_counter, screenshot_count)
-                except:
-                    pass
                 
-                time.sleep(0.1)  # Небольшая задержка
+                # Подстраиваем частоту захвата под движение и время этапов
+                capture_thread = self.capture_thread
+                if capture_thread is not None:
+                    self.rate_controller.record("capture", capture_thread.grab_seconds)
+                    self.rate_controller.record("processing",
+                                                time.perf_counter() - processing_started)
+                    capture_thread.fps = self.rate_controller.update(motion_detected)
+                
+                self.metrics.observe("frame", time.perf_counter() - processing_started)
+                self.metrics.mark_frame()
+                if motion_detected:
+                    self.metrics.inc("motion_frames")
                 
             except Exception as e:
                 print(f"Ошибка в детекции: {e}")
@@ -452,7 +654,18 @@ class AdaptiveMotionDetectorScreen:
             
             self.is_running = True
             self.frame_count = 0
+            self.motion_detector.reset()
+            self.detection_region = None
+            self.rate_controller.reset()
             self.template_update_counter = 0
+            
+            # Запускаем поток захвата с кольцевым буфером кадров
+            x, y, w, h = self.get_capture_rect(self.capture_region)
+            self.frame_buffer = FrameRingBuffer(self.frame_buffer_size, (h, w, 3),
+                                                policy=self.frame_drop_policy)
+            self.capture_thread = CaptureThread(self.frame_buffer, self.grab_frame_into,
+                                                fps=self.capture_fps, metrics=self.metrics)
+            self.capture_thread.start()
             self.start_button.config(text="Остановить детекцию", bg="lightcoral")
             
             # Запускаем детекцию в отдельном потоке
@@ -467,16 +680,62 @@ class AdaptiveMotionDetectorScreen:
             
         else:
             self.is_running = False
+            self.event_recorder.end_clip()
+            if self.capture_thread is not None:
+                self.capture_thread.stop()
+                self.capture_thread = None
+                print(f"Статистика буфера кадров: {self.frame_buffer.stats()}")
+                print(f"Статистика детектора: {self.motion_detector.stats()}")
+                print(f"Статистика отслеживания: {self.region_tracker.stats()}")
+                print(f"Статистика частоты кадров: {self.rate_controller.stats()}")
             self.start_button.config(text="Запустить детекцию", bg="lightgreen")
             self.status_label.config(text="Остановлено")
             print("Детекция движения остановлена")
     
+    def start_metrics(self):
+        """Регистрирует глубину очередей и потери кадров, запускает сервер метрик"""
+        # Пока детекция не запущена, буфера кадров и потока захвата нет -
+        # такие значения просто не попадают в выдачу
+        gauges = {
+            "frame_buffer_pending": lambda: self.frame_buffer.stats()["pending"],
+            "frame_buffer_dropped": lambda: self.frame_buffer.stats()["dropped"],
+            "frame_buffer_skipped": lambda: self.frame_buffer.stats()["skipped"],
+            "capture_fps": lambda: self.capture_thread.fps,
+            "screenshot_queue_depth": lambda: self.screenshot_writer.stats()["depth"],
+            "screenshots_dropped": lambda: self.screenshot_writer.stats()["dropped"],
+            "clip_frames_buffered": lambda: self.event_recorder.stats()["buffered"],
+            "clip_frames_dropped": lambda: self.event_recorder.stats()["dropped"],
+        }
+        for name, fn in gauges.items():
+            self.metrics.register_gauge(name, fn)
+        if self.metrics_port:
+            self.metrics.start_server(self.metrics_port)
+    
+    def stop_metrics(self):
+        """Останавливает сервер метрик и при необходимости сохраняет их в JSON"""
+        self.metrics.stop_server()
+        if self.metrics_dump_path:
+            try:
+                self.metrics.dump_json(self.metrics_dump_path)
+                print(f"Метрики сохранены в {self.metrics_dump_path}")
+            except OSError as e:
+                print(f"Не удалось сохранить метрики: {e}")
+    
     def run(self):
         """Запускает приложение"""
         print("Adaptive Motion Detector - Screen Capture")
         print("Папка для скриншотов:", self.screenshots_dir)
         print("Адаптивное отслеживание области: ВКЛ")
+        self.start_metrics()
         self.root.mainloop()
+        
+        # Дописываем скриншоты, оставшиеся в очереди
+        self.screenshot_writer.close()
+        self.event_recorder.close()
+        self.screenshot_index.close()
+        print(f"Статистика записи скриншотов: {self.screenshot_writer.stats()}")
+        print(f"Статистика записи клипов: {self.event_recorder.stats()}")
+        self.stop_metrics()
 
 if __name__ == "__main__":
     # Устанавливаем fail-safe для pyautogui
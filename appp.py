@@ -7,17 +7,62 @@ import os
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
 import threading
-import urllib.request
+from frame_buffer import FrameRingBuffer, CaptureThread, DROP_OLDEST
+from screen_capture import create_backend
+from screenshot_writer import ScreenshotWriter
+from screenshot_index import ScreenshotIndex
+from event_recorder import EventRecorder
+from rate_controller import RateController
+from motion_pipeline import MotionPipeline
+from region_tracker import TRACKERS, create_tracker
+from detector_core import ACTIVE, IDLE, DetectorConfig, MotionDetector, ObjectDetector
+from metrics import Metrics, metrics_port
+from inference_pool import InferencePool
+from model_cache import BackgroundLoader, ModelCache
+from yolo_detector import INPUT_SIZES, YoloEngine, autotune
 
 class AdaptiveMotionDetectorScreen:
     def __init__(self):
-        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(
-            detectShadows=True, varThreshold=50, history=500)
-        self.min_contour_area = 5000
+        # Буфер серого кадра захвата (для отслеживания области и детекции)
+        self.motion_pipeline = MotionPipeline()
         self.last_screenshot_time = 0
         self.screenshot_interval = 3
         self.is_running = False
         self.frame_count = 0
+        
+        # Параметры потока захвата
+        self.capture_fps = 20
+        self.frame_buffer_size = 4
+        self.frame_drop_policy = DROP_OLDEST
+        self.frame_buffer = None
+        self.capture_thread = None
+        
+        # Частота захвата подстраивается под движение и время обработки:
+        # capture_fps при движении, idle_fps после idle_after секунд простоя
+        self.idle_fps = 4
+        self.idle_after = 5.0
+        self.rate_controller = RateController(active_fps=self.capture_fps, idle_fps=self.idle_fps,
+                                              idle_after=self.idle_after)
+        
+        # Время этапов, частота кадров и глубина очередей отдаются в формате
+        # Prometheus на http://127.0.0.1:<metrics_port>/metrics (None - без
+        # сервера); если задан metrics_dump_path, при выходе сохраняется JSON.
+        # У каждого интерфейса свой порт, чтобы их можно было запустить вместе
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port(9109)
+        self.metrics_dump_path = None
+        
+        # Параметры и конвейер детекции движения общие для всех интерфейсов
+        # (detector_core); минимальная площадь объекта - доля площади области,
+        # детекция идет на копии шириной не больше processing_width
+        self.detector_config = DetectorConfig(min_area_ratio=0.02, processing_width=640,
+                                              aspect_min=0.2, aspect_max=5.0, extent_min=0.3)
+        self.motion_detector = MotionDetector(self.detector_config, metrics=self.metrics)
+        
+        # Источник захвата экрана: auto, xshm, pyautogui или synthetic
+        self.capture_backend_name = "auto"
+        self.capture_backend = create_backend(self.capture_backend_name)
+        
         self.use_object_detection = True
         
         # Параметры для адаптивного отслеживания
@@ -29,23 +74,69 @@ class AdaptiveMotionDetectorScreen:
         self.tracking_confidence_threshold = 0.6
         self.max_region_drift = 100
         
+        # Трекер области (region_tracker.TRACKERS): pyramid - шаблон от
+        # грубого к точному, phase - фазовая корреляция, orb - ключевые точки
+        # со сдвигом и масштабом. Поиск дешевый, поэтому область отслеживается
+        # каждые tracking_interval кадров (1 - на каждом кадре)
+        self.tracker_name = "pyramid"
+        self.region_tracker = create_tracker(self.tracker_name, metrics=self.metrics)
+        self.tracking_interval = 1
+        self.tracking_failures = 0
+        # Область последнего обработанного кадра (для сдвига модели фона)
+        self.detection_region = None
+        
         # Сохраняем оригинальную область
         self.original_capture_region = None
         self.capture_region = None
         
-        # Инициализация параметров фильтрации
-        self.aspect_min = 0.2
-        self.aspect_max = 5.0
-        self.extent_min = 0.3
         self.min_confidence = 0.5
         self.selected_classes = ['person', 'car', 'bicycle', 'motorcycle', 'bus', 'truck']
         
+        # Распознавание только в областях движения (ROI)
+        self.roi_detection = True
+        self.roi_padding = 32
+        self.roi_min_size = 96
+        self.roi_max_count = 4
+        
+        # Параметры движка распознавания (auto - подобрать замером при запуске)
+        self.dnn_backend = "auto"
+        self.dnn_precision = "fp32"
+        self.dnn_input_size = 416
+        self.dnn_threads = 0
+        self.dnn_latency_budget = None
+        
         # Создаем папку для скриншотов
         desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
         self.screenshots_dir = os.path.join(desktop_path, "Motion_Screenshots")
         if not os.path.exists(self.screenshots_dir):
             os.makedirs(self.screenshots_dir)
         
+        # Скриншоты кодируются и пишутся в фоне, чтобы диск не тормозил детекцию
+        self.screenshot_format = "jpg"
+        self.screenshot_quality = 90
+        
+        # Вместо одиночных скриншотов записываются клипы: pre_roll секунд до
+        # движения и post_roll секунд после него
+        self.record_clips = True
+        self.pre_roll = 3.0
+        self.post_roll = 3.0
+        self.clip_extension = ".mp4"
+        
+        # Счетчик скриншотов ведется в памяти: папка сканируется один раз,
+        # дальше индекс обновляет запись скриншотов и наблюдатель за папкой
+        self.watch_screenshots_dir = True
+        self.screenshot_index = ScreenshotIndex(self.screenshots_dir,
+                                                ("." + self.screenshot_format, self.clip_extension),
+                                                watch=self.watch_screenshots_dir)
+        self.shown_screenshot_count = None
+        self.screenshot_writer = ScreenshotWriter(fmt=self.screenshot_format,
+                                                  quality=self.screenshot_quality,
+                                                  on_saved=self.screenshot_index.add,
+                                                  metrics=self.metrics)
+        self.event_recorder = EventRecorder(fps=self.capture_fps, pre_roll=self.pre_roll,
+                                            post_roll=self.post_roll, extension=self.clip_extension,
+                                            on_saved=self.screenshot_index.add)
+        
         # Загружаем классы COCO
         self.classes = []
         try:
@@ -56,44 +147,80 @@ class AdaptiveMotionDetectorScreen:
             print("Файл coco.names не найден. Создаем базовые классы.")
             self.classes = ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat', 'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket', 'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple', 'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier', 'toothbrush']
         
-        # Попытка загрузить модель YOLO
-        self.net = None
-        try:
-            # Проверяем наличие файлов модели
-            if not os.path.exists("yolov3-tiny.weights"):
-                print("Загружаем веса YOLOv3-tiny...")
-                self.download_file("https://pjreddie.com/media/files/yolov3-tiny.weights", "yolov3-tiny.weights")
-            
-            if not os.path.exists("yolov3-tiny.cfg"):
-                print("Загружаем конфигурацию YOLOv3-tiny...")
-                self.download_file("https://github.com/pjreddie/darknet/raw/master/cfg/yolov3-tiny.cfg", "yolov3-tiny.cfg")
-            
-            if not os.path.exists("coco.names"):
-                print("Загружаем файл классов COCO...")
-                self.download_file("https://github.com/pjreddie/darknet/raw/master/data/coco.names", "coco.names")
-                # Перезагружаем классы после скачивания
-                with open("coco.names", "r") as f:
-                    self.classes = [line.strip() for line in f.readlines()]
-            
-            # Загружаем модель
-            self.net = cv2.dnn.readNet("yolov3-tiny.weights", "yolov3-tiny.cfg")
-            layer_names = self.net.getLayerNames()
-            self.output_layers = [layer_names[i - 1] for i in self.net.getUnconnectedOutLayers()]
-            print("Модель YOLOv3-tiny загружена успешно")
-        except Exception as e:
-            print(f"Ошибка загрузки модели: {e}")
-            self.use_object_detection = False
+        # Модель YOLO загружается в фоновом потоке при первой необходимости
+        # (запуск детекции с распознаванием): GUI и детекция движения доступны
+        # сразу. Файлы модели проверяются по контрольным суммам локального
+        # кэша, а подобранная autotune() конфигурация движка берется из него же
+        self.engine = None
+        self.model_cache = ModelCache()
+        self.model_loader = BackgroundLoader(self.load_model, on_ready=self.on_model_loaded,
+                                             on_error=self.on_model_error)
+        
+        # Распознавание в областях движения - общий детектор объектов (detector_core)
+        self.object_detector = ObjectDetector(self.engine, self.classes, metrics=self.metrics)
+        self.update_object_detector()
+        
+        # Распознавание выполняется асинхронно, чтобы не тормозить цикл детекции
+        self.screenshot_lock = threading.Lock()
+        self.inference_pool = InferencePool(
+            lambda frame, boxes: self.detect_objects(frame, boxes),
+            on_result=self.on_inference_result)
         
         self.setup_gui()
     
-    def download_file(self, url, filename):
-        """Загружает файл по URL"""
-        try:
-            urllib.request.urlretrieve(url, filename)
-            print(f"Файл {filename} успешно загружен")
-        except Exception as e:
-            print(f"Ошибка загрузки файла {filename}: {e}")
-            raise
+    def load_model(self):
+        """Проверяет (при необходимости скачивает) файлы модели и создает движок.
+        
+        Выполняется в фоновом потоке BackgroundLoader.
+        """
+        if not os.path.exists(self.model_cache.path("coco.names")):
+            self.model_cache.ensure("coco.names")
+            # Перезагружаем классы после скачивания
+            with open(self.model_cache.path("coco.names"), "r") as f:
+                self.classes = [line.strip() for line in f.readlines()]
+            self.object_detector.classes = self.classes
+        return self.create_engine()
+    
+    def on_model_loaded(self, engine):
+        self.engine = engine
+        self.update_object_detector()
+        self.inference_pool.clear_cache()
+        print(f"Модель YOLOv3-tiny загружена успешно: {engine.describe()}")
+    
+    def on_model_error(self, error):
+        # Без модели детекция продолжается по одному движению
+        print(f"Ошибка загрузки модели: {error}")
+    
+    def create_engine(self):
+        """Создает движок YOLO; в режиме auto подбирает конфигурацию замером
+        
+        Подобранная конфигурация сохраняется в кэше модели, и следующие
+        запуски на той же машине обходятся без замеров.
+        """
+        weights = self.model_cache.ensure("yolov3-tiny.weights")
+        cfg = self.model_cache.ensure("yolov3-tiny.cfg")
+        if self.dnn_backend == "auto":
+            key = self.model_cache.tuning_key(("yolov3-tiny.weights", "yolov3-tiny.cfg"),
+                                              self.dnn_input_size, self.dnn_latency_budget)
+            config = self.model_cache.tuned_config(key)
+            if config is not None:
+                try:
+                    return YoloEngine(weights, cfg, **config)
+                except Exception as e:
+                    print(f"Сохраненная конфигурация {config} не подошла: {e}")
+            
+            print("Подбираем самую быструю конфигурацию распознавания...")
+            engine, results = autotune(weights, cfg,
+                                       input_sizes=(self.dnn_input_size,),
+                                       latency_budget=self.dnn_latency_budget)
+            for config, seconds in results:
+                print(f"  {config}: {seconds * 1000:.1f} мс")
+            self.model_cache.store_tuned_config(key, engine.settings())
+            return engine
+        
+        return YoloEngine(weights, cfg,
+                          backend=self.dnn_backend, precision=self.dnn_precision,
+                          input_size=self.dnn_input_size, threads=self.dnn_threads)
     
     def setup_gui(self):
         """Создает GUI для управления программой"""
@@ -177,16 +304,38 @@ class AdaptiveMotionDetectorScreen:
         self.max_drift_var = tk.StringVar(value=str(self.max_region_drift))
         tk.Entry(adaptive_tab, textvariable=self.max_drift_var, width=10).pack(pady=5)
         
+        tk.Label(adaptive_tab, text="Трекер области:").pack(pady=5)
+        self.tracker_var = tk.StringVar(value=self.tracker_name)
+        ttk.Combobox(adaptive_tab, textvariable=self.tracker_var, width=10, state="readonly",
+                     values=list(TRACKERS)).pack(pady=5)
+        
         # Настройки распознавания объектов
         self.use_object_detection_var = tk.BooleanVar(value=self.use_object_detection)
         tk.Checkbutton(objects_tab, text="Использовать распознавание объектов", 
                       variable=self.use_object_detection_var).pack(pady=10)
         
+        self.roi_detection_var = tk.BooleanVar(value=self.roi_detection)
+        tk.Checkbutton(objects_tab, text="Распознавать только в областях движения", 
+                      variable=self.roi_detection_var).pack(pady=5)
+        
         # Минимальная уверенность для распознавания
         tk.Label(objects_tab, text="Минимальная уверенность (0-1):").pack(pady=5)
         self.confidence_var = tk.StringVar(value=str(self.min_confidence))
         tk.Entry(objects_tab, textvariable=self.confidence_var, width=5).pack(pady=5)
         
+        # Конфигурация движка: бэкенд, точность и размер входа сети
+        engine_frame = tk.Frame(objects_tab)
+        engine_frame.pack(pady=5)
+        self.dnn_backend_var = tk.StringVar(value=self.dnn_backend)
+        self.dnn_precision_var = tk.StringVar(value=self.dnn_precision)
+        self.dnn_input_size_var = tk.StringVar(value=str(self.dnn_input_size))
+        ttk.Combobox(engine_frame, textvariable=self.dnn_backend_var, width=9, state="readonly",
+                     values=["auto", "opencv", "openvino"]).pack(side=tk.LEFT)
+        ttk.Combobox(engine_frame, textvariable=self.dnn_precision_var, width=5, state="readonly",
+                     values=["fp32", "fp16", "int8"]).pack(side=tk.LEFT)
+        ttk.Combobox(engine_frame, textvariable=self.dnn_input_size_var, width=5, state="readonly",
+                     values=[str(size) for size in INPUT_SIZES]).pack(side=tk.LEFT)
+        
         # Классы объектов для распознавания
         tk.Label(objects_tab, text="Классы объектов для распознавания:").pack(pady=5)
         
@@ -218,13 +367,17 @@ class AdaptiveMotionDetectorScreen:
         scrollbar.pack(side="right", fill="y")
         
         # Расширенные настройки
-        tk.Label(advanced_tab, text="Чувствительность (площадь объекта):").pack(pady=5)
-        self.sensitivity_var = tk.StringVar(value=str(self.min_contour_area))
+        tk.Label(advanced_tab, text="Чувствительность (площадь объекта, % области):").pack(pady=5)
+        self.sensitivity_var = tk.StringVar(value=str(self.detector_config.min_area_ratio * 100))
         tk.Entry(advanced_tab, textvariable=self.sensitivity_var, width=10).pack(pady=5)
         
+        tk.Label(advanced_tab, text="Ширина кадра для детекции (0 - исходная):").pack(pady=5)
+        self.processing_width_var = tk.StringVar(value=str(self.detector_config.processing_width))
+        tk.Entry(advanced_tab, textvariable=self.processing_width_var, width=10).pack(pady=5)
+        
         tk.Label(advanced_tab, text="Фильтр по соотношению сторон (min-max):").pack(pady=5)
-        self.aspect_min_var = tk.StringVar(value=str(self.aspect_min))
-        self.aspect_max_var = tk.StringVar(value=str(self.aspect_max))
+        self.aspect_min_var = tk.StringVar(value=str(self.detector_config.aspect_min))
+        self.aspect_max_var = tk.StringVar(value=str(self.detector_config.aspect_max))
         aspect_frame = tk.Frame(advanced_tab)
         aspect_frame.pack()
         tk.Entry(aspect_frame, textvariable=self.aspect_min_var, width=5).pack(side=tk.LEFT)
@@ -232,9 +385,17 @@ class AdaptiveMotionDetectorScreen:
         tk.Entry(aspect_frame, textvariable=self.aspect_max_var, width=5).pack(side=tk.LEFT)
         
         tk.Label(advanced_tab, text="Минимальный экстент (0-1):").pack(pady=5)
-        self.extent_min_var = tk.StringVar(value=str(self.extent_min))
+        self.extent_min_var = tk.StringVar(value=str(self.detector_config.extent_min))
         tk.Entry(advanced_tab, textvariable=self.extent_min_var, width=5).pack(pady=5)
         
+        self.record_clips_var = tk.BooleanVar(value=self.record_clips)
+        tk.Checkbutton(advanced_tab, text="Записывать клипы вместо скриншотов",
+                      variable=self.record_clips_var).pack(pady=5)
+        
+        self.prefilter_var = tk.BooleanVar(value=self.detector_config.prefilter)
+        tk.Checkbutton(advanced_tab, text="Быстрый предфильтр движения",
+                      variable=self.prefilter_var).pack(pady=5)
+        
         # Кнопки применения настроек
         tk.Button(adaptive_tab, text="Применить настройки", 
                  command=self.apply_adaptive_settings).pack(pady=10)
@@ -297,13 +458,15 @@ class AdaptiveMotionDetectorScreen:
             self.search_margin = int(self.search_margin_var.get())
             self.tracking_confidence_threshold = float(self.tracking_confidence_var.get())
             self.max_region_drift = int(self.max_drift_var.get())
+            self.set_tracker(self.tracker_var.get())
             
             messagebox.showinfo("Успешно", 
                               f"Настройки адаптивного отслеживания применены:\n"
                               f"Отслеживание: {'Вкл' if self.adaptive_tracking else 'Выкл'}\n"
                               f"Интервал обновления: {self.template_update_interval}\n"
                               f"Область поиска: ±{self.search_margin} пикс\n"
-                              f"Порог уверенности: {self.tracking_confidence_threshold}")
+                              f"Порог уверенности: {self.tracking_confidence_threshold}\n"
+                              f"Трекер: {self.tracker_name}")
         except ValueError:
             messagebox.showerror("Ошибка", "Введите корректные числовые значения")
     
@@ -311,26 +474,51 @@ class AdaptiveMotionDetectorScreen:
         """Применяет настройки распознавания объектов"""
         try:
             self.use_object_detection = self.use_object_detection_var.get()
+            self.roi_detection = self.roi_detection_var.get()
             self.min_confidence = float(self.confidence_var.get())
             
             # Получаем выбранные классы
             self.selected_classes = [cls for cls, var in self.class_vars.items() if var.get()]
             
+            # Пересоздаем движок, если изменилась его конфигурация
+            engine_settings = (self.dnn_backend_var.get(), self.dnn_precision_var.get(),
+                               int(self.dnn_input_size_var.get()))
+            if engine_settings != (self.dnn_backend, self.dnn_precision, self.dnn_input_size):
+                self.dnn_backend, self.dnn_precision, self.dnn_input_size = engine_settings
+                if self.model_loader.attempted:
+                    # Новый движок собирается в фоне, пока работает старый
+                    self.model_loader.reload()
+            self.update_object_detector()
+            
+            # Кэшированные результаты получены со старыми настройками
+            self.inference_pool.clear_cache()
+            
             messagebox.showinfo("Успешно", 
                               f"Настройки распознавания объектов применены:\n"
                               f"Распознавание объектов: {'Вкл' if self.use_object_detection else 'Выкл'}\n"
                               f"Минимальная уверенность: {self.min_confidence}\n"
+                              f"Движок: {self.engine_status()}\n"
                               f"Выбранные классы ({len(self.selected_classes)}): {', '.join(self.selected_classes[:5])}{'...' if len(self.selected_classes) > 5 else ''}")
         except ValueError:
             messagebox.showerror("Ошибка", "Введите корректные числовые значения")
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось применить конфигурацию движка: {e}")
     
     def apply_settings(self):
         """Применяет расширенные настройки"""
         try:
-            self.min_contour_area = int(self.sensitivity_var.get())
-            self.aspect_min = float(self.aspect_min_var.get())
-            self.aspect_max = float(self.aspect_max_var.get())
-            self.extent_min = float(self.extent_min_var.get())
+            # При смене ширины обработки или предфильтра детектор заново
+            # строит модель фона и проходит стабилизацию
+            self.motion_detector.configure(
+                min_area_ratio=float(self.sensitivity_var.get()) / 100,
+                processing_width=int(self.processing_width_var.get()),
+                aspect_min=float(self.aspect_min_var.get()),
+                aspect_max=float(self.aspect_max_var.get()),
+                extent_min=float(self.extent_min_var.get()),
+                prefilter=self.prefilter_var.get())
+            self.record_clips = self.record_clips_var.get()
+            if not self.record_clips:
+                self.event_recorder.end_clip()
             
             messagebox.showinfo("Успешно", "Расширенные настройки применены!")
         except ValueError:
@@ -350,284 +538,388 @@ class AdaptiveMotionDetectorScreen:
         if self.capture_region is None:
             return None
         
-        x, y, w, h = self.capture_region
-        screenshot = pyautogui.screenshot(region=(x, y, w, h))
-        frame = np.array(screenshot)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        return frame
+        return self.capture_backend.grab(self.capture_region)
     
-    def update_region_template(self, frame):
+    def get_capture_rect(self, region):
+        """Прямоугольник единого захвата: область плюс поля для поиска шаблона"""
+        if not self.adaptive_tracking:
+            return region
+        
+        x, y, w, h = region
+        return (max(0, x - self.search_margin), max(0, y - self.search_margin),
+                w + 2 * self.search_margin, h + 2 * self.search_margin)
+    
+    def grab_frame_into(self, out):
+        """Захватывает кадр в буфер out (выполняется в потоке захвата).
+        
+        Захватывается область вместе с полями поиска, поэтому за итерацию
+        нужен ровно один снимок экрана. Возвращает метаданные слота:
+        (захваченный прямоугольник, область детекции).
+        """
+        region = self.capture_region
+        if region is None:
+            return False
+        
+        capture_rect = self.get_capture_rect(region)
+        x, y, w, h = capture_rect
+        if out.shape[:2] != (h, w):
+            # Размер захвата изменился - перевыделяем буфер
+            self.frame_buffer.ensure_shape((h, w, 3))
+            return False
+        
+        # Источник пишет кадр прямо в слот буфера, без промежуточных копий
+        if not self.capture_backend.grab_into(capture_rect, out):
+            return False
+        return capture_rect, region
+    
+    def region_views(self, wide_frame, wide_gray, capture_rect, region):
+        """Возвращает срезы (BGR, серый) области внутри общего захвата или None"""
+        x, y, w, h = region
+        offset_x = x - capture_rect[0]
+        offset_y = y - capture_rect[1]
+        if (offset_x < 0 or offset_y < 0 or
+                offset_x + w > capture_rect[2] or offset_y + h > capture_rect[3]):
+            return None
+        
+        rows = slice(offset_y, offset_y + h)
+        cols = slice(offset_x, offset_x + w)
+        return wide_frame[rows, cols], wide_gray[rows, cols]
+    
+    def update_region_template(self, gray):
         """Обновляет шаблон для отслеживания области"""
-        # Используем центральную часть кадра как шаблон
-        h, w = frame.shape[:2]
+        # Используем центральную часть кадра (в градациях серого) как шаблон
+        h, w = gray.shape[:2]
         center_h, center_w = h // 4, w // 4
-        template = frame[center_h:h-center_h, center_w:w-center_w]
-        
-        # Конвертируем в градации серого для лучшего matching
-        self.region_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+        self.region_template = gray[center_h:h-center_h, center_w:w-center_w].copy()
+        self.region_tracker.set_template(self.region_template)
     
-    def track_region(self):
-        """Отслеживает и корректирует положение области захвата"""
-        if not self.adaptive_tracking or self.region_template is None:
+    def set_tracker(self, name):
+        """Переключает трекер области; текущий шаблон переходит к новому"""
+        if name == self.tracker_name:
             return
+        tracker = create_tracker(name, metrics=self.metrics)
+        if self.region_template is not None:
+            tracker.set_template(self.region_template)
+        self.tracker_name = name
+        self.region_tracker = tracker
+        self.tracking_failures = 0
+    
+    def track_region(self, search_gray, capture_rect, region):
+        """Отслеживает и корректирует положение области захвата.
         
-        # Делаем скриншот большей области для поиска
-        x, y, w, h = self.capture_region
-        search_x = max(0, x - self.search_margin)
-        search_y = max(0, y - self.search_margin)
-        search_w = w + 2 * self.search_margin
-        search_h = h + 2 * self.search_margin
+        search_gray - захват области с полями поиска в градациях серого.
+        Возвращает новую область или None, если смещения нет.
+        """
+        if not self.adaptive_tracking or self.region_template is None:
+            return None
+        
+        x, y, w, h = region
+        search_x, search_y = capture_rect[:2]
         
         try:
-            search_screenshot = pyautogui.screenshot(region=(search_x, search_y, search_w, search_h))
-            search_frame = np.array(search_screenshot)
-            search_frame = cv2.cvtColor(search_frame, cv2.COLOR_RGB2BGR)
-            search_gray = cv2.cvtColor(search_frame, cv2.COLOR_BGR2GRAY)
-            
-            # Ищем шаблон в области поиска
-            result = cv2.matchTemplate(search_gray, self.region_template, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            # Первая догадка - положение шаблона при текущей области (предыдущее
+            # найденное смещение); после неудачи ищем по всей области поиска
+            prior = None
+            if not self.tracking_failures:
+                prior = (x - search_x + w // 4, y - search_y + h // 4)
+            found = self.region_tracker.locate(search_gray, prior)
             
             # Если найдено хорошее совпадение
-            if max_val > self.tracking_confidence_threshold:
-                # Вычисляем новые координаты
-                template_h, template_w = self.region_template.shape
-                new_x_offset = max_loc[0]
-                new_y_offset = max_loc[1]
+            if found is None or found[2] <= self.tracking_confidence_threshold:
+                self.tracking_failures += 1
+                self.metrics.inc("tracking_failures")
+                return None
+            self.tracking_failures = 0
+            
+            # Центр шаблона (с учетом масштаба) - центр области; размер
+            # области не меняется, чтобы не пересоздавать буферы и модель фона
+            new_x_offset, new_y_offset, _, scale = found
+            template_h, template_w = self.region_template.shape
+            center_x = search_x + new_x_offset + template_w * scale / 2
+            center_y = search_y + new_y_offset + template_h * scale / 2
+            new_x = int(round(center_x - w / 2))
+            new_y = int(round(center_y - h / 2))
+            
+            # Ограничиваем максимальное смещение
+            drift_x = new_x - x
+            drift_y = new_y - y
+            
+            if abs(drift_x) <= self.max_region_drift and abs(drift_y) <= self.max_region_drift:
+                # Плавное смещение
+                smooth_factor = 0.3
+                final_x = int(x + drift_x * smooth_factor)
+                final_y = int(y + drift_y * smooth_factor)
                 
-                # Переводим в глобальные координаты
-                new_x = search_x + new_x_offset - w//4
-                new_y = search_y + new_y_offset - h//4
+                self.capture_region = (final_x, final_y, w, h)
                 
-                # Ограничиваем максимальное смещение
-                drift_x = new_x - x
-                drift_y = new_y - y
+                # Обновляем информацию о смещении в GUI
+                total_drift_x = final_x - self.original_capture_region[0]
+                total_drift_y = final_y - self.original_capture_region[1]
+                self.root.after(0, self.update_drift_info, total_drift_x, total_drift_y)
                 
-                if abs(drift_x) <= self.max_region_drift and abs(drift_y) <= self.max_region_drift:
-                    # Плавное смещение
-                    smooth_factor = 0.3
-                    final_x = int(x + drift_x * smooth_factor)
-                    final_y = int(y + drift_y * smooth_factor)
-                    
-                    self.capture_region = (final_x, final_y, w, h)
-                    
-                    # Обновляем информацию о смещении в GUI
-                    total_drift_x = final_x - self.original_capture_region[0]
-                    total_drift_y = final_y - self.original_capture_region[1]
-                    self.root.after(0, self.update_drift_info, total_drift_x, total_drift_y)
-                    
-                    return True
+                return self.capture_region
         
         except Exception as e:
             print(f"Ошибка при отслеживании области: {e}")
         
-        return False
+        return None
     
     def update_drift_info(self, drift_x, drift_y):
         """Обновляет информацию о смещении области"""
         self.drift_label.config(text=f"Смещение: {drift_x:+d}, {drift_y:+d}")
     
-    def detect_objects(self, frame):
-        """Распознает объекты на изображении с помощью YOLO"""
-        if not self.use_object_detection or self.net is None:
-            return False, []
+    def engine_status(self):
+        if self.engine is not None:
+            status = self.engine.describe()
+            if self.model_loader.loading:
+                status += " (перезагружается)"
+            return status
+        if self.model_loader.loading:
+            return "загружается"
+        if self.model_loader.error is not None:
+            return f"ошибка загрузки ({self.model_loader.error})"
+        return "не загружен"
+    
+    def update_object_detector(self):
+        """Передает настройки распознавания общему детектору объектов"""
+        detector = self.object_detector
+        detector.engine = self.engine
+        detector.min_confidence = self.min_confidence
+        detector.roi_detection = self.roi_detection
+        detector.roi_padding = self.roi_padding
+        detector.roi_min_size = self.roi_min_size
+        detector.roi_max_count = self.roi_max_count
+        detector.set_targets(self.selected_classes)
+    
+    def detect_objects(self, frame, motion_boxes=None):
+        """Распознает объекты на изображении с помощью YOLO
         
-        try:
-            height, width, channels = frame.shape
-            
-            # Подготавливаем изображение для модели
-            blob = cv2.dnn.blobFromImage(frame, 0.00392, (416, 416), (0, 0, 0), True, crop=False)
-            self.net.setInput(blob)
-            outs = self.net.forward(self.output_layers)
-            
-            # Анализируем результаты
-            class_ids = []
-            confidences = []
-            boxes = []
-            
-            for out in outs:
-                for detection in out:
-                    scores = detection[5:]
-                    class_id = np.argmax(scores)
-                    confidence = scores[class_id]
-                    
-                    if confidence > self.min_confidence:
-                        # Объект обнаружен
-                        center_x = int(detection[0] * width)
-                        center_y = int(detection[1] * height)
-                        w = int(detection[2] * width)
-                        h = int(detection[3] * height)
-                        
-                        # Координаты прямоугольника
-                        x = int(center_x - w / 2)
-                        y = int(center_y - h / 2)
-                        
-                        boxes.append([x, y, w, h])
-                        confidences.append(float(confidence))
-                        class_ids.append(class_id)
-            
-            # Применяем non-maximum suppression для устранения дубликатов
-            indexes = cv2.dnn.NMSBoxes(boxes, confidences, self.min_confidence, 0.4)
-            
-            # Фильтруем обнаруженные объекты по выбранным классам
-            detected_objects = []
-            for i in range(len(boxes)):
-                if i in indexes:
-                    class_name = self.classes[class_ids[i]]
-                    if class_name in self.selected_classes:
-                        detected_objects.append((class_name, confidences[i]))
-            
-            return len(detected_objects) > 0, detected_objects
-        except Exception as e:
-            print(f"Ошибка при распознавании объектов: {e}")
-            return False, []
+        В режиме ROI сеть обрабатывает только участки вокруг областей движения.
+        Возвращает None, если распознать нельзя (модель не загружена): пул не
+        кэширует такой результат. Ошибки сети передаются пулу распознавания.
+        """
+        if not self.use_object_detection or self.engine is None:
+            return None
+        
+        detected_objects = self.object_detector.detect(frame, motion_boxes)
+        return len(detected_objects) > 0, detected_objects
     
     def detect_motion(self):
         """Основной цикл детекции движения с адаптивным отслеживанием и распознаванием объектов"""
+        wide_frame = None
+        last_seq = 0
         while self.is_running:
             try:
-                frame = self.capture_screen_region()
-                if frame is None:
-                    time.sleep(0.1)
+                # Берем самый свежий кадр, более старые отбрасываются
+                result = self.frame_buffer.get_latest(wide_frame, last_seq, timeout=0.5)
+                if result is None:
+                    continue
+                wide_frame, last_seq, frame_time, (capture_rect, region) = result
+                processing_started = time.perf_counter()
+                motion_detected = False
+                self.metrics.observe("frame_age", time.time() - frame_time)
+                lap = self.metrics.lap_timer()
+                
+                # Кадр области и область поиска шаблона - срезы одного захвата
+                wide_gray = self.motion_pipeline.gray(wide_frame)
+                lap("gray")
+                views = self.region_views(wide_frame, wide_gray, capture_rect, region)
+                if views is None:
                     continue
+                frame, gray = views
                 
                 self.frame_count += 1
                 self.template_update_counter += 1
                 
-                # Обновляем шаблон для отслеживания
+                # Обновляем шаблон для отслеживания. Пока в области есть
+                # движение, обновление откладывается: иначе шаблон захватывает
+                # движущийся объект и область начинает за ним "уплывать"
                 if (self.adaptive_tracking and 
                     (self.region_template is None or 
-                     self.template_update_counter >= self.template_update_interval)):
-                    self.update_region_template(frame)
+                     (self.template_update_counter >= self.template_update_interval and
+                      self.motion_detector.state != ACTIVE))):
+                    self.update_region_template(gray)
                     self.template_update_counter = 0
                 
                 # Выполняем отслеживание области
-                if self.frame_count > 30 and self.frame_count % 5 == 0:
-                    tracking_success = self.track_region()
-                    if tracking_success:
-                        # Получаем обновленный кадр после корректировки области
-                        frame = self.capture_screen_region()
-                        if frame is None:
+                if self.frame_count > 30 and self.frame_count % self.tracking_interval == 0:
+                    new_region = self.track_region(wide_gray, capture_rect, region)
+                    if new_region is not None:
+                        # Берем срез скорректированной области из того же захвата
+                        views = self.region_views(wide_frame, wide_gray,
+                                                  capture_rect, new_region)
+                        if views is None:
                             continue
+                        frame, gray = views
+                        region = new_region
                 
-                # Применяем детекцию движения после стабилизации
-                if self.frame_count > 30:
-                    # Конвертируем в grayscale для более стабильной обработки
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    
-                    # Применяем Gaussian blur для уменьшения шума
-                    blurred = cv2.GaussianBlur(gray, (21, 21), 0)
-                    
-                    fg_mask = self.background_subtractor.apply(blurred)
-                    
-                    # Убираем шум
-                    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-                    fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_CLOSE, kernel)
-                    fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, kernel)
-                    
-                    # Находим контуры
-                    contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, 
-                                                 cv2.CHAIN_APPROX_SIMPLE)
-                    
-                    # Проверяем наличие крупного движения с дополнительными критериями
-                    motion_detected = False
-                    largest_area = 0
-                    
-                    for contour in contours:
-                        area = cv2.contourArea(contour)
-                        
-                        if area > self.min_contour_area:
-                            # Вычисляем соотношение сторон bounding box
-                            x, y, w, h = cv2.boundingRect(contour)
-                            aspect_ratio = w / h if h > 0 else 0
-                            
-                            # Вычисляем экстент
-                            rect_area = w * h
-                            extent = float(area) / rect_area if rect_area > 0 else 0
-                            
-                            # Фильтруем по форме и экстенту
-                            if (self.aspect_min < aspect_ratio < self.aspect_max and 
-                                extent > self.extent_min):
-                                motion_detected = True
-                                largest_area = max(largest_area, area)
+                # Область сместилась (отслеживание или сброс) - модель фона
+                # сдвигается вместе с ней, иначе весь кадр выглядит как движение
+                if self.detection_region is not None and region[:2] != self.detection_region[:2]:
+                    self.motion_detector.shift(region[0] - self.detection_region[0],
+                                               region[1] - self.detection_region[1])
+                self.detection_region = region
+                
+                lap("tracking")
+                
+                # Кадр области попадает в буфер предзаписи или в текущий клип
+                if self.record_clips:
+                    self.event_recorder.push(frame, frame_time)
+                    lap("clip_buffer")
+                
+                # Детекция движения общим детектором без GUI: уменьшенная копия
+                # области, предфильтр, MOG2, морфология и фильтр контуров по форме
+                detection = self.motion_detector.detect_gray(gray)
+                # Этапы детектора он замеряет сам
+                lap.skip()
+                
+                if self.motion_detector.state == IDLE:
+                    # Сцена неподвижна: MOG2 только изредка обновляет фон
+                    self.metrics.inc("prefilter_skipped")
+                    status_text = "Ожидание движения..."
+                    if self.adaptive_tracking:
+                        status_text += " [Отслеживание активно]"
+                    self.root.after(0, self.update_status, status_text)
+                
+                # Детекция движения после стабилизации
+                elif self.motion_detector.state == ACTIVE:
+                    # Площадь и области движения - в координатах исходного кадра
+                    motion_detected = detection is not None
+                    largest_area = detection[1] if motion_detected else 0
+                    motion_boxes = detection[0] if motion_detected else []
                     
-                    # Проверяем наличие целевых объектов, если включено распознавание
+                    # Проверяем наличие целевых объектов, если включено распознавание;
+                    # пока модель загружается, скриншоты делаются по одному движению
+                    recognize = self.use_object_detection and self.engine is not None
+                    if self.use_object_detection and self.engine is None:
+                        self.model_loader.request()
                     objects_detected = False
                     detected_objects = []
+                    detection_pending = False
                     
-                    if motion_detected and self.use_object_detection:
-                        objects_detected, detected_objects = self.detect_objects(frame)
+                    if motion_detected and recognize:
+                        # Пока области движения стабильны, берем результат из кэша,
+                        # иначе отдаем кадр пулу распознавания и не ждем его
+                        cached = self.inference_pool.lookup(motion_boxes)
+                        if cached is not None:
+                            objects_detected, detected_objects = cached
+                        else:
+                            self.inference_pool.submit(frame.copy(), motion_boxes, largest_area)
+                            detection_pending = True
                     
                     # Делаем скриншот при обнаружении движения И целевых объектов
-                    current_time = time.time()
                     should_capture = motion_detected and (
-                        not self.use_object_detection or objects_detected
+                        not recognize or objects_detected
                     )
+                    saved = should_capture and self.save_detection(
+                        frame, largest_area, detected_objects)
                     
-                    if (should_capture and 
-                        (current_time - self.last_screenshot_time) > self.screenshot_interval):
-                        
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        screenshot_filename = f"motion_detected_{timestamp}.jpg"
-                        screenshot_path = os.path.join(self.screenshots_dir, screenshot_filename)
-                        
-                        # Сохраняем полный скриншот области
-                        cv2.imwrite(screenshot_path, frame)
-                        
-                        self.last_screenshot_time = current_time
-                        
-                        # Формируем сообщение о статусе
-                        if detected_objects:
-                            obj_info = ", ".join([f"{obj[0]}({obj[1]:.2f})" for obj in detected_objects[:3]])
-                            status_text = f"ОБНАРУЖЕНО: {obj_info}"
-                        else:
-                            status_text = f"ДВИЖЕНИЕ! Объект: {int(largest_area)} пикс"
-                        
-                        if self.adaptive_tracking:
-                            status_text += " [Адаптивное]"
-                        
-                        # Обновляем GUI в основном потоке
-                        self.root.after(0, self.update_status, status_text)
-                        print(f"Движение обнаружено! Размер объекта: {int(largest_area)} пикселей")
-                        if detected_objects:
-                            print(f"Обнаруженные объекты: {detected_objects}")
-                        print(f"Скриншот сохранен: {screenshot_filename}")
-                    
-                    elif motion_detected:
-                        if self.use_object_detection and not objects_detected:
-                            status_text = "Движение (не целевые объекты)"
+                    # При сохранении статус уже обновлен в save_detection
+                    if not saved:
+                        if motion_detected:
+                            if detection_pending:
+                                status_text = "Движение (распознавание...)"
+                            elif recognize and not objects_detected:
+                                status_text = "Движение (не целевые объекты)"
+                            elif self.record_clips:
+                                status_text = "Движение (запись клипа)"
+                            else:
+                                status_text = "Движение (недавний скриншот)"
+                            
+                            if self.adaptive_tracking:
+                                status_text += " [Отслеживание]"
+                            self.root.after(0, self.update_status, status_text)
                         else:
-                            status_text = "Движение (недавний скриншот)"
-                        
-                        if self.adaptive_tracking:
-                            status_text += " [Отслеживание]"
-                        self.root.after(0, self.update_status, status_text)
-                    else:
-                        status_text = "Ожидание движения..."
-                        if self.adaptive_tracking:
-                            status_text += " [Отслеживание активно]"
-                        self.root.after(0, self.update_status, status_text)
+                            status_text = "Ожидание движения..."
+                            if self.adaptive_tracking:
+                                status_text += " [Отслеживание активно]"
+                            self.root.after(0, self.update_status, status_text)
                 
                 else:
                     # Стабилизация фона
-                    self.background_subtractor.apply(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
                     self.root.after(0, self.update_status, 
-                                  f"Стабилизация... {30 - self.frame_count}")
+                                  f"Стабилизация... {self.motion_detector.stabilization_left}")
                 
-                # Обновляем счетчик скриншотов
-                try:
-                    screenshot_count = len([f for f in os.listdir(self.screenshots_dir) 
-                                          if f.endswith('.jpg')])
+                # Сохранение, клипы и обновление статуса
+                lap("events")
+                
+                # Обновляем счетчик скриншотов, только если он изменился
+                screenshot_count = self.screenshot_index.count
+                if screenshot_count != self.shown_screenshot_count:
+                    self.shown_screenshot_count = screenshot_count
                     self.root.after(0, self.update_counter, screenshot_count)
-                except:
-                    pass
                 
-                time.sleep(0.1)
+                # Подстраиваем частоту захвата под движение и время этапов
+                capture_thread = self.capture_thread
+                if capture_thread is not None:
+                    self.rate_controller.record("capture", capture_thread.grab_seconds)
+                    self.rate_controller.record("processing",
+                                                time.perf_counter() - processing_started)
+                    capture_thread.fps = self.rate_controller.update(motion_detected)
+                
+                self.metrics.observe("frame", time.perf_counter() - processing_started)
+                self.metrics.mark_frame()
+                if motion_detected:
+                    self.metrics.inc("motion_frames")
                 
             except Exception as e:
                 print(f"Ошибка в детекции: {e}")
                 time.sleep(1)
     
+    def save_detection(self, frame, largest_area, detected_objects):
+        """Начинает клип или сохраняет скриншот; возвращает True, если сохранение начато"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Метод вызывается из потока пула, а флаг меняется из GUI - читаем его один раз
+        record_clips = self.record_clips
+        
+        if record_clips:
+            # Каждое обнаружение продлевает текущий клип,
+            # новый клип начинается только после завершения текущего
+            clip_path = self.event_recorder.trigger(self.screenshots_dir, f"motion_{timestamp}")
+            if clip_path is None:
+                return False
+        else:
+            with self.screenshot_lock:
+                current_time = time.time()
+                if (current_time - self.last_screenshot_time) <= self.screenshot_interval:
+                    return False
+                self.last_screenshot_time = current_time
+            
+            screenshot_filename = f"motion_detected_{timestamp}"
+            
+            # Ставим полный скриншот области в очередь фоновой записи
+            screenshot_path = self.screenshot_writer.save(frame, self.screenshots_dir,
+                                                          screenshot_filename)
+        
+        # Формируем сообщение о статусе
+        if detected_objects:
+            obj_info = ", ".join([f"{obj[0]}({obj[1]:.2f})" for obj in detected_objects[:3]])
+            status_text = f"ОБНАРУЖЕНО: {obj_info}"
+        else:
+            status_text = f"ДВИЖЕНИЕ! Объект: {int(largest_area)} пикс"
+        
+        if self.adaptive_tracking:
+            status_text += " [Адаптивное]"
+        
+        # Обновляем GUI в основном потоке
+        self.root.after(0, self.update_status, status_text)
+        print(f"Движение обнаружено! Размер объекта: {int(largest_area)} пикселей")
+        if detected_objects:
+            print(f"Обнаруженные объекты: {detected_objects}")
+        if record_clips:
+            print(f"Записывается клип: {os.path.basename(clip_path)}")
+        elif screenshot_path:
+            print(f"Скриншот сохраняется: {os.path.basename(screenshot_path)}")
+        else:
+            print("Очередь записи переполнена, скриншот пропущен")
+        return True
+    
+    def on_inference_result(self, frame, boxes, result, largest_area):
+        """Обрабатывает результат асинхронного распознавания (поток пула)"""
+        objects_detected, detected_objects = result
+        if objects_detected and self.is_running:
+            self.save_detection(frame, largest_area, detected_objects)
+    
     def update_status(self, text):
         """Обновляет статус в GUI"""
         self.status_label.config(text=text)
@@ -646,7 +938,22 @@ class AdaptiveMotionDetectorScreen:
             
             self.is_running = True
             self.frame_count = 0
+            self.motion_detector.reset()
+            self.detection_region = None
+            self.rate_controller.reset()
             self.template_update_counter = 0
+            
+            # Запускаем поток захвата с кольцевым буфером кадров
+            x, y, w, h = self.get_capture_rect(self.capture_region)
+            self.frame_buffer = FrameRingBuffer(self.frame_buffer_size, (h, w, 3),
+                                                policy=self.frame_drop_policy)
+            self.capture_thread = CaptureThread(self.frame_buffer, self.grab_frame_into,
+                                                fps=self.capture_fps, metrics=self.metrics)
+            self.capture_thread.start()
+            self.inference_pool.start()
+            if self.use_object_detection:
+                # Модель загружается в фоне, детекция движения работает уже сейчас
+                self.model_loader.request()
             self.start_button.config(text="Остановить детекцию", bg="lightcoral")
             
             # Запускаем детекцию в отдельном потоке
@@ -659,26 +966,78 @@ class AdaptiveMotionDetectorScreen:
             print(f"Адаптивное отслеживание: {'ВКЛ' if self.adaptive_tracking else 'ВЫКЛ'}")
             print(f"Распознавание объектов: {'ВКЛ' if self.use_object_detection else 'ВЫКЛ'}")
             if self.use_object_detection:
+                print(f"Движок: {self.engine_status()}")
                 print(f"Целевые классы: {', '.join(self.selected_classes)}")
             print(f"Скриншоты сохраняются в: {self.screenshots_dir}")
             
         else:
             self.is_running = False
+            self.event_recorder.end_clip()
+            if self.capture_thread is not None:
+                self.capture_thread.stop()
+                self.capture_thread = None
+                print(f"Статистика буфера кадров: {self.frame_buffer.stats()}")
+                print(f"Статистика детектора: {self.motion_detector.stats()}")
+                print(f"Статистика отслеживания: {self.region_tracker.stats()}")
+                print(f"Статистика частоты кадров: {self.rate_controller.stats()}")
+            self.inference_pool.stop()
+            print(f"Статистика распознавания: {self.inference_pool.stats()}")
             self.start_button.config(text="Запустить детекцию", bg="lightgreen")
             self.status_label.config(text="Остановлено")
             print("Детекция движения остановлена")
     
+    def start_metrics(self):
+        """Регистрирует глубину очередей и потери кадров, запускает сервер метрик"""
+        # Пока детекция не запущена, буфера кадров и потока захвата нет -
+        # такие значения просто не попадают в выдачу
+        gauges = {
+            "frame_buffer_pending": lambda: self.frame_buffer.stats()["pending"],
+            "frame_buffer_dropped": lambda: self.frame_buffer.stats()["dropped"],
+            "frame_buffer_skipped": lambda: self.frame_buffer.stats()["skipped"],
+            "capture_fps": lambda: self.capture_thread.fps,
+            "screenshot_queue_depth": lambda: self.screenshot_writer.stats()["depth"],
+            "screenshots_dropped": lambda: self.screenshot_writer.stats()["dropped"],
+            "clip_frames_buffered": lambda: self.event_recorder.stats()["buffered"],
+            "clip_frames_dropped": lambda: self.event_recorder.stats()["dropped"],
+            "inference_queue_depth": lambda: self.inference_pool.stats()["queued"],
+            "inference_dropped": lambda: self.inference_pool.stats()["dropped"],
+            "model_loaded": lambda: 1 if self.engine is not None else 0,
+        }
+        for name, fn in gauges.items():
+            self.metrics.register_gauge(name, fn)
+        if self.metrics_port:
+            self.metrics.start_server(self.metrics_port)
+    
+    def stop_metrics(self):
+        """Останавливает сервер метрик и при необходимости сохраняет их в JSON"""
+        self.metrics.stop_server()
+        if self.metrics_dump_path:
+            try:
+                self.metrics.dump_json(self.metrics_dump_path)
+                print(f"Метрики сохранены в {self.metrics_dump_path}")
+            except OSError as e:
+                print(f"Не удалось сохранить метрики: {e}")
+    
     def run(self):
         """Запускает приложение"""
         print("Adaptive Motion Detector with Object Detection - Screen Capture")
         print("Папка для скриншотов:", self.screenshots_dir)
         print("Адаптивное отслеживание области: ВКЛ")
-        if self.use_object_detection and self.net is not None:
-            print("Распознавание объектов: ВКЛ")
+        if self.use_object_detection:
+            print("Распознавание объектов: ВКЛ (модель загрузится при запуске детекции)")
             print(f"Целевые классы: {', '.join(self.selected_classes)}")
         else:
             print("Распознавание объектов: ВЫКЛ")
+        self.start_metrics()
         self.root.mainloop()
+        
+        # Дописываем скриншоты, оставшиеся в очереди
+        self.screenshot_writer.close()
+        self.event_recorder.close()
+        self.screenshot_index.close()
+        print(f"Статистика записи скриншотов: {self.screenshot_writer.stats()}")
+        print(f"Статистика записи клипов: {self.event_recorder.stats()}")
+        self.stop_metrics()
 
 if __name__ == "__main__":
     # Устанавливаем fail-safe для pyautogui
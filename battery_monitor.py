@@ -0,0 +1,103 @@
+import os
+import time
+
+# Профили питания: (наименьший заряд в процентах, частота при движении,
+# частота в простое). Выбирается первый профиль, заряд которого не выше
+# текущего; при зарядке и неизвестном заряде - первый (полный) профиль
+POWER_PROFILES = (
+    (50, 30, 5),
+    (20, 15, 2),
+    (0, 10, 1),
+)
+
+
+def is_android():
+    # Та же проверка, что в kivy.utils.platform; сам jnius бывает установлен
+    # и на компьютере, где классов Android нет
+    return "ANDROID_ARGUMENT" in os.environ or "P4A_BOOTSTRAP" in os.environ
+
+
+def read_battery():
+    """Возвращает (заряд в процентах, идет ли зарядка) или None, если неизвестно"""
+    if is_android():
+        from jnius import autoclass
+        # BatteryManager отдает заряд и состояние без подписки на события
+        activity = autoclass("org.kivy.android.PythonActivity").mActivity
+        context = autoclass("android.content.Context")
+        manager = activity.getSystemService(context.BATTERY_SERVICE)
+        battery_manager = autoclass("android.os.BatteryManager")
+        percent = manager.getIntProperty(battery_manager.BATTERY_PROPERTY_CAPACITY)
+        return percent, manager.isCharging()
+    try:
+        import psutil
+    except ImportError:
+        return None
+    battery = psutil.sensors_battery()
+    if battery is None:
+        return None
+    return battery.percent, battery.power_plugged
+
+
+class BatteryMonitor:
+    """Подбирает частоту кадров по заряду батареи.
+
+    Заряд опрашивается не чаще раза в check_interval секунд: на Android через
+    BatteryManager (jnius), на компьютере через psutil, если он установлен.
+    profile() возвращает (active_fps, idle_fps) из POWER_PROFILES; пока
+    устройство заряжается или заряд неизвестен, работает первый профиль.
+    """
+
+    def __init__(self, profiles=POWER_PROFILES, check_interval=60.0, read=read_battery):
+        self.profiles = profiles
+        self.check_interval = check_interval
+        self.read = read
+
+        self.percent = None
+        self.charging = None
+        self.last_check = None
+        self.current = None
+
+        # Статистика
+        self.profile_switches = 0
+        self.read_failures = 0
+
+    def poll(self, now=None):
+        """Обновляет заряд, если пора; возвращает True, если профиль сменился"""
+        if now is None:
+            now = time.time()
+        if self.last_check is not None and now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        try:
+            state = self.read()
+        except Exception as e:
+            # Ошибка чтения не должна останавливать детекцию
+            self.read_failures += 1
+            if self.read_failures == 1:
+                print(f"Не удалось узнать заряд батареи: {e}")
+            state = None
+        self.percent, self.charging = state if state is not None else (None, None)
+
+        profile = self.profile()
+        if profile == self.current:
+            return False
+        if self.current is not None:
+            self.profile_switches += 1
+        self.current = profile
+        return True
+
+    def profile(self):
+        if self.percent is None or self.charging:
+            return self.profiles[0][1:]
+        for min_percent, active_fps, idle_fps in self.profiles:
+            if self.percent >= min_percent:
+                return active_fps, idle_fps
+        return self.profiles[-1][1:]
+
+    def stats(self):
+        return {
+            "percent": self.percent,
+            "charging": self.charging,
+            "profile": self.current,
+            "profile_switches": self.profile_switches,
+        }
@@ -0,0 +1,297 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from detector_core import DetectorConfig, MotionDetector, ObjectDetector, load_classes
+from metrics import Metrics
+from multi_source import open_source
+from screen_capture import SyntheticBackend
+
+# Допустимое ухудшение относительно базового замера (доля) и порог в
+# миллисекундах, ниже которого разница во времени этапа считается шумом
+DEFAULT_TOLERANCE = 0.15
+MIN_STAGE_DELTA_MS = 0.5
+
+
+def peak_rss_mb():
+    """Пиковый объем резидентной памяти процесса в МБ (None - неизвестен)"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux отдает килобайты, macOS - байты
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+
+
+def parse_resolution(text):
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("Разрешение задается как ШИРИНАxВЫСОТА")
+    return width, height
+
+
+def open_frames(case):
+    """Возвращает (grab_into(out), размер кадра, release) для источника замера"""
+    width, height = case["resolution"] or (1280, 720)
+    if case["source"] == "synthetic":
+        # Фиксированное зерно и объекты - каждый прогон видит те же кадры
+        backend = SyntheticBackend(width, height, objects=[
+            (width // 10, height // 6, width // 12, height // 5, 6, 3),
+            (width // 2, height // 2, width // 16, height // 8, -4, 2)], seed=0)
+        region = (0, 0, width, height)
+        return (lambda out: backend.grab_into(region, out)), (height, width, 3), lambda: None
+
+    grab, shape, release = open_source(case["source"])
+    if case["resolution"] is None or shape[:2] == (height, width):
+        return grab, shape, release
+
+    # Кадры видео масштабируются к заданному разрешению
+    native = np.empty(shape, np.uint8)
+
+    def grab_resized(out):
+        ok = grab(native)
+        if ok:
+            cv2.resize(native, (width, height), dst=out, interpolation=cv2.INTER_AREA)
+        return ok
+
+    return grab_resized, (height, width, 3), release
+
+
+def run_case(case):
+    """Прогоняет один вариант замера и возвращает результат словарем.
+
+    Кадры подаются без пауз; первые warmup кадров не учитываются (в них
+    стабилизируется фон и прогреваются кэши OpenCV).
+    """
+    cv2.setNumThreads(case["threads"])
+    metrics = Metrics()
+    detector = MotionDetector(DetectorConfig(**case["detector"]))
+
+    object_detector = None
+    if case["yolo"]:
+        from yolo_detector import YoloEngine
+        engine = YoloEngine("yolov3-tiny.weights", "yolov3-tiny.cfg",
+                            input_size=case["yolo_input_size"])
+        object_detector = ObjectDetector(engine, load_classes(), case["classes"],
+                                         case["min_confidence"])
+
+    grab, shape, release = open_frames(case)
+    frame = np.empty(shape, np.uint8)
+    frames = 0
+    motion_frames = 0
+    objects_found = 0
+    started = None
+    try:
+        while frames < case["warmup"] + case["frames"]:
+            if frames == case["warmup"]:
+                # Замер начинается после прогрева
+                detector.metrics = metrics
+                started = time.perf_counter()
+            measured = started is not None
+            frame_started = time.perf_counter()
+            ok = grab(frame)
+            if not ok:
+                break
+            if measured:
+                metrics.observe("source", time.perf_counter() - frame_started)
+
+            detection = detector.detect(frame)
+            if detection is not None and object_detector is not None:
+                yolo_started = time.perf_counter()
+                objects = object_detector.detect(frame, detection[0])
+                if measured:
+                    metrics.observe("yolo", time.perf_counter() - yolo_started)
+                    objects_found += len(objects)
+            frames += 1
+            if measured:
+                metrics.observe("frame", time.perf_counter() - frame_started)
+                if detection is not None:
+                    motion_frames += 1
+    finally:
+        release()
+
+    measured_frames = frames - case["warmup"]
+    seconds = time.perf_counter() - started if started is not None else 0.0
+    stages = metrics.snapshot()["stages"]
+    return {
+        "name": case["name"],
+        "settings": {key: value for key, value in case.items() if key != "name"},
+        "frames": max(0, measured_frames),
+        "seconds": seconds,
+        "fps": measured_frames / seconds if seconds > 0 else 0.0,
+        "motion_frames": motion_frames,
+        "objects": objects_found,
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def build_cases(args):
+    """Все сочетания источников, разрешений и ширин обработки"""
+    # Параметры командной строки дополняют и перекрывают файл конфигурации
+    overrides = {}
+    if args.min_area_ratio is not None:
+        overrides["min_area_ratio"] = args.min_area_ratio
+    if args.stabilization_frames is not None:
+        overrides["stabilization_frames"] = args.stabilization_frames
+    if args.no_prefilter:
+        overrides["prefilter"] = False
+    if args.config:
+        config = DetectorConfig.load(args.config, **overrides)
+    else:
+        config = DetectorConfig(**overrides)
+
+    sources = list(args.video)
+    if args.synthetic or not sources:
+        sources.append("synthetic")
+    resolutions = args.resolution or [None]
+    cases = []
+    for source in sources:
+        label = "synthetic" if source == "synthetic" else os.path.basename(str(source))
+        for resolution in resolutions:
+            for width in args.processing_width:
+                name = label
+                if resolution is not None:
+                    name += f"@{resolution[0]}x{resolution[1]}"
+                name += f"/pw{width}"
+                if not config.prefilter:
+                    name += "/noprefilter"
+                if args.yolo:
+                    name += f"/yolo{args.yolo_input_size}"
+                cases.append({
+                    "name": name,
+                    "source": source,
+                    "resolution": resolution,
+                    "detector": dict(config.to_dict(), processing_width=width),
+                    "yolo": args.yolo,
+                    "yolo_input_size": args.yolo_input_size,
+                    "classes": args.classes.split(",") if args.classes else None,
+                    "min_confidence": args.min_confidence,
+                    "frames": args.frames,
+                    "warmup": args.warmup,
+                    "threads": args.threads,
+                })
+    return cases
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Сравнивает результаты с базовыми; возвращает список описаний регрессий"""
+    base_cases = {case["name"]: case for case in baseline.get("cases", [])}
+    regressions = []
+    for result in results:
+        base = base_cases.get(result["name"])
+        if base is None:
+            print(f"  {result['name']}: нет в базовом замере")
+            continue
+        name = result["name"]
+        if result["fps"] < base["fps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['fps']:.1f} кадр/с против {base['fps']:.1f}")
+        for stage, stats in result["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if base_stats is None or stats["p95_ms"] is None or base_stats["p95_ms"] is None:
+                continue
+            delta = stats["p95_ms"] - base_stats["p95_ms"]
+            if delta > MIN_STAGE_DELTA_MS and stats["p95_ms"] > base_stats["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: этап {stage} p95 {stats['p95_ms']:.2f} мс "
+                                   f"против {base_stats['p95_ms']:.2f}")
+        if result["peak_rss_mb"] and base.get("peak_rss_mb"):
+            if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+                regressions.append(f"{name}: пик памяти {result['peak_rss_mb']:.0f} МБ "
+                                   f"против {base['peak_rss_mb']:.0f}")
+    return regressions
+
+
+def print_result(result):
+    rss = f"{result['peak_rss_mb']:.0f} МБ" if result["peak_rss_mb"] else "н/д"
+    print(f"{result['name']}: {result['frames']} кадров, {result['fps']:.1f} кадр/с, "
+          f"движение в {result['motion_frames']}, пик памяти {rss}")
+    for stage, stats in result["stages"].items():
+        if stats["count"]:
+            print(f"    {stage:<12} n={stats['count']:<6} p50 {stats['p50_ms']:7.2f}  "
+                  f"p95 {stats['p95_ms']:7.2f}  p99 {stats['p99_ms']:7.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Замер производительности конвейера детекции на записанном видео")
+    parser.add_argument("--video", action="append", default=[],
+                        help="видеофайл для прогона (можно несколько раз)")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="добавить синтетический источник (по умолчанию, если нет --video)")
+    parser.add_argument("--resolution", action="append", type=parse_resolution,
+                        help="разрешение кадров ШИРИНАxВЫСОТА (можно несколько раз)")
+    parser.add_argument("--processing-width", type=lambda text: [int(v) for v in text.split(",")],
+                        default=[640], help="ширины обработки через запятую (0 - исходная)")
+    parser.add_argument("--config", help="параметры детекции из JSON (см. DetectorConfig)")
+    parser.add_argument("--no-prefilter", action="store_true", help="отключить предфильтр")
+    parser.add_argument("--min-area-ratio", type=float, default=None,
+                        help="минимальная площадь объекта как доля кадра")
+    parser.add_argument("--stabilization-frames", type=int, default=None)
+    parser.add_argument("--yolo", action="store_true", help="распознавать объекты в кадрах с движением")
+    parser.add_argument("--yolo-input-size", type=int, default=416)
+    parser.add_argument("--classes", default="person,car,truck,bus,motorcycle,bicycle")
+    parser.add_argument("--min-confidence", type=float, default=0.5)
+    parser.add_argument("--frames", type=int, default=300, help="кадров в замере")
+    parser.add_argument("--warmup", type=int, default=50, help="кадров прогрева (не учитываются)")
+    parser.add_argument("--threads", type=int, default=-1,
+                        help="потоков OpenCV (-1 - по умолчанию)")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="сравнить с базовым замером из JSON")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое ухудшение относительно базового замера (доля)")
+    args = parser.parse_args()
+
+    # Каждый вариант идет в отдельном процессе: пик памяти и кэши OpenCV
+    # не переходят из одного замера в другой
+    context = mp.get_context("spawn")
+    results = []
+    for case in build_cases(args):
+        with context.Pool(1) as pool:
+            try:
+                result = pool.apply(run_case, (case,))
+            except RuntimeError as e:
+                print(f"{case['name']}: пропущен ({e})")
+                continue
+        print_result(result)
+        results.append(result)
+
+    report = {
+        "time": time.time(),
+        "opencv": cv2.__version__,
+        "cpu_count": os.cpu_count(),
+        "cases": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Сравнение с {args.baseline} (допуск {args.tolerance:.0%}):")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"  РЕГРЕССИЯ {regression}")
+        if regressions:
+            sys.exit(1)
+        print("  Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
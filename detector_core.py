@@ -0,0 +1,415 @@
+import json
+
+import cv2
+import numpy as np
+
+from motion_pipeline import MotionPipeline
+from motion_prefilter import MotionPrefilter
+from processing_scale import processing_scale, to_native_box
+from yolo_detector import decode_outputs, select_rois
+
+# Операции морфологии по именам (в конфигурации они хранятся строками)
+MORPH_OPS = {
+    "open": cv2.MORPH_OPEN,
+    "close": cv2.MORPH_CLOSE,
+    "erode": cv2.MORPH_ERODE,
+    "dilate": cv2.MORPH_DILATE,
+}
+
+# Состояния детектора после очередного кадра
+STABILIZING = "stabilizing"
+IDLE = "idle"
+ACTIVE = "active"
+
+
+def _no_lap(stage):
+    pass
+
+
+class DetectorConfig:
+    """Параметры детекции движения, общие для всех интерфейсов.
+
+    Значения по умолчанию - настройки детектора экрана. Параметры хранятся
+    атрибутами; update() меняет их и возвращает имена изменившихся,
+    load()/save() читают и пишут JSON. aspect_max=None снимает верхний
+    предел соотношения сторон, нулевые aspect_min и extent_min отключают
+    фильтр по форме, blur_size=0 - размытие.
+    """
+
+    DEFAULTS = {
+        # Минимальная площадь объекта - доля площади кадра
+        "min_area_ratio": 0.02,
+        "aspect_min": 0.2,
+        "aspect_max": 5.0,
+        "extent_min": 0.3,
+        # Ширина копии для детекции (0 - исходное разрешение)
+        "processing_width": 640,
+        "stabilization_frames": 30,
+        "blur_size": 21,
+        "morph_size": 5,
+        "morph_ops": ("close", "open"),
+        "history": 500,
+        "var_threshold": 50,
+        "detect_shadows": True,
+        # Дешевая проверка разности кадров перед полным конвейером
+        "prefilter": True,
+        "prefilter_scale": 0.125,
+        "prefilter_wake_ratio": 0.002,
+        # При сдвиге области больше этой доли стороны кадра модель фона
+        # строится заново со стабилизацией, меньший сдвиг компенсируется
+        "shift_reset_ratio": 0.25,
+    }
+
+    # При смене этих параметров модель фона и буферы создаются заново
+    REBUILD = {"processing_width", "blur_size", "morph_size", "morph_ops", "history",
+               "var_threshold", "detect_shadows", "prefilter", "prefilter_scale",
+               "prefilter_wake_ratio"}
+
+    def __init__(self, **options):
+        for name, value in self.DEFAULTS.items():
+            setattr(self, name, value)
+        self.update(**options)
+
+    def update(self, **options):
+        """Меняет параметры; возвращает множество изменившихся имен"""
+        unknown = set(options) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Неизвестные параметры детекции: {', '.join(sorted(unknown))}")
+        changed = set()
+        for name, value in options.items():
+            if name == "morph_ops":
+                value = tuple(value)
+                missing = [op for op in value if op not in MORPH_OPS]
+                if missing:
+                    raise ValueError(f"Неизвестные операции морфологии: {', '.join(missing)}")
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed.add(name)
+        return changed
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.DEFAULTS}
+
+    def copy(self):
+        return DetectorConfig(**self.to_dict())
+
+    @classmethod
+    def load(cls, path, **overrides):
+        """Читает параметры из JSON-файла; overrides имеют приоритет"""
+        with open(path, "r", encoding="utf-8") as f:
+            options = json.load(f)
+        options.update(overrides)
+        return cls(**options)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+class MotionDetector:
+    """Детекция движения MOG2 без привязки к интерфейсу, захвату и потокам.
+
+    Кадр обрабатывается в ширине не больше processing_width, порог площади
+    задается долей кадра, а области движения и площадь возвращаются в
+    координатах исходного кадра. После каждого кадра state показывает,
+    что с ним произошло: STABILIZING (модель фона еще учится), IDLE
+    (предфильтр не увидел изменений) или ACTIVE (работал полный конвейер),
+    а mask хранит последнюю маску переднего плана. Если передан metrics,
+    время каждого этапа попадает в его гистограммы.
+    """
+
+    def __init__(self, config=None, metrics=None, **options):
+        self.config = config if config is not None else DetectorConfig()
+        if options:
+            self.config.update(**options)
+        self.metrics = metrics
+        self._build()
+
+    def _build(self):
+        config = self.config
+        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=config.history, varThreshold=config.var_threshold,
+            detectShadows=config.detect_shadows)
+        self.pipeline = MotionPipeline(blur_size=config.blur_size or 1,
+                                       morph_size=config.morph_size,
+                                       morph_ops=[MORPH_OPS[op] for op in config.morph_ops])
+        self.prefilter = None
+        if config.prefilter:
+            self.prefilter = MotionPrefilter(scale=config.prefilter_scale,
+                                             wake_ratio=config.prefilter_wake_ratio)
+        self.frame_count = 0
+        self.state = STABILIZING
+        self.mask = None
+        self.pending_shift = None
+        self.prefilter_input_scale = 1.0
+        # Кадров в модели фона с момента ее создания и признак того, что
+        # модель инициализирована заново сдвинутым фоном (см. _learning_rate)
+        self.model_frames = 0
+        self.seeded = False
+
+        # Статистика
+        self.shifts_compensated = 0
+        self.shift_resets = 0
+
+    def configure(self, **options):
+        """Меняет параметры; при необходимости заново создает модель фона"""
+        changed = self.config.update(**options)
+        if changed & DetectorConfig.REBUILD:
+            self._build()
+        return changed
+
+    def reset(self):
+        """Начинает стабилизацию заново, сохраняя модель фона (например, при запуске)"""
+        self.frame_count = 0
+        self.state = STABILIZING
+        if self.prefilter is not None:
+            self.prefilter.reset()
+
+    def shift(self, dx, dy):
+        """Сообщает, что область кадра сместилась на (dx, dy) пикселей исходного кадра.
+
+        Модель MOG2 нельзя сдвинуть напрямую, поэтому на следующем кадре она
+        инициализируется заново сдвинутым фоновым изображением, а открывшиеся
+        у края полосы берутся из нового кадра: все остальные пиксели остаются
+        фоном, и повторная стабилизация не нужна. Сдвиг больше
+        shift_reset_ratio стороны кадра компенсировать нечем - тогда модель
+        строится по новому кадру и стабилизация начинается заново.
+        """
+        if not dx and not dy:
+            return
+        # Кадр префильтра сдвигается сразу, поэтому получает только новый
+        # сдвиг; модель MOG2 сдвигается на следующем кадре на сумму сдвигов
+        if self.prefilter is not None:
+            self.prefilter.shift(dx * self.prefilter_input_scale, dy * self.prefilter_input_scale)
+        if self.pending_shift is not None:
+            dx += self.pending_shift[0]
+            dy += self.pending_shift[1]
+        self.pending_shift = (dx, dy)
+
+    def _compensate_shift(self, gray, scale):
+        dx, dy = self.pending_shift
+        self.pending_shift = None
+        height, width = gray.shape[:2]
+        shift_x, shift_y = dx * scale, dy * scale
+        current = self.pipeline.blur(gray) if self.config.blur_size else gray
+
+        background = None
+        if self.frame_count > 1:
+            background = self.background_subtractor.getBackgroundImage()
+        limit = self.config.shift_reset_ratio
+        if (background is None or background.shape[:2] != (height, width) or
+                abs(shift_x) > limit * width or abs(shift_y) > limit * height):
+            # Модель строится по новому кадру, стабилизация - заново
+            self.pipeline.update_background(self.background_subtractor, current, 1.0)
+            self.frame_count = 1
+            self.model_frames = 1
+            self.seeded = False
+            self.shift_resets += 1
+            return
+
+        # Фон сдвигается против движения области; полосы у края - из нового кадра
+        transform = np.float32([[1, 0, -shift_x], [0, 1, -shift_y]])
+        seed = cv2.warpAffine(background, transform, (width, height), borderMode=cv2.BORDER_REPLICATE)
+        strip_x = min(width, int(np.ceil(abs(shift_x))))
+        strip_y = min(height, int(np.ceil(abs(shift_y))))
+        if strip_x:
+            columns = slice(width - strip_x, width) if shift_x > 0 else slice(0, strip_x)
+            seed[:, columns] = current[:, columns]
+        if strip_y:
+            rows = slice(height - strip_y, height) if shift_y > 0 else slice(0, strip_y)
+            seed[rows, :] = current[rows, :]
+        # learningRate=1 заново инициализирует модель этим изображением
+        self.pipeline.update_background(self.background_subtractor, seed, 1.0)
+        self.seeded = True
+        self.shifts_compensated += 1
+
+    def _learning_rate(self):
+        """Шаг обучения MOG2 для очередного кадра (-1 - автоматический).
+
+        После инициализации сдвинутым фоном MOG2 начал бы учиться с нуля
+        (шаг 1/2, 1/4, ...) и быстро впитал бы движущиеся объекты в фон,
+        поэтому шаг продолжает его обычное расписание 1/min(2n, history) с
+        учетом кадров, уже накопленных моделью.
+        """
+        self.model_frames += 1
+        if not self.seeded:
+            return -1
+        return 1.0 / min(2 * self.model_frames, max(1, self.config.history))
+
+    @property
+    def stabilization_left(self):
+        """Сколько кадров осталось до конца стабилизации фона"""
+        return max(0, self.config.stabilization_frames - self.frame_count)
+
+    def detect(self, frame):
+        """Обрабатывает кадр BGR; возвращает (области движения, наибольшая площадь) или None"""
+        lap = self.metrics.lap_timer() if self.metrics is not None else _no_lap
+        scale = processing_scale(frame.shape, self.config.processing_width)
+        gray = self.pipeline.gray(self.pipeline.scaled(frame, scale))
+        lap("gray")
+        self.prefilter_input_scale = scale
+        if self.prefilter is not None:
+            # Масштаб предфильтра задан от исходного кадра, как в detect_gray()
+            self.prefilter.scale = min(1.0, self.config.prefilter_scale / scale)
+        active = self.prefilter is None or self.prefilter.check(gray)
+        lap("prefilter")
+        return self._detect(gray, scale, active, lap)
+
+    def detect_gray(self, gray):
+        """То же для готового кадра в градациях серого исходного размера.
+
+        Предфильтр сравнивает исходный кадр, поэтому замечает и мелкое
+        движение, которое теряется при уменьшении до processing_width.
+        """
+        lap = self.metrics.lap_timer() if self.metrics is not None else _no_lap
+        self.prefilter_input_scale = 1.0
+        active = self.prefilter is None or self.prefilter.check(gray)
+        scale = processing_scale(gray.shape, self.config.processing_width)
+        small_gray = self.pipeline.scaled(gray, scale)
+        lap("prefilter")
+        return self._detect(small_gray, scale, active, lap)
+
+    def _detect(self, gray, scale, active, lap):
+        config = self.config
+        self.frame_count += 1
+        if self.pending_shift is not None:
+            self._compensate_shift(gray, scale)
+            lap("shift")
+        if self.frame_count <= config.stabilization_frames:
+            # Стабилизация фона - по тем же размытым кадрам, что и детекция,
+            # иначе первый кадр после нее отличается от модели по всем контурам
+            if config.blur_size:
+                gray = self.pipeline.blur(gray)
+            self.mask = self.pipeline.update_background(self.background_subtractor, gray,
+                                                        self._learning_rate())
+            lap("mog2")
+            self.state = STABILIZING
+            return None
+
+        if not active:
+            # Сцена неподвижна: фон обновляется изредка, полный конвейер не нужен
+            if self.prefilter.background_due():
+                history = self.background_subtractor.getHistory()
+                blurred = self.pipeline.blur(gray) if config.blur_size else gray
+                self.pipeline.update_background(self.background_subtractor, blurred,
+                                                self.prefilter.learning_rate(history))
+                lap("background")
+            self.state = IDLE
+            return None
+
+        self.state = ACTIVE
+        if config.blur_size:
+            gray = self.pipeline.blur(gray)
+            lap("blur")
+        fg_mask = self.pipeline.update_background(self.background_subtractor, gray,
+                                                  self._learning_rate())
+        lap("mog2")
+        fg_mask = self.pipeline.clean(fg_mask)
+        lap("morphology")
+        self.mask = fg_mask
+        contours = self.pipeline.contours(fg_mask)
+
+        motion_boxes = []
+        largest_area = 0
+        min_area = config.min_area_ratio * gray.shape[0] * gray.shape[1]
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area <= min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            if not self._shape_matches(area, w, h):
+                continue
+            motion_boxes.append(to_native_box((x, y, w, h), scale))
+            largest_area = max(largest_area, area / (scale * scale))
+        lap("contours")
+        if not motion_boxes:
+            return None
+        return motion_boxes, largest_area
+
+    def _shape_matches(self, area, w, h):
+        """Фильтр по соотношению сторон и экстенту (доле заполнения рамки)"""
+        config = self.config
+        aspect_ratio = w / h if h > 0 else 0
+        if aspect_ratio <= config.aspect_min:
+            return False
+        if config.aspect_max is not None and aspect_ratio >= config.aspect_max:
+            return False
+        rect_area = w * h
+        extent = float(area) / rect_area if rect_area > 0 else 0
+        return extent > config.extent_min
+
+    def stats(self):
+        stats = {"frames": self.frame_count, "state": self.state,
+                 "reallocations": self.pipeline.reallocations,
+                 "shifts_compensated": self.shifts_compensated,
+                 "shift_resets": self.shift_resets}
+        if self.prefilter is not None:
+            stats["prefilter"] = self.prefilter.stats()
+        return stats
+
+
+def load_classes(path="coco.names"):
+    """Имена классов COCO из файла (пустой список, если файла нет)"""
+    try:
+        with open(path, "r") as f:
+            return [line.strip() for line in f.readlines()]
+    except OSError:
+        return []
+
+
+def class_filter_ids(classes, target_classes):
+    """Переводит имена целевых классов в массив id (None - все классы)"""
+    if target_classes is None:
+        return None
+    target = set(target_classes)
+    return np.array([i for i, name in enumerate(classes) if name in target], dtype=int)
+
+
+class ObjectDetector:
+    """Распознавание объектов YOLO в областях движения.
+
+    При roi_detection сеть обрабатывает только участки вокруг областей
+    движения (одним вызовом), иначе - весь кадр. target_classes - имена
+    классов, которые нужно оставить (None - все).
+    """
+
+    def __init__(self, engine, classes, target_classes=None, min_confidence=0.5,
+                 roi_detection=True, roi_padding=32, roi_min_size=96, roi_max_count=4,
+                 metrics=None):
+        self.engine = engine
+        self.classes = classes
+        self.min_confidence = min_confidence
+        self.roi_detection = roi_detection
+        self.roi_padding = roi_padding
+        self.roi_min_size = roi_min_size
+        self.roi_max_count = roi_max_count
+        self.metrics = metrics
+        self.set_targets(target_classes)
+
+    def set_targets(self, target_classes):
+        """Задает целевые классы; id пересчитываются для фильтрации выходов сети"""
+        self.class_filter = class_filter_ids(self.classes, target_classes)
+
+    def detect(self, frame, motion_boxes=None):
+        """Возвращает [(класс, уверенность, [x, y, w, h])]"""
+        lap = self.metrics.lap_timer() if self.metrics is not None else _no_lap
+        height, width = frame.shape[:2]
+        rois = None
+        if self.roi_detection and motion_boxes:
+            rois = select_rois(motion_boxes, frame.shape, self.roi_padding,
+                               self.roi_min_size, self.roi_max_count)
+        if rois is None:
+            rois = [(0, 0, width, height)]
+
+        outs = self.engine.forward(frame, rois)
+        lap("yolo_forward")
+
+        # Выходы сети декодируются целиком, классы фильтруются до NMS
+        boxes, confidences, class_ids = decode_outputs(outs, rois, self.min_confidence,
+                                                       self.class_filter)
+        lap("yolo_decode")
+        return [
+            (self.classes[class_id] if class_id < len(self.classes) else str(class_id),
+             float(confidence), box.tolist())
+            for box, confidence, class_id in zip(boxes, confidences, class_ids)
+        ]
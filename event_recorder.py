@@ -0,0 +1,263 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+_STOP = object()
+_FINISH = object()
+
+
+class EventRecorder:
+    """Запись клипов движения с предзаписью и дозаписью.
+
+    push() передает кадры фоновому потоку, который держит в кольцевом буфере
+    последние pre_roll секунд кадров в виде JPEG - так память ограничена при
+    любом разрешении. trigger() начинает клип (или продлевает текущий): поток
+    записывает через cv2.VideoWriter буфер предзаписи, затем живые кадры,
+    пока после последнего движения не пройдет post_roll секунд (но не дольше
+    max_clip). Кадры дублируются или пропускаются по их времени, поэтому клип
+    идет в реальном времени и при переменной частоте захвата. Клип пишется во
+    временную папку и переносится на место целиком.
+    """
+
+    def __init__(self, fps=20, pre_roll=3.0, post_roll=3.0, max_clip=60.0,
+                 fourcc="mp4v", extension=".mp4", quality=80, queue_size=32,
+                 on_saved=None):
+        self.fps = fps
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_clip = max_clip
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.extension = extension
+        self.quality = quality
+        self.on_saved = on_saved
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        # Запрос end_clip(): клип завершается, когда поток записи дойдет до
+        # кадра номер finish_after (кадры, переданные до запроса, войдут в клип)
+        self.pushed = 0
+        self.consumed = 0
+        self.finish_after = None
+        # Кольцевой буфер (время, JPEG); длина - страховка на случай скачка FPS
+        self.ring = deque(maxlen=max(1, int(pre_roll * fps * 2)))
+
+        # Состояние текущего события (защищено self.lock)
+        self.clip_path = None
+        self.clip_started = 0.0
+        self.event_end = 0.0
+
+        # Состояние записи (только в фоновом потоке)
+        self.video_writer = None
+        self.temp_path = None
+        self.frame_size = None
+        self.clip_start_time = 0.0
+        self.clip_frames = 0
+
+        # Статистика
+        self.clips = 0
+        self.frames_written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self.thread = threading.Thread(target=self._run, name="event-recorder")
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def recording(self):
+        with self.lock:
+            return self.clip_path is not None
+
+    def push(self, frame, timestamp=None, copy=True):
+        """Передает кадр в буфер предзаписи или в текущий клип"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            try:
+                self.queue.put_nowait((frame.copy() if copy else frame, timestamp))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.pushed += 1
+            return True
+
+    def trigger(self, directory, basename, timestamp=None):
+        """Отмечает движение в момент timestamp.
+
+        Если клип уже пишется, продлевает его дозапись и возвращает None,
+        иначе начинает новый клип directory/basename.<расширение> и
+        возвращает его путь.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            if self.clip_path is not None:
+                self.event_end = min(max(self.event_end, timestamp + self.post_roll),
+                                     self.clip_started + self.max_clip)
+                return None
+            self.clip_path = os.path.join(directory, basename + self.extension)
+            self.clip_started = timestamp
+            self.event_end = timestamp + self.post_roll
+            return self.clip_path
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                self._finish()
+                return
+            with self.lock:
+                finish = self.finish_after is not None and self.consumed >= self.finish_after
+                if finish:
+                    self.finish_after = None
+            if finish:
+                self._finish()
+            if item is _FINISH:
+                # Только будит поток: сам запрос хранится в finish_after
+                continue
+            self.consumed += 1
+            frame, timestamp = item
+
+            with self.lock:
+                clip_path = self.clip_path
+                finished = clip_path is not None and timestamp > self.event_end
+                if finished:
+                    # Событие завершается под той же блокировкой: trigger() после
+                    # этого начнет новый клип, а не продлит закрываемый
+                    self.clip_path = None
+
+            if finished:
+                self._finish(clip_path)
+            elif clip_path is not None:
+                if self.video_writer is None and not self._open(clip_path, frame, timestamp):
+                    continue
+                self._write(frame, timestamp)
+                continue
+
+            # Вне клипа (и кадр, завершивший клип) кадр сжимается в буфер
+            # предзаписи - он войдет в предзапись следующего события
+            self._buffer(frame, timestamp)
+
+    def _buffer(self, frame, timestamp):
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        if not ok:
+            return
+        self.ring.append((timestamp, data))
+        while self.ring and self.ring[0][0] < timestamp - self.pre_roll:
+            self.ring.popleft()
+
+    def _open(self, clip_path, frame, timestamp):
+        """Открывает VideoWriter и записывает в него буфер предзаписи"""
+        height, width = frame.shape[:2]
+        temp_dir = os.path.join(os.path.dirname(clip_path), ".recording")
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Ошибка создания папки для клипов: {e}")
+            self._abort()
+            return False
+
+        # Временный файл лежит в отдельной папке, чтобы недописанный клип
+        # не попадал в счетчик, и сохраняет расширение (по нему выбирается контейнер)
+        self.temp_path = os.path.join(temp_dir, os.path.basename(clip_path))
+        self.video_writer = cv2.VideoWriter(self.temp_path, self.fourcc, self.fps, (width, height))
+        if not self.video_writer.isOpened():
+            print(f"Не удалось открыть запись клипа: {clip_path}")
+            self.video_writer = None
+            self._abort()
+            return False
+        self.frame_size = (width, height)
+        self.clip_start_time = self.ring[0][0] if self.ring else timestamp
+        self.clip_frames = 0
+
+        for ring_time, data in self.ring:
+            self._write(cv2.imdecode(data, cv2.IMREAD_COLOR), ring_time)
+        self.ring.clear()
+        return True
+
+    def _write(self, frame, timestamp):
+        if frame is None:
+            return
+        # Сколько кадров должно быть в клипе к этому моменту при постоянной fps;
+        # длинный пропуск заполняется не больше чем секундой повторов
+        due = int(round((timestamp - self.clip_start_time) * self.fps)) + 1
+        repeats = min(due - self.clip_frames, max(1, int(self.fps)))
+        if repeats <= 0:
+            return
+        if (frame.shape[1], frame.shape[0]) != self.frame_size:
+            # Область захвата могла измениться - VideoWriter требует постоянный размер
+            frame = cv2.resize(frame, self.frame_size)
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        frame = np.ascontiguousarray(frame)
+        for _ in range(repeats):
+            self.video_writer.write(frame)
+        # После урезанного пропуска отсчет продолжается с текущего момента
+        self.clip_frames = due
+        self.frames_written += 1
+
+    def _finish(self, clip_path=None):
+        """Закрывает текущий клип и переносит его на место"""
+        if clip_path is None:
+            with self.lock:
+                clip_path = self.clip_path
+                self.clip_path = None
+        if self.video_writer is None:
+            return
+
+        self.video_writer.release()
+        self.video_writer = None
+        try:
+            os.replace(self.temp_path, clip_path)
+            self.clips += 1
+            if self.on_saved is not None:
+                self.on_saved(clip_path, os.path.getsize(clip_path))
+        except OSError as e:
+            print(f"Ошибка сохранения клипа {clip_path}: {e}")
+            self.failed += 1
+        try:
+            # Пустая временная папка не остается рядом с клипами; если в ней
+            # пишет клип другой записи, папка не пуста и остается
+            os.rmdir(os.path.dirname(self.temp_path))
+        except OSError:
+            pass
+        self.temp_path = None
+
+    def _abort(self):
+        with self.lock:
+            self.clip_path = None
+        self.failed += 1
+
+    def end_clip(self):
+        """Завершает текущий клип, не дожидаясь дозаписи (например, при остановке).
+
+        Не блокирует поток GUI: если очередь заполнена, клип завершится на
+        первом кадре, переданном после вызова, или при close().
+        """
+        with self.lock:
+            self.finish_after = self.pushed
+        try:
+            self.queue.put_nowait(_FINISH)
+        except queue.Full:
+            pass
+
+    def close(self):
+        """Дописывает очередь кадров и закрывает текущий клип"""
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clips": self.clips,
+                "frames": self.frames_written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "buffered": len(self.ring),
+                "recording": self.clip_path is not None,
+            }
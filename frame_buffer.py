@@ -0,0 +1,224 @@
+import threading
+import time
+
+import numpy as np
+
+# Политики переполнения буфера
+DROP_OLDEST = "drop_oldest"  # Новый кадр вытесняет самый старый
+DROP_NEWEST = "drop_newest"  # Новый кадр отбрасывается, пока есть место
+
+
+class FrameRingBuffer:
+    """Кольцевой буфер кадров фиксированного размера с заранее выделенной памятью"""
+
+    def __init__(self, capacity, shape, dtype=np.uint8, policy=DROP_OLDEST):
+        if capacity < 2:
+            raise ValueError("Размер буфера должен быть не меньше 2")
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Неизвестная политика переполнения: {policy}")
+
+        self.capacity = capacity
+        self.policy = policy
+        self.dtype = dtype
+        self.condition = threading.Condition()
+
+        # Статистика
+        self.written = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.last_seq = 0  # Номера кадров монотонны и при перевыделении
+
+        self._allocate(shape)
+
+    def _allocate(self, shape):
+        """Выделяет память под все слоты буфера"""
+        self.shape = tuple(shape)
+        self.slots = np.empty((self.capacity,) + self.shape, dtype=self.dtype)
+        self.slot_seq = [0] * self.capacity
+        self.slot_time = [0.0] * self.capacity
+        self.slot_meta = [None] * self.capacity
+        self.committed = []  # Индексы заполненных слотов, от старого к новому
+        self.free = list(range(self.capacity))
+        self.reserved = None
+
+    def ensure_shape(self, shape):
+        """Перевыделяет буфер, если изменился размер кадра"""
+        with self.condition:
+            if tuple(shape) != self.shape:
+                self._allocate(shape)
+                self.condition.notify_all()
+
+    def reserve(self):
+        """Возвращает (индекс, массив) свободного слота для записи или None"""
+        with self.condition:
+            if self.reserved is not None:
+                raise RuntimeError("Слот уже зарезервирован")
+
+            if not self.free:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return None
+                # Вытесняем самый старый кадр
+                self.free.append(self.committed.pop(0))
+                self.dropped += 1
+
+            index = self.free.pop()
+            self.reserved = index
+            return index, self.slots[index]
+
+    def commit(self, index, timestamp=None, meta=None):
+        """Публикует заполненный слот и будит потребителя.
+
+        meta - произвольные данные о кадре (например, захваченный прямоугольник).
+        """
+        with self.condition:
+            if self.reserved != index:
+                # Буфер был перевыделен во время записи - кадр устарел
+                return
+            self.reserved = None
+            self.last_seq += 1
+            self.slot_seq[index] = self.last_seq
+            self.slot_time[index] = timestamp if timestamp is not None else time.time()
+            self.slot_meta[index] = meta
+            self.committed.append(index)
+            self.written += 1
+            self.condition.notify_all()
+
+    def release(self, index):
+        """Возвращает зарезервированный слот без публикации (неудачный захват)"""
+        with self.condition:
+            if self.reserved == index:
+                self.reserved = None
+                self.free.append(index)
+
+    def _wait(self, after_seq, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.committed or self.slot_seq[self.committed[-1]] <= after_seq:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.condition.wait(remaining)
+        return True
+
+    def _read(self, index, out):
+        # Копируем слот в буфер потребителя; при смене размера выделяем новый
+        if out is None or out.shape != self.shape:
+            out = np.empty(self.shape, dtype=self.dtype)
+        np.copyto(out, self.slots[index])
+        self.free.append(index)
+        return out, self.slot_seq[index], self.slot_time[index], self.slot_meta[index]
+
+    def get_latest(self, out=None, after_seq=0, timeout=None):
+        """Копирует самый новый кадр в out, отбрасывая более старые.
+
+        Возвращает (кадр, seq, timestamp, meta) или None по таймауту.
+        """
+        with self.condition:
+            if not self._wait(after_seq, timeout):
+                return None
+            index = self.committed.pop()
+            self.skipped += len(self.committed)
+            self.free.extend(self.committed)
+            self.committed = []
+            return self._read(index, out)
+
+    def get_next(self, out=None, after_seq=0, timeout=None):
+        """Копирует самый старый непрочитанный кадр в out (режим FIFO)"""
+        with self.condition:
+            if not self._wait(after_seq, timeout):
+                return None
+            # Кадры не новее after_seq уже неинтересны потребителю
+            while self.slot_seq[self.committed[0]] <= after_seq:
+                self.free.append(self.committed.pop(0))
+                self.skipped += 1
+            return self._read(self.committed.pop(0), out)
+
+    def clear(self):
+        """Отбрасывает все непрочитанные кадры"""
+        with self.condition:
+            self.free.extend(self.committed)
+            self.committed = []
+
+    def stats(self):
+        """Возвращает статистику буфера"""
+        with self.condition:
+            return {
+                "written": self.written,
+                "dropped": self.dropped,
+                "skipped": self.skipped,
+                "pending": len(self.committed),
+            }
+
+
+class CaptureThread:
+    """Поток-производитель, заполняющий кольцевой буфер кадрами.
+
+    grab_into(out) должен записать кадр в массив out и вернуть True (или
+    метаданные кадра для слота), либо False, если кадр получить не удалось.
+    Если передан metrics, время захвата попадает в этап "capture", а
+    полученные кадры - в счетчик "captured_frames". on_frame() вызывается
+    после того, как кадр опубликован в буфере.
+    """
+
+    def __init__(self, buffer, grab_into, fps=20, name="capture", metrics=None,
+                 on_frame=None):
+        self.buffer = buffer
+        self.grab_into = grab_into
+        self.on_frame = on_frame
+        self.fps = fps
+        self.name = name
+        self.metrics = metrics
+        self.errors = 0
+        self.grab_seconds = None  # Время последнего захвата, для контроля частоты
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Останавливает поток; возвращает False, если он не завершился за timeout"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return False
+            self._thread = None
+        return True
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            started = time.time()
+            slot = self.buffer.reserve()
+            if slot is not None:
+                index, out = slot
+                try:
+                    ok = self.grab_into(out)
+                except Exception as e:
+                    print(f"Ошибка захвата кадра: {e}")
+                    self.errors += 1
+                    ok = False
+                self.grab_seconds = time.time() - started
+                if ok:
+                    self.buffer.commit(index, started, None if ok is True else ok)
+                    if self.on_frame is not None:
+                        self.on_frame()
+                    if self.metrics is not None:
+                        self.metrics.observe("capture", self.grab_seconds)
+                        self.metrics.mark_frame("captured_frames")
+                else:
+                    self.buffer.release(index)
+                    self._stop_event.wait(0.1)
+                    continue
+
+            # Выдерживаем заданную частоту захвата
+            if self.fps:
+                delay = 1.0 / self.fps - (time.time() - started)
+                if delay > 0:
+                    self._stop_event.wait(delay)
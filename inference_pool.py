@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import deque
+
+
+def box_iou(a, b):
+    """IoU двух прямоугольников (x, y, w, h)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def boxes_similar(boxes_a, boxes_b, min_iou):
+    """Проверяет, что два набора областей движения практически совпадают"""
+    if len(boxes_a) != len(boxes_b):
+        return False
+    remaining = list(boxes_b)
+    for box in boxes_a:
+        best = max(remaining, key=lambda other: box_iou(box, other))
+        if box_iou(box, best) < min_iou:
+            return False
+        remaining.remove(best)
+    return True
+
+
+class InferenceJob:
+    """Задание на распознавание: кадр, области движения и контекст вызывающего"""
+
+    def __init__(self, seq, frame, boxes, context, key=None):
+        self.seq = seq
+        self.frame = frame
+        self.boxes = boxes
+        self.context = context
+        self.key = key
+        self.submitted = time.time()
+
+
+class InferencePool:
+    """Пул потоков для асинхронного распознавания объектов.
+
+    detect_fn(frame, boxes) выполняет распознавание и возвращает результат,
+    который кэшируется по областям движения: пока области почти не меняются,
+    lookup() отдает сохраненный результат и новый запуск сети не нужен.
+    Готовые результаты передаются в on_result(frame, boxes, result, context).
+    Если detect_fn вернула None или выбросила исключение, результат не
+    кэшируется и не передается - иначе неудача выдавалась бы за "объектов нет".
+    При нескольких потоках detect_fn должна быть потокобезопасной.
+    Если пул обслуживает несколько источников, key (например, имя источника)
+    разделяет их кэш и очередь: совпадения ищутся только среди заданий с тем же key.
+    """
+
+    def __init__(self, detect_fn, on_result=None, workers=1, queue_size=2,
+                 cache_size=8, cache_iou=0.6, cache_ttl=2.0):
+        self.detect_fn = detect_fn
+        self.on_result = on_result
+        self.workers = workers
+        self.queue_size = queue_size
+        self.cache_iou = cache_iou
+        self.cache_ttl = cache_ttl
+
+        self.condition = threading.Condition()
+        self.jobs = deque()
+        self.in_flight = []
+        self.cache = deque(maxlen=cache_size)  # (key, boxes, result, время)
+        self.seq = 0
+        self.delivered_seq = {}  # Последний выданный номер задания для каждого key
+        self.running = False
+        self.threads = []
+
+        # Статистика
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.stale = 0
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"inference-{i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=2.0):
+        with self.condition:
+            self.running = False
+            self.dropped += len(self.jobs)
+            self.jobs.clear()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def lookup(self, boxes, key=None):
+        """Возвращает кэшированный результат для похожих областей движения или None"""
+        now = time.time()
+        with self.condition:
+            for key_cached, boxes_cached, result, stored in reversed(self.cache):
+                if key_cached != key or now - stored > self.cache_ttl:
+                    continue
+                if boxes_similar(boxes, boxes_cached, self.cache_iou):
+                    self.cache_hits += 1
+                    return result
+        return None
+
+    def submit(self, frame, boxes, context=None, key=None):
+        """Ставит кадр в очередь на распознавание.
+
+        Кадр должен принадлежать пулу (передавайте копию). Задания с похожими
+        областями из более старых кадров устаревают и удаляются из очереди.
+        """
+        with self.condition:
+            if not self.running:
+                return False
+
+            # Такие же области уже распознаются - результат скоро попадет в кэш
+            for job in self.in_flight:
+                if job.key == key and boxes_similar(boxes, job.boxes, self.cache_iou):
+                    self.coalesced += 1
+                    return False
+
+            for job in list(self.jobs):
+                if job.key == key and boxes_similar(boxes, job.boxes, self.cache_iou):
+                    self.jobs.remove(job)
+                    self.stale += 1
+
+            while len(self.jobs) >= self.queue_size:
+                self.jobs.popleft()
+                self.dropped += 1
+
+            self.seq += 1
+            self.jobs.append(InferenceJob(self.seq, frame, boxes, context, key))
+            self.submitted += 1
+            self.condition.notify()
+            return True
+
+    def clear_cache(self):
+        """Сбрасывает кэш (например, после смены настроек распознавания)"""
+        with self.condition:
+            self.cache.clear()
+
+    def pending(self):
+        with self.condition:
+            return len(self.jobs) + len(self.in_flight)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "stale": self.stale,
+                "coalesced": self.coalesced,
+                "cache_hits": self.cache_hits,
+                "queued": len(self.jobs),
+            }
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.jobs:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                job = self.jobs.popleft()
+                self.in_flight.append(job)
+
+            try:
+                result = self.detect_fn(job.frame, job.boxes)
+            except Exception as e:
+                print(f"Ошибка при распознавании объектов: {e}")
+                result = None
+
+            with self.condition:
+                self.in_flight.remove(job)
+                if result is None:
+                    continue
+                self.completed += 1
+                self.cache.append((job.key, job.boxes, result, time.time()))
+                # Результат для кадра старше уже показанного не передаем
+                if job.seq < self.delivered_seq.get(job.key, 0):
+                    self.stale += 1
+                    continue
+                self.delivered_seq[job.key] = job.seq
+
+            if self.on_result is not None:
+                try:
+                    self.on_result(job.frame, job.boxes, result, job.context)
+                except Exception as e:
+                    print(f"Ошибка обработки результата распознавания: {e}")
@@ -3,6 +3,10 @@ import numpy as np
 import os
 from datetime import datetime
 import time
+from screenshot_writer import ScreenshotWriter
+from screenshot_index import ScreenshotIndex
+from event_recorder import EventRecorder
+from detector_core import STABILIZING, DetectorConfig, MotionDetector
 
 def motion_detection_screenshot():
     # Пробуем разные способы инициализации камеры
@@ -54,59 +58,70 @@ def motion_detection_screenshot():
         os.makedirs(screenshots_dir)
         print(f"Создана папка: {screenshots_dir}")
     
-    # Переменные для детекции движения
-    background_subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=True)
-    min_contour_area = 1000
+    # Скриншоты кодируются и пишутся в фоне, чтобы диск не тормозил детекцию
+    # Счетчик скриншотов ведется в памяти: папка сканируется один раз
+    screenshot_index = ScreenshotIndex(screenshots_dir, (".jpg", ".mp4"))
+    screenshot_writer = ScreenshotWriter(fmt="jpg", quality=90, on_saved=screenshot_index.add)
+    
+    # Вместо одиночных скриншотов записываются клипы с 3 секундами до и после движения
+    record_clips = True
+    event_recorder = EventRecorder(fps=30, pre_roll=3.0, post_roll=3.0,
+                                   on_saved=screenshot_index.add)
+    
+    # Детекция движения - общий детектор без GUI (detector_core). Кадр камеры
+    # обрабатывается целиком, без размытия и фильтра по форме; объект - от
+    # 1000 пикселей кадра 640x480
+    detector = MotionDetector(DetectorConfig(
+        min_area_ratio=1000 / (640 * 480), aspect_min=0, aspect_max=None, extent_min=0,
+        processing_width=0, blur_size=0, morph_size=3, morph_ops=("open",),
+        var_threshold=16, prefilter=False))
+    frame = None
     
     # Переменные для контроля частоты скриншотов
     last_screenshot_time = 0
     screenshot_interval = 2
     
-    # Счетчик кадров для стабилизации фона
-    frame_count = 0
-    
     print("Детекция движения запущена. Нажмите 'q' для выхода.")
     print(f"Скриншоты сохраняются в: {screenshots_dir}")
     print("Подождите несколько секунд для стабилизации фона...")
     
     while True:
-        ret, frame = cap.read()
+        # Кадр читается в тот же массив, что и в прошлой итерации
+        ret, frame = cap.read(frame)
         if not ret or frame is None:
+            frame = None
             print("Ошибка чтения кадра, попытка переподключения...")
             time.sleep(1)
             continue
         
-        frame_count += 1
-        
-        # Применяем фоновое вычитание только после стабилизации
-        if frame_count > 30:  # Даем время для стабилизации фона
-            fg_mask = background_subtractor.apply(frame)
-            
-            # Убираем шум
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
-            fg_mask = cv2.morphologyEx(fg_mask, cv2.MORPH_OPEN, kernel)
-            
-            # Находим контуры
-            contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
+        # Первые кадры детектор только обучает модель фона
+        detection = detector.detect(frame)
+        if detector.state != STABILIZING:
             # Проверяем наличие значительного движения
-            motion_detected = False
-            for contour in contours:
-                if cv2.contourArea(contour) > min_contour_area:
-                    motion_detected = True
-                    # Рисуем прямоугольник вокруг движущегося объекта
-                    x, y, w, h = cv2.boundingRect(contour)
+            motion_detected = detection is not None
+            if motion_detected:
+                # Рисуем прямоугольники вокруг движущихся объектов
+                for x, y, w, h in detection[0]:
                     cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
             
+            # Каждый кадр с движением продлевает текущий клип
+            if motion_detected and record_clips:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                clip_path = event_recorder.trigger(screenshots_dir, f"motion_{timestamp}")
+                if clip_path:
+                    print(f"Движение обнаружено! Записывается клип: {os.path.basename(clip_path)}")
+            
             # Делаем скриншот при обнаружении движения
             current_time = time.time()
-            if motion_detected and (current_time - last_screenshot_time) > screenshot_interval:
+            if (motion_detected and not record_clips and
+                    (current_time - last_screenshot_time) > screenshot_interval):
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                screenshot_filename = f"motion_detected_{timestamp}.jpg"
-                screenshot_path = os.path.join(screenshots_dir, screenshot_filename)
-                
-                cv2.imwrite(screenshot_path, frame)
-                print(f"Движение обнаружено! Скриншот сохранен: {screenshot_filename}")
+                screenshot_path = screenshot_writer.save(frame, screenshots_dir,
+                                                         f"motion_detected_{timestamp}")
+                if screenshot_path:
+                    print(f"Движение обнаружено! Скриншот сохраняется: {os.path.basename(screenshot_path)}")
+                else:
+                    print("Движение обнаружено, но очередь записи переполнена - скриншот пропущен")
                 last_screenshot_time = current_time
             
             # Добавляем текст на изображение
@@ -114,22 +129,21 @@ def motion_detection_screenshot():
             color = (0, 0, 255) if motion_detected else (0, 255, 0)
             
             # Показываем маску движения
-            cv2.imshow('Motion Mask', fg_mask)
+            cv2.imshow('Motion Mask', detector.mask)
         else:
             # Пока идет стабилизация фона
-            background_subtractor.apply(frame)
-            status_text = f"Стабилизация фона... {30 - frame_count}"
+            status_text = f"Стабилизация фона... {detector.stabilization_left}"
             color = (255, 255, 0)
         
+        # Кадр попадает в буфер предзаписи или в текущий клип
+        if record_clips:
+            event_recorder.push(frame)
+        
         cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
         
         # Показываем количество сохраненных скриншотов
-        try:
-            screenshot_count = len([f for f in os.listdir(screenshots_dir) if f.endswith('.jpg')])
-            cv2.putText(frame, f"Скриншотов: {screenshot_count}", (10, 60), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        except:
-            pass
+        cv2.putText(frame, f"Скриншотов: {screenshot_index.count}", (10, 60), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
         
         # Отображаем видео
         cv2.imshow('Motion Detection', frame)
@@ -141,6 +155,13 @@ def motion_detection_screenshot():
     # Освобождаем ресурсы
     cap.release()
     cv2.destroyAllWindows()
+    
+    # Дописываем скриншоты, оставшиеся в очереди
+    screenshot_writer.close()
+    event_recorder.close()
+    screenshot_index.close()
+    print(f"Статистика записи клипов: {event_recorder.stats()}")
+    print(f"Статистика записи скриншотов: {screenshot_writer.stats()}")
     print("Детекция движения завершена.")
 
 if __name__ == "__main__":
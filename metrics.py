@@ -0,0 +1,244 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограммы задержек, в секундах
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Порт сервера метрик можно переопределить переменной окружения (0 - без сервера)
+PORT_ENV = "MOTION_METRICS_PORT"
+
+
+def metrics_port(default):
+    """Порт сервера метрик интерфейса: MOTION_METRICS_PORT или default (None - без сервера)"""
+    value = os.environ.get(PORT_ENV)
+    if value is None:
+        return default
+    try:
+        return int(value) or None
+    except ValueError:
+        print(f"Некорректный {PORT_ENV}={value!r}, используется порт {default}")
+        return default
+
+
+class Histogram:
+    """Гистограмма задержек: корзины для Prometheus и окно последних замеров для перцентилей"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=1024):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantiles(self, quantiles=QUANTILES):
+        if not self.recent:
+            return {q: None for q in quantiles}
+        values = sorted(self.recent)
+        last = len(values) - 1
+        return {q: values[min(last, int(round(q * last)))] for q in quantiles}
+
+
+class LapTimer:
+    """Замер этапов подряд: каждый вызов записывает время с предыдущего"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.last = time.perf_counter()
+
+    def __call__(self, stage):
+        now = time.perf_counter()
+        self.metrics.observe(stage, now - self.last)
+        self.last = now
+
+    def skip(self):
+        """Не учитывать время с предыдущего замера"""
+        self.last = time.perf_counter()
+
+
+class Metrics:
+    """Метрики конвейера: задержки этапов, счетчики, частота кадров и глубина очередей.
+
+    Этапы записываются через observe()/lap_timer(), счетчики - через inc(),
+    значения вроде глубины очередей снимаются при чтении функциями,
+    зарегистрированными в register_gauge(). Метрики отдаются в текстовом
+    формате Prometheus (render_prometheus, HTTP-сервер start_server) и в
+    JSON (snapshot, dump_json).
+    """
+
+    def __init__(self, namespace="motion_detector", fps_window=5.0):
+        self.namespace = namespace
+        self.fps_window = fps_window
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.frame_times = {}
+        self.server = None
+        self.server_thread = None
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def lap_timer(self):
+        return LapTimer(self)
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def mark_frame(self, name="frames"):
+        """Учитывает кадр: счетчик name и частота за последние fps_window секунд"""
+        now = time.time()
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+            times = self.frame_times.setdefault(name, deque())
+            times.append(now)
+            while times and times[0] < now - self.fps_window:
+                times.popleft()
+
+    def register_gauge(self, name, fn):
+        """fn() вызывается при чтении метрик и возвращает число (None - пропустить)"""
+        with self.lock:
+            self.gauges[name] = fn
+
+    def _fps(self, now):
+        rates = {}
+        for name, times in self.frame_times.items():
+            recent = [t for t in times if t >= now - self.fps_window]
+            rates[name] = len(recent) / self.fps_window
+        return rates
+
+    def _gauge_values(self):
+        values = {}
+        for name, fn in list(self.gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                value = None
+            if value is not None:
+                values[name] = float(value)
+        return values
+
+    def snapshot(self):
+        """Текущие метрики словарем (задержки в миллисекундах)"""
+        now = time.time()
+        with self.lock:
+            stages = {}
+            for stage, histogram in self.histograms.items():
+                quantiles = histogram.quantiles()
+                stages[stage] = {
+                    "count": histogram.count,
+                    "mean_ms": 1000 * histogram.total / max(1, histogram.count),
+                    **{f"p{int(q * 100)}_ms": None if v is None else 1000 * v
+                       for q, v in quantiles.items()},
+                }
+            counters = dict(self.counters)
+            fps = self._fps(now)
+            gauges = self.gauges
+        return {
+            "time": now,
+            "stages": stages,
+            "counters": counters,
+            "fps": fps,
+            "gauges": self._gauge_values() if gauges else {},
+        }
+
+    def render_prometheus(self):
+        """Метрики в текстовом формате Prometheus"""
+        ns = self.namespace
+        lines = [f"# HELP {ns}_stage_seconds Время этапа обработки кадра",
+                 f"# TYPE {ns}_stage_seconds histogram"]
+        quantile_lines = []
+        now = time.time()
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{ns}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{ns}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{ns}_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{ns}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+                for q, value in histogram.quantiles().items():
+                    if value is not None:
+                        quantile_lines.append(
+                            f'{ns}_stage_quantile_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            counters = sorted(self.counters.items())
+            fps = sorted(self._fps(now).items())
+
+        lines.append(f"# TYPE {ns}_stage_quantile_seconds gauge")
+        lines.extend(quantile_lines)
+        for name, value in counters:
+            lines.append(f"# TYPE {ns}_{name}_total counter")
+            lines.append(f"{ns}_{name}_total {value}")
+        for name, value in fps:
+            lines.append(f"# TYPE {ns}_{name}_per_second gauge")
+            lines.append(f"{ns}_{name}_per_second {value:.3f}")
+        for name, value in sorted(self._gauge_values().items()):
+            lines.append(f"# TYPE {ns}_{name} gauge")
+            lines.append(f"{ns}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path):
+        """Сохраняет снимок метрик в JSON-файл"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def start_server(self, port=9108, host="127.0.0.1"):
+        """Запускает HTTP-сервер: /metrics (Prometheus) и /metrics.json"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+                    content_type = "application/json; charset=utf-8"
+                elif self.path.startswith("/metrics"):
+                    body = metrics.render_prometheus().encode("utf-8")
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Не засоряем консоль запросами сборщика
+
+        try:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"Не удалось запустить сервер метрик на {host}:{port}: {e}")
+            self.server = None
+            return False
+        self.server.daemon_threads = True
+        self.server_thread = threading.Thread(target=self.server.serve_forever, name="metrics-server")
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        print(f"Метрики доступны на http://{host}:{port}/metrics")
+        return True
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import urllib.request
+
+import cv2
+
+# Файлы YOLOv3-tiny: адрес, откуда их скачать, и эталонный sha256
+# (None - сумма неизвестна, файл принимается как есть)
+YOLO_FILES = {
+    "yolov3-tiny.weights": ("https://pjreddie.com/media/files/yolov3-tiny.weights",
+                            "dccea06f59b781ec1234ddf8d1e94b9519a97f4245748a7d4db75d5b7080a42c"),
+    "yolov3-tiny.cfg": ("https://github.com/pjreddie/darknet/raw/master/cfg/yolov3-tiny.cfg",
+                        "84eb7a675ef87c906019ff5a6e0effe275d175adb75100dcb47f0727917dc2c7"),
+    "coco.names": ("https://github.com/pjreddie/darknet/raw/master/data/coco.names",
+                   "634a1132eb33f8091d60f2c346ababe8b905ae08387037aed883953b7329af84"),
+}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelCache:
+    """Локальный кэш файлов модели с проверкой контрольных сумм.
+
+    sources задает для каждого файла (адрес, эталонный sha256). Загрузка
+    принимается, только если ее сумма совпала с эталоном. Манифест
+    (manifest_name в папке кэша) хранит sha256, размер и время изменения
+    файлов, чтобы не хешировать их при каждом запуске: файл хешируется заново
+    только при смене размера или времени. Заново скачивается лишь файл, сумма
+    которого не совпала с эталоном; измененный файл без эталона остается как
+    есть. Там же лежат конфигурации движка, подобранные
+    autotune(): ключ включает суммы файлов модели, версию OpenCV и число
+    ядер, так что замеры повторяются только при смене модели или машины.
+    """
+
+    def __init__(self, directory=".", sources=YOLO_FILES, manifest_name="model_cache.json",
+                 download_timeout=30):
+        self.directory = directory
+        self.sources = dict(sources)
+        self.manifest_path = os.path.join(directory, manifest_name)
+        self.download_timeout = download_timeout
+        self.lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        manifest.setdefault("files", {})
+        manifest.setdefault("tuning", {})
+        return manifest
+
+    def _save_manifest(self):
+        # Запись через временный файл: оборванная запись не портит манифест
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def ensure(self, name):
+        """Возвращает путь к проверенному файлу, при необходимости скачивая его"""
+        path = self.path(name)
+        with self.lock:
+            if os.path.exists(path):
+                if self._verify(name, path):
+                    return path
+                print(f"Контрольная сумма {name} не совпадает с эталоном, файл будет скачан заново")
+            self._download(name, path)
+            return path
+
+    def _expected(self, name):
+        """Эталонный sha256 файла или None"""
+        source = self.sources.get(name)
+        return source[1] if source is not None else None
+
+    def _verify(self, name, path):
+        """Сверяет файл с эталоном; манифест только избавляет от повторного хеширования"""
+        stat = os.stat(path)
+        entry = self.manifest["files"].get(name)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            sha256 = entry["sha256"]
+        else:
+            sha256 = file_sha256(path)
+            self._record(name, path, sha256)
+        expected = self._expected(name)
+        return expected is None or sha256 == expected
+
+    def _download(self, name, path):
+        source = self.sources.get(name)
+        if source is None:
+            raise FileNotFoundError(f"Файл {name} не найден, адрес для загрузки неизвестен")
+        url, expected = source
+        print(f"Загружаем {name}...")
+        temp_path = path + ".part"
+        try:
+            with urllib.request.urlopen(url, timeout=self.download_timeout) as response, \
+                    open(temp_path, "wb") as f:
+                shutil.copyfileobj(response, f)
+            sha256 = file_sha256(temp_path)
+            if expected is not None and sha256 != expected:
+                # Оборванная или подмененная загрузка не попадает на место файла
+                raise ValueError(f"Контрольная сумма загруженного {name} не совпадает с эталоном")
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._record(name, path, sha256)
+        print(f"Файл {name} успешно загружен")
+
+    def _record(self, name, path, sha256):
+        stat = os.stat(path)
+        self.manifest["files"][name] = {"sha256": sha256, "size": stat.st_size,
+                                        "mtime": stat.st_mtime}
+        self._save_manifest()
+
+    def tuning_key(self, names, input_size, latency_budget=None):
+        """Ключ подобранной конфигурации: модель, размер входа, бюджет и машина"""
+        sums = [self.manifest["files"][name]["sha256"][:16] for name in names]
+        return "|".join(sums + [cv2.__version__, str(os.cpu_count()),
+                                str(input_size), str(latency_budget)])
+
+    def tuned_config(self, key):
+        with self.lock:
+            return self.manifest["tuning"].get(key)
+
+    def store_tuned_config(self, key, config):
+        with self.lock:
+            self.manifest["tuning"][key] = dict(config)
+            self._save_manifest()
+
+
+class BackgroundLoader:
+    """Загружает ресурс в фоновом потоке при первом обращении.
+
+    request() запускает загрузку, если она еще не шла; get() не блокирует
+    и возвращает результат или None, пока загрузка идет или если она не
+    удалась. Неудачная загрузка не повторяется сама - это делает reload(),
+    который также перезагружает готовый ресурс (старый результат остается
+    доступным до конца загрузки). on_ready(result) и on_error(exception)
+    вызываются из фонового потока.
+    """
+
+    def __init__(self, load, on_ready=None, on_error=None, name="model-loader"):
+        self.load = load
+        self.on_ready = on_ready
+        self.on_error = on_error
+        self.name = name
+        self.lock = threading.Lock()
+        self.thread = None
+        self.result = None
+        self.error = None
+        self.attempted = False
+        self.pending = False
+
+    def request(self):
+        with self.lock:
+            if self.thread is None and not self.attempted:
+                self._start()
+
+    def reload(self):
+        with self.lock:
+            if self.thread is not None:
+                # Загрузка уже идет со старыми настройками - повторим после нее
+                self.pending = True
+            else:
+                self._start()
+
+    def _start(self):
+        self.attempted = True
+        self.thread = threading.Thread(target=self._run, name=self.name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                result = self.load()
+            except Exception as e:
+                with self.lock:
+                    self.error = e
+                if self.on_error is not None:
+                    self.on_error(e)
+            else:
+                with self.lock:
+                    self.result = result
+                    self.error = None
+                if self.on_ready is not None:
+                    self.on_ready(result)
+            with self.lock:
+                if not self.pending:
+                    self.thread = None
+                    return
+                self.pending = False
+
+    def get(self):
+        return self.result
+
+    @property
+    def loading(self):
+        return self.thread is not None
+
+    def wait(self, timeout=None):
+        """Ждет окончания текущей загрузки; возвращает результат"""
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.result
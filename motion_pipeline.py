@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+
+class MotionPipeline:
+    """Обработка кадра для детекции движения без выделения памяти на каждом кадре.
+
+    Владеет рабочими буферами (серый кадр, уменьшенная копия, размытие,
+    маска переднего плана, временный буфер морфологии) и готовыми ядрами.
+    Все шаги пишут результат в свои буферы через dst=, а буферы
+    перевыделяются только при смене размера кадра. Возвращаемые массивы
+    действительны до следующего вызова того же шага.
+    """
+
+    def __init__(self, blur_size=21, morph_size=5, morph_ops=(cv2.MORPH_CLOSE, cv2.MORPH_OPEN)):
+        self.blur_size = (blur_size, blur_size)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (morph_size, morph_size))
+        self.morph_ops = tuple(morph_ops)
+        self.buffers = {}
+        self.reallocations = 0
+
+    def _buffer(self, name, shape, dtype=np.uint8):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            self.buffers[name] = buffer
+            self.reallocations += 1
+        return buffer
+
+    def gray(self, frame, name="gray"):
+        """Переводит кадр BGR в градации серого"""
+        out = self._buffer(name, frame.shape[:2])
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=out)
+        return out
+
+    def scaled(self, image, scale, name="scaled"):
+        """Уменьшенная копия для детекции; при scale=1 - само изображение"""
+        if scale >= 1.0:
+            return image
+        width = max(1, int(round(image.shape[1] * scale)))
+        height = max(1, int(round(image.shape[0] * scale)))
+        out = self._buffer(name, (height, width) + image.shape[2:])
+        cv2.resize(image, (width, height), dst=out, interpolation=cv2.INTER_AREA)
+        return out
+
+    def blur(self, image):
+        """Размытие по Гауссу для подавления шума"""
+        out = self._buffer("blurred", image.shape)
+        cv2.GaussianBlur(image, self.blur_size, 0, dst=out)
+        return out
+
+    def update_background(self, subtractor, image, learning_rate=-1):
+        """Обновляет модель фона без построения очищенной маски"""
+        mask = self._buffer("mask", image.shape[:2])
+        subtractor.apply(image, fgmask=mask, learningRate=learning_rate)
+        return mask
+
+    def foreground(self, subtractor, image, learning_rate=-1):
+        """Маска переднего плана, очищенная морфологией"""
+        return self.clean(self.update_background(subtractor, image, learning_rate))
+
+    def clean(self, mask):
+        """Очищает маску от шума морфологией (результат - в одном из буферов)"""
+        temp = self._buffer("morph", mask.shape)
+        source, target = mask, temp
+        for op in self.morph_ops:
+            cv2.morphologyEx(source, op, self.kernel, dst=target)
+            source, target = target, source
+        return source
+
+    def contours(self, mask):
+        """Внешние контуры маски"""
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return contours
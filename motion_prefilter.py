@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+
+
+class MotionPrefilter:
+    """Дешевая первая ступень детекции: разность уменьшенных кадров.
+
+    check() сравнивает кадр, уменьшенный в 1/scale раз, с предыдущим и
+    сообщает, нужен ли полный конвейер (MOG2 + морфология + контуры): доля
+    изменившихся пикселей должна превысить wake_ratio. После срабатывания
+    конвейер остается активным еще hold_frames кадров, чтобы медленное
+    движение не обрывалось. В простое background_due() раз в
+    background_interval кадров разрешает редкое обновление модели фона.
+    """
+
+    def __init__(self, scale=0.125, pixel_threshold=25, wake_ratio=0.002,
+                 hold_frames=15, background_interval=10):
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.wake_ratio = wake_ratio
+        self.hold_frames = hold_frames
+        self.background_interval = background_interval
+
+        self.previous = None
+        self.current = None
+        self.diff = None
+        self.hold = 0
+        self.idle_frames = 0
+        self.last_ratio = 0.0
+
+        # Статистика
+        self.checked = 0
+        self.woken = 0
+
+    def reset(self):
+        """Сбрасывает сохраненный кадр (например, после смены области)"""
+        self.previous = None
+        self.hold = 0
+        self.idle_frames = 0
+
+    def shift(self, dx, dy):
+        """Сдвигает сохраненный кадр вслед за областью (dx, dy - в пикселях входа check)"""
+        if self.previous is None:
+            return
+        height, width = self.previous.shape[:2]
+        transform = np.float32([[1, 0, -dx * self.scale], [0, 1, -dy * self.scale]])
+        self.previous = cv2.warpAffine(self.previous, transform, (width, height),
+                                       borderMode=cv2.BORDER_REPLICATE)
+
+    def check(self, gray):
+        """Возвращает True, если кадр нужно обработать полным конвейером"""
+        height, width = gray.shape[:2]
+        size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        if self.previous is not None and self.previous.shape[::-1] != size:
+            # Размер области изменился - начинаем сравнение заново
+            self.previous = self.current = self.diff = None
+        # INTER_AREA усредняет пиксели и заодно подавляет шум
+        self.current = cv2.resize(gray, size, dst=self.current, interpolation=cv2.INTER_AREA)
+        self.checked += 1
+
+        if self.previous is None:
+            self.previous, self.current = self.current, None
+            self.hold = self.hold_frames
+            return True
+
+        self.diff = cv2.absdiff(self.current, self.previous, dst=self.diff)
+        cv2.threshold(self.diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.diff)
+        self.last_ratio = cv2.countNonZero(self.diff) / float(self.diff.size)
+
+        # Меняем буферы местами, чтобы не выделять память на каждом кадре
+        self.previous, self.current = self.current, self.previous
+
+        if self.last_ratio >= self.wake_ratio:
+            self.hold = self.hold_frames
+            self.woken += 1
+            return True
+        if self.hold > 0:
+            self.hold -= 1
+            return True
+        return False
+
+    def background_due(self):
+        """В простое возвращает True раз в background_interval кадров"""
+        self.idle_frames += 1
+        if self.idle_frames >= self.background_interval:
+            self.idle_frames = 0
+            return True
+        return False
+
+    def learning_rate(self, history):
+        """Скорость обучения MOG2 для редких обновлений.
+
+        Модель обновляется только на каждом background_interval-м кадре,
+        поэтому шаг обучения увеличивается во столько же раз.
+        """
+        return min(1.0, self.background_interval / float(max(1, history)))
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "woken": self.woken,
+            "ratio": self.last_ratio,
+        }
@@ -0,0 +1,475 @@
+import argparse
+import os
+import signal
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+
+from detector_core import DetectorConfig, MotionDetector, ObjectDetector, load_classes
+from frame_buffer import FrameRingBuffer, CaptureThread, DROP_OLDEST
+from inference_pool import InferencePool
+from metrics import Metrics
+from rate_controller import RateController
+from screen_capture import create_backend
+from screenshot_writer import ScreenshotWriter
+from yolo_detector import YoloEngine
+
+
+def open_source(source, screen_backend=None):
+    """Открывает источник и возвращает (grab_into(out), размер кадра, release).
+
+    source - номер камеры, путь к файлу или URL (RTSP/HTTP), либо область
+    экрана (x, y, w, h). grab_into возвращает True, False (кадра нет) или
+    None, когда источник закончился (конец файла).
+    """
+    if isinstance(source, (tuple, list)):
+        region = tuple(int(v) for v in source)
+        backend = screen_backend or create_backend()
+        return (lambda out: backend.grab_into(region, out),
+                (region[3], region[2], 3), lambda: None)
+
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Не удается открыть источник: {source}")
+    ok, frame = cap.read()
+    if not ok or frame is None:
+        cap.release()
+        raise RuntimeError(f"Не удается получить кадр из источника: {source}")
+    is_stream = isinstance(source, int) or "://" in source
+
+    def grab_into(out):
+        ok, frame = cap.read(out)
+        if not ok:
+            # Конец файла; поток камеры или RTSP может прерываться ненадолго
+            return False if is_stream else None
+        if frame is not out:
+            # Декодер вернул кадр другого размера - копируем с масштабированием
+            cv2.resize(frame, (out.shape[1], out.shape[0]), dst=out)
+        return True
+
+    return grab_into, frame.shape, cap.release
+
+
+class SourcePipeline:
+    """Конвейер одного источника: захват в кольцевой буфер и детекция движения.
+
+    Захват идет в собственном потоке, а обработка - на общих рабочих потоках
+    планировщика, причем каждый конвейер обрабатывается не более чем одним
+    потоком одновременно (вычитатель фона хранит состояние).
+    """
+
+    def __init__(self, name, source, scheduler, fps=15, config=None, event_interval=3.0,
+                 buffer_size=3, screen_backend=None, idle_fps=None, metrics=None):
+        self.name = name
+        self.source = source
+        self.scheduler = scheduler
+        self.fps = fps
+        self.event_interval = event_interval
+
+        self._grab, shape, self._release = open_source(source, screen_backend)
+        self.frame_buffer = FrameRingBuffer(buffer_size, shape, policy=DROP_OLDEST)
+        # Планировщик узнает о кадре только после его публикации в буфере,
+        # иначе рабочий поток ждал бы в get_latest, задерживая другие источники
+        self.capture_thread = CaptureThread(self.frame_buffer, self.grab_into, fps=fps,
+                                            name=f"capture-{name}", metrics=metrics,
+                                            on_frame=lambda: scheduler.notify(self))
+        # У каждого источника своя модель фона, поэтому и своя копия параметров
+        config = config.copy() if config is not None else DetectorConfig()
+        self.detector = MotionDetector(config, metrics=metrics)
+        # Без движения источник опрашивается с частотой idle_fps
+        self.rate_controller = RateController(active_fps=fps, idle_fps=idle_fps or fps)
+
+        self.frame = None
+        self.last_seq = 0
+        self.last_event_time = 0
+        self.finished = False
+
+        # Флаги планировщика (защищены его условием)
+        self.scheduled = False
+        self.running = False
+        self.dirty = False
+
+        # Статистика
+        self.processed = 0
+        self.events = 0
+        self.process_seconds = 0.0
+
+    def grab_into(self, out):
+        """Захватывает кадр (поток захвата)"""
+        if self.finished:
+            return False
+        ok = self._grab(out)
+        if ok is None:
+            print(f"Источник {self.name} закончился")
+            self.finished = True
+            return False
+        return ok
+
+    def start(self):
+        self.capture_thread.start()
+
+    def stop(self):
+        self.capture_thread.stop()
+        self._release()
+
+    def process(self):
+        """Обрабатывает самый свежий кадр (рабочий поток планировщика).
+
+        Возвращает (кадр, области движения, наибольшая площадь) при
+        движении или None.
+        """
+        # Не ждем: после повторной постановки в очередь свежий кадр мог быть
+        # уже обработан, а ожидание заняло бы общий поток планировщика
+        result = self.frame_buffer.get_latest(self.frame, self.last_seq, timeout=0)
+        if result is None:
+            return None
+        self.frame, self.last_seq, _, _ = result
+        started = time.perf_counter()
+        try:
+            detection = self.detector.detect(self.frame)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.processed += 1
+            self.process_seconds += elapsed
+        self.rate_controller.record("capture", self.capture_thread.grab_seconds)
+        self.rate_controller.record("processing", elapsed)
+        self.capture_thread.fps = self.rate_controller.update(detection is not None)
+        if detection is None:
+            return None
+        motion_boxes, largest_area = detection
+        return self.frame, motion_boxes, largest_area
+
+    def stats(self):
+        return {
+            "processed": self.processed,
+            "events": self.events,
+            "process_ms": 1000 * self.process_seconds / max(1, self.processed),
+            "buffer": self.frame_buffer.stats(),
+            "rate": self.rate_controller.stats(),
+            "finished": self.finished,
+        }
+
+
+class Scheduler:
+    """Общий пул рабочих потоков для всех конвейеров.
+
+    Конвейер с новым кадром ставится в очередь готовых один раз; если кадр
+    пришел во время его обработки, конвейер вернется в очередь после нее.
+    Так N источников обслуживаются фиксированным числом потоков по кругу.
+    """
+
+    def __init__(self, handle, workers=None):
+        self.handle = handle
+        self.workers = workers or os.cpu_count() or 1
+        self.condition = threading.Condition()
+        self.ready = deque()
+        self.running = False
+        self.threads = []
+
+    def notify(self, pipeline):
+        with self.condition:
+            if pipeline.running:
+                pipeline.dirty = True
+            elif not pipeline.scheduled:
+                pipeline.scheduled = True
+                self.ready.append(pipeline)
+                self.condition.notify()
+
+    def start(self):
+        with self.condition:
+            self.running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"scheduler-{i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=2.0):
+        with self.condition:
+            self.running = False
+            self.ready.clear()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while self.running and not self.ready:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                pipeline = self.ready.popleft()
+                pipeline.scheduled = False
+                pipeline.running = True
+                pipeline.dirty = False
+
+            try:
+                self.handle(pipeline)
+            except Exception as e:
+                print(f"Ошибка обработки источника {pipeline.name}: {e}")
+
+            with self.condition:
+                pipeline.running = False
+                if pipeline.dirty and self.running:
+                    pipeline.dirty = False
+                    pipeline.scheduled = True
+                    self.ready.append(pipeline)
+                    self.condition.notify()
+
+
+class MultiSourceEngine:
+    """Детекция движения на многих источниках в одном процессе.
+
+    Каждый источник - отдельный SourcePipeline, обработку распределяет общий
+    планировщик, а одна сеть YOLO (если задана) через общий пул распознавания
+    обслуживает все источники - веса загружаются в память один раз. Сеть
+    общая, поэтому пул распознавания однопоточный: прогоны все равно шли бы
+    по очереди под блокировкой YoloEngine, а сам прогон OpenCV DNN
+    распараллеливает по ядрам.
+    on_event(pipeline, frame, motion_boxes, detected_objects) вызывается при
+    событии; по умолчанию кадр сохраняется в подпапку источника. Если
+    передан metrics, в него попадает время этапов всех источников.
+    """
+
+    def __init__(self, output_dir, workers=None, engine=None, classes=None,
+                 target_classes=None, min_confidence=0.5,
+                 on_event=None, metrics=None):
+        self.output_dir = output_dir
+        self.metrics = metrics
+        self.object_detector = None
+        if engine is not None:
+            self.object_detector = ObjectDetector(engine, classes or [], target_classes,
+                                                  min_confidence, metrics=metrics)
+        self.on_event = on_event or self.save_event
+
+        self.pipelines = {}
+        self.screen_backend = None
+        self.scheduler = Scheduler(self.process_pipeline, workers)
+        self.screenshot_writer = ScreenshotWriter(metrics=metrics)
+        self.inference_pool = None
+        if engine is not None:
+            self.inference_pool = InferencePool(self.detect_objects, self.on_inference_result)
+
+    def add_source(self, name, source, **options):
+        """Добавляет источник; options передаются в SourcePipeline"""
+        if name in self.pipelines:
+            raise ValueError(f"Источник {name} уже добавлен")
+        if isinstance(source, (tuple, list)) and self.screen_backend is None:
+            # Один источник захвата экрана на все области
+            self.screen_backend = create_backend()
+        pipeline = SourcePipeline(name, source, self.scheduler,
+                                  screen_backend=self.screen_backend, metrics=self.metrics,
+                                  **options)
+        self.pipelines[name] = pipeline
+        return pipeline
+
+    def start(self):
+        if self.inference_pool is not None:
+            self.inference_pool.start()
+        self.scheduler.start()
+        for pipeline in self.pipelines.values():
+            pipeline.start()
+
+    def stop(self):
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
+        self.scheduler.stop()
+        if self.inference_pool is not None:
+            self.inference_pool.stop()
+        self.screenshot_writer.close()
+
+    def process_pipeline(self, pipeline):
+        """Обработка одного кадра источника (рабочий поток планировщика)"""
+        result = pipeline.process()
+        if result is None:
+            return
+        frame, motion_boxes, largest_area = result
+
+        if self.inference_pool is None:
+            self.emit(pipeline, frame, motion_boxes, [])
+            return
+
+        cached = self.inference_pool.lookup(motion_boxes, key=pipeline.name)
+        if cached is not None:
+            if cached:
+                self.emit(pipeline, frame, motion_boxes, cached)
+        else:
+            self.inference_pool.submit(frame.copy(), motion_boxes, pipeline, key=pipeline.name)
+
+    def detect_objects(self, frame, motion_boxes):
+        """Распознает объекты общей сетью (поток пула распознавания)"""
+        return self.object_detector.detect(frame, motion_boxes)
+
+    def on_inference_result(self, frame, boxes, detected_objects, pipeline):
+        if detected_objects:
+            self.emit(pipeline, frame, boxes, detected_objects)
+
+    def emit(self, pipeline, frame, motion_boxes, detected_objects):
+        """Передает событие, не чаще event_interval секунд на источник"""
+        current_time = time.time()
+        if current_time - pipeline.last_event_time <= pipeline.event_interval:
+            return
+        pipeline.last_event_time = current_time
+        pipeline.events += 1
+        self.on_event(pipeline, frame, motion_boxes, detected_objects)
+
+    def save_event(self, pipeline, frame, motion_boxes, detected_objects):
+        directory = os.path.join(self.output_dir, pipeline.name)
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = self.screenshot_writer.save(frame, directory, f"motion_detected_{timestamp}")
+        message = f"[{pipeline.name}] Движение: {len(motion_boxes)} обл."
+        if detected_objects:
+            message += ", объекты: " + ", ".join(
+                f"{obj[0]}({obj[1]:.2f})" for obj in detected_objects[:3])
+        if path:
+            message += f", скриншот {os.path.basename(path)}"
+        print(message)
+
+    def stats(self):
+        stats = {name: pipeline.stats() for name, pipeline in self.pipelines.items()}
+        if self.inference_pool is not None:
+            stats["inference"] = self.inference_pool.stats()
+        stats["screenshots"] = self.screenshot_writer.stats()
+        return stats
+
+
+def parse_region(text):
+    values = [int(v) for v in text.split(",")]
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError("Область задается как x,y,w,h")
+    return tuple(values)
+
+
+def _terminate(signum, frame):
+    # SIGTERM (systemd, docker stop) завершает работу так же, как Ctrl+C
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Детекция движения на нескольких источниках без графического интерфейса")
+    parser.add_argument("--source", action="append", default=[],
+                        help="номер камеры, файл или URL (можно несколько раз)")
+    parser.add_argument("--region", action="append", default=[], type=parse_region,
+                        help="область экрана x,y,w,h (можно несколько раз)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="число рабочих потоков (по умолчанию - число ядер)")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="распределить источники по стольким процессам (0 - один процесс)")
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--idle-fps", type=int, default=3,
+                        help="частота опроса источника без движения")
+    parser.add_argument("--config", help="параметры детекции из JSON (см. DetectorConfig)")
+    parser.add_argument("--min-area-ratio", type=float, default=None,
+                        help="минимальная площадь объекта как доля кадра")
+    parser.add_argument("--processing-width", type=int, default=None,
+                        help="ширина кадра для детекции (0 - исходная)")
+    parser.add_argument("--yolo", action="store_true", help="распознавать объекты YOLO")
+    parser.add_argument("--classes", default="person,car,truck,bus,motorcycle,bicycle")
+    parser.add_argument("--output", default=os.path.join(os.path.expanduser("~"), "Desktop",
+                                                         "Motion_Screenshots"))
+    parser.add_argument("--stats-interval", type=float, default=10.0)
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="порт HTTP для метрик Prometheus (0 - не запускать)")
+    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, _terminate)
+
+    # Параметры командной строки дополняют и перекрывают файл конфигурации
+    overrides = {}
+    if args.min_area_ratio is not None:
+        overrides["min_area_ratio"] = args.min_area_ratio
+    if args.processing_width is not None:
+        overrides["processing_width"] = args.processing_width
+    if args.config:
+        config = DetectorConfig.load(args.config, **overrides)
+    else:
+        config = DetectorConfig(**overrides)
+
+    sources = [(f"src{i}", source) for i, source in enumerate(args.source)]
+    sources += [(f"region{i}", region) for i, region in enumerate(args.region)]
+    if not sources:
+        parser.error("Укажите хотя бы один --source или --region")
+
+    classes = load_classes() if args.yolo else []
+    target_classes = args.classes.split(",") if args.yolo else None
+
+    if args.processes:
+        run_sharded(args, config, sources, classes, target_classes)
+        return
+
+    engine = None
+    if args.yolo:
+        engine = YoloEngine("yolov3-tiny.weights", "yolov3-tiny.cfg")
+        print(f"Модель YOLO загружена: {engine.describe()}")
+
+    metrics = None
+    if args.metrics_port:
+        metrics = Metrics()
+        metrics.start_server(args.metrics_port)
+
+    multi = MultiSourceEngine(args.output, workers=args.workers, engine=engine, classes=classes,
+                              target_classes=target_classes, metrics=metrics)
+    for name, source in sources:
+        try:
+            multi.add_source(name, source, fps=args.fps, config=config, idle_fps=args.idle_fps)
+            print(f"Источник {name}: {source}")
+        except RuntimeError as e:
+            print(f"Источник {name} пропущен: {e}")
+    if not multi.pipelines:
+        return
+
+    multi.start()
+    print(f"Обработка {len(multi.pipelines)} источников на {multi.scheduler.workers} потоках. "
+          f"Ctrl+C для выхода.")
+    try:
+        while not all(p.finished for p in multi.pipelines.values()):
+            time.sleep(args.stats_interval)
+            for name, stats in multi.stats().items():
+                print(f"{name}: {stats}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        multi.stop()
+        if metrics is not None:
+            metrics.stop_server()
+
+
+def run_sharded(args, config, sources, classes, target_classes):
+    """Режим нескольких процессов: кадры передаются через разделяемую память"""
+    from process_shards import ShardedEngine
+
+    sharded = ShardedEngine(args.output, processes=args.processes, config=config,
+                            yolo=args.yolo, classes=classes, target_classes=target_classes,
+                            stats_interval=args.stats_interval)
+    for name, source in sources:
+        try:
+            sharded.add_source(name, source, fps=args.fps, idle_fps=args.idle_fps)
+            print(f"Источник {name}: {source}")
+        except RuntimeError as e:
+            print(f"Источник {name} пропущен: {e}")
+    if not sharded.sources:
+        return
+
+    sharded.start()
+    print(f"Обработка {len(sharded.sources)} источников в {len(sharded.workers)} процессах. "
+          f"Ctrl+C для выхода.")
+    try:
+        while not sharded.finished:
+            sharded.poll()
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sharded.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detector_core import DetectorConfig, MotionDetector, ObjectDetector
+from frame_buffer import CaptureThread
+from multi_source import open_source
+from rate_controller import RateController
+from screen_capture import create_backend
+from screenshot_writer import ScreenshotWriter
+
+
+def _attach_shared_memory(name):
+    """Подключается к существующему блоку, не передавая его resource_tracker"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # До Python 3.13 параметра track нет; процессы, запущенные через spawn,
+        # используют resource_tracker управляющего процесса, так что повторная
+        # регистрация блока безвредна, а удаляет его только владелец
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedFrameRing:
+    """Кольцевой буфер кадров в разделяемой памяти для передачи между процессами.
+
+    Один процесс пишет кадры (интерфейс reserve/commit/release, как у
+    FrameRingBuffer, поэтому подходит CaptureThread), другой читает самый
+    свежий кадр без сериализации. Номер кадра в слоте служит seqlock-ом:
+    на время записи он равен -1, и читатель отбрасывает кадр, если номер
+    изменился, пока кадр копировался.
+    """
+
+    def __init__(self, capacity, shape, dtype=np.uint8, name=None, wake=None):
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.wake = wake
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        header_bytes = 8 * (2 * capacity + 1)
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=header_bytes + capacity * frame_bytes)
+            self.owner = True
+        else:
+            self.shm = _attach_shared_memory(name)
+            self.owner = False
+
+        buf = self.shm.buf
+        self.slot_seq = np.ndarray((capacity,), np.int64, buf, 0)
+        self.slot_time = np.ndarray((capacity,), np.float64, buf, 8 * capacity)
+        self.latest = np.ndarray((1,), np.int64, buf, 16 * capacity)
+        self.slots = np.ndarray((capacity,) + self.shape, self.dtype, buf, header_bytes)
+        if self.owner:
+            self.slot_seq[:] = 0
+            self.latest[0] = 0
+
+        self.next_seq = 1
+        self.reserved_seq = 0
+        self.written = 0
+        self.skipped = 0
+
+    def spec(self):
+        """Параметры для подключения к буферу из другого процесса"""
+        return self.shm.name, self.capacity, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec):
+        name, capacity, shape, dtype = spec
+        return cls(capacity, shape, dtype, name=name)
+
+    def reserve(self):
+        """Возвращает (индекс, массив) слота для следующего кадра"""
+        index = self.next_seq % self.capacity
+        self.reserved_seq = self.slot_seq[index]
+        self.slot_seq[index] = -1
+        return index, self.slots[index]
+
+    def commit(self, index, timestamp=None, meta=None):
+        self.slot_time[index] = timestamp if timestamp is not None else time.time()
+        self.slot_seq[index] = self.next_seq
+        self.latest[0] = self.next_seq
+        self.next_seq += 1
+        self.written += 1
+        if self.wake is not None:
+            self.wake.set()
+
+    def release(self, index):
+        # Кадр не получен - слот сохраняет прежнее содержимое
+        self.slot_seq[index] = self.reserved_seq
+
+    def get_latest(self, out=None, after_seq=0):
+        """Копирует самый свежий кадр новее after_seq; возвращает (кадр, номер, время) или None"""
+        seq = int(self.latest[0])
+        if seq <= after_seq:
+            return None
+        index = seq % self.capacity
+        if self.slot_seq[index] != seq:
+            self.skipped += 1
+            return None
+        if out is None or out.shape != self.shape:
+            out = np.empty(self.shape, self.dtype)
+        np.copyto(out, self.slots[index])
+        timestamp = float(self.slot_time[index])
+        if self.slot_seq[index] != seq:
+            # Слот перезаписан во время копирования
+            self.skipped += 1
+            return None
+        return out, seq, timestamp
+
+    def stats(self):
+        return {"written": self.written, "skipped": self.skipped}
+
+    def close(self):
+        # Представления numpy держат ссылки на буфер - убираем их до закрытия
+        self.slot_seq = self.slot_time = self.latest = self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def shard_main(shard_id, specs, options, events, wake, stop, motion_times):
+    """Рабочий процесс: детекция движения для своей части источников.
+
+    Кадры читаются из разделяемой памяти, события и статистика уходят
+    в очередь events небольшими кортежами. Время последнего кадра с
+    движением пишется в motion_times[name] - по нему управляющий процесс
+    снижает частоту захвата в простое.
+    """
+    rings = {name: SharedFrameRing.attach(spec) for name, spec in specs}
+    detectors = {name: MotionDetector(DetectorConfig(**options["detector"])) for name in rings}
+    frames = {name: None for name in rings}
+    last_seq = {name: 0 for name in rings}
+    last_event = {name: 0 for name in rings}
+    processed = {name: 0 for name in rings}
+    process_seconds = {name: 0.0 for name in rings}
+
+    object_detector = None
+    if options.get("yolo"):
+        # Каждый процесс держит свою копию сети
+        from yolo_detector import YoloEngine
+        engine = YoloEngine("yolov3-tiny.weights", "yolov3-tiny.cfg", threads=1)
+        object_detector = ObjectDetector(engine, options.get("classes") or [],
+                                         options.get("target_classes"), options["min_confidence"])
+
+    writer = ScreenshotWriter(encoder_threads=1)
+    last_stats = time.time()
+    try:
+        while not stop.is_set():
+            wake.wait(0.5)
+            wake.clear()
+            for name, ring in rings.items():
+                result = ring.get_latest(frames[name], last_seq[name])
+                if result is None:
+                    continue
+                frame, last_seq[name], _ = result
+                frames[name] = frame
+
+                started = time.perf_counter()
+                detection = detectors[name].detect(frame)
+                objects = []
+                if detection is not None and object_detector is not None:
+                    objects = object_detector.detect(frame, detection[0])
+                processed[name] += 1
+                process_seconds[name] += time.perf_counter() - started
+                if detection is not None:
+                    motion_times[name].value = time.time()
+
+                if detection is None or (object_detector is not None and not objects):
+                    continue
+                current_time = time.time()
+                if current_time - last_event[name] <= options["event_interval"]:
+                    continue
+                last_event[name] = current_time
+
+                directory = os.path.join(options["output_dir"], name)
+                os.makedirs(directory, exist_ok=True)
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                path = writer.save(frame, directory, f"motion_detected_{timestamp}")
+                motion_boxes, largest_area = detection
+                try:
+                    events.put_nowait(("event", name, motion_boxes, largest_area, objects, path))
+                except queue.Full:
+                    pass
+
+            if time.time() - last_stats >= options["stats_interval"]:
+                last_stats = time.time()
+                stats = {name: {"processed": processed[name],
+                                "process_ms": 1000 * process_seconds[name] / max(1, processed[name]),
+                                "skipped": rings[name].skipped}
+                         for name in rings}
+                try:
+                    events.put_nowait(("stats", shard_id, stats))
+                except queue.Full:
+                    pass
+    finally:
+        writer.close()
+        for ring in rings.values():
+            ring.close()
+
+
+class SharedSource:
+    """Источник в управляющем процессе: захват в разделяемый кольцевой буфер.
+
+    motion_time - разделяемое значение, куда рабочий процесс пишет время
+    последнего движения; без движения захват идет с частотой idle_fps.
+    """
+
+    def __init__(self, name, source, fps=15, ring_size=4, screen_backend=None,
+                 idle_fps=None, motion_time=None):
+        self.name = name
+        self.source = source
+        self.finished = False
+        self._grab, shape, self._release = open_source(source, screen_backend)
+        self.ring = SharedFrameRing(ring_size, shape)
+        self.capture_thread = CaptureThread(self.ring, self.grab_into, fps=fps,
+                                            name=f"capture-{name}")
+        self.rate_controller = RateController(active_fps=fps, idle_fps=idle_fps or fps)
+        self.motion_time = motion_time
+        self.seen_motion_time = 0.0
+
+    def grab_into(self, out):
+        if self.finished:
+            return False
+        if self.motion_time is not None:
+            motion_time = self.motion_time.value
+            motion = motion_time > self.seen_motion_time
+            self.seen_motion_time = motion_time
+            self.capture_thread.fps = self.rate_controller.update(motion)
+        ok = self._grab(out)
+        if ok is None:
+            print(f"Источник {self.name} закончился")
+            self.finished = True
+            return False
+        return ok
+
+    def close(self):
+        # Поток захвата пишет прямо в разделяемую память: пока он жив,
+        # закрыть блок нельзя (BufferError или наполовину закрытый блок)
+        if not self.capture_thread.stop():
+            print(f"Поток захвата {self.name} не завершился, разделяемая память не освобождена")
+            return
+        self._release()
+        self.ring.close()
+
+
+class ShardedEngine:
+    """Детекция движения на многих источниках в нескольких процессах.
+
+    Захват идет в управляющем процессе (GUI или консоль), источники
+    распределяются по рабочим процессам по кругу, и кадры передаются через
+    SharedFrameRing без сериализации. Так MOG2, морфология и YOLO
+    используют все ядра, а не одно из-за GIL. События возвращаются через
+    очередь: poll() разбирает ее без блокировки (удобно вызывать из root.after)
+    и вызывает on_event(name, motion_boxes, largest_area, objects, path)
+    и on_stats(shard_id, stats).
+    """
+
+    def __init__(self, output_dir, processes=None, ring_size=4, config=None, event_interval=3.0,
+                 yolo=False, classes=None, target_classes=None, min_confidence=0.5,
+                 stats_interval=10.0, on_event=None, on_stats=None):
+        self.processes = processes or os.cpu_count() or 1
+        self.ring_size = ring_size
+        config = config if config is not None else DetectorConfig()
+        self.options = {
+            "output_dir": output_dir,
+            # Параметры детекции передаются словарем - он без труда сериализуется
+            "detector": config.to_dict(),
+            "event_interval": event_interval,
+            "yolo": yolo,
+            "classes": classes or [],
+            "target_classes": target_classes,
+            "min_confidence": min_confidence,
+            "stats_interval": stats_interval,
+        }
+        self.on_event = on_event or self.print_event
+        self.on_stats = on_stats or self.print_stats
+
+        # spawn одинаково работает на всех платформах и не копирует потоки захвата
+        self.context = mp.get_context("spawn")
+        self.events = self.context.Queue(maxsize=1000)
+        self.stop_event = self.context.Event()
+        self.sources = {}
+        self.workers = []
+        self.screen_backend = None
+
+    def add_source(self, name, source, fps=15, idle_fps=None):
+        if name in self.sources:
+            raise ValueError(f"Источник {name} уже добавлен")
+        if isinstance(source, (tuple, list)) and self.screen_backend is None:
+            self.screen_backend = create_backend()
+        shared = SharedSource(name, source, fps, self.ring_size, self.screen_backend,
+                              idle_fps=idle_fps, motion_time=self.context.Value("d", 0.0))
+        self.sources[name] = shared
+        return shared
+
+    def start(self):
+        names = list(self.sources)
+        shard_count = min(self.processes, len(names))
+        for shard_id in range(shard_count):
+            shard_names = names[shard_id::shard_count]
+            wake = self.context.Event()
+            for name in shard_names:
+                self.sources[name].ring.wake = wake
+            specs = [(name, self.sources[name].ring.spec()) for name in shard_names]
+            motion_times = {name: self.sources[name].motion_time for name in shard_names}
+            process = self.context.Process(target=shard_main, name=f"shard-{shard_id}",
+                                           args=(shard_id, specs, self.options, self.events,
+                                                 wake, self.stop_event, motion_times))
+            process.daemon = True
+            process.start()
+            self.workers.append(process)
+
+        for shared in self.sources.values():
+            shared.capture_thread.start()
+
+    def poll(self, max_events=100):
+        """Разбирает пришедшие события без ожидания; возвращает их число"""
+        handled = 0
+        while handled < max_events:
+            try:
+                message = self.events.get_nowait()
+            except queue.Empty:
+                break
+            handled += 1
+            if message[0] == "event":
+                self.on_event(*message[1:])
+            elif message[0] == "stats":
+                self.on_stats(*message[1:])
+        return handled
+
+    @property
+    def finished(self):
+        return all(shared.finished for shared in self.sources.values())
+
+    def stop(self, timeout=5.0):
+        for shared in self.sources.values():
+            shared.capture_thread.stop()
+        self.stop_event.set()
+        # Процесс не завершится, пока его данные в очереди events не
+        # прочитаны, поэтому очередь разбирается и во время ожидания
+        deadline = time.time() + timeout
+        for process in self.workers:
+            while process.is_alive() and time.time() < deadline:
+                self.poll(max_events=10000)
+                process.join(0.05)
+            if process.is_alive():
+                process.terminate()
+        self.workers = []
+        self.poll(max_events=10000)
+        for shared in self.sources.values():
+            shared.close()
+
+    def print_event(self, name, motion_boxes, largest_area, objects, path):
+        message = f"[{name}] Движение: {len(motion_boxes)} обл., объект {int(largest_area)} пикс"
+        if objects:
+            message += ", объекты: " + ", ".join(f"{obj[0]}({obj[1]:.2f})" for obj in objects[:3])
+        if path:
+            message += f", скриншот {os.path.basename(path)}"
+        print(message)
+
+    def print_stats(self, shard_id, stats):
+        for name, source_stats in stats.items():
+            print(f"Процесс {shard_id}, {name}: {source_stats}")
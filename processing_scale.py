@@ -0,0 +1,14 @@
+def processing_scale(shape, max_width):
+    """Масштаб обработки: кадр уменьшается до ширины max_width (0 - исходное разрешение)"""
+    width = shape[1]
+    if not max_width or width <= max_width:
+        return 1.0
+    return max_width / float(width)
+
+
+def to_native_box(box, scale):
+    """Переводит прямоугольник (x, y, w, h) из уменьшенного кадра в исходный"""
+    if scale >= 1.0:
+        return tuple(box)
+    x, y, w, h = box
+    return (int(x / scale), int(y / scale), int(round(w / scale)), int(round(h / scale)))
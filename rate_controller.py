@@ -0,0 +1,102 @@
+import time
+
+
+class RateController:
+    """Адаптивная частота кадров по замеренному времени этапов.
+
+    Пока есть движение (и еще idle_after секунд после него), целевая частота
+    равна active_fps, в простое - idle_fps. Итоговая частота не превышает
+    достижимую: record() копит сглаженное время каждого этапа, и при
+    pipelined=True (этапы идут в разных потоках) предел задает самый
+    медленный этап, иначе - их сумма. Если цель недостижима, раз в
+    report_interval секунд печатается предупреждение с разбивкой по этапам.
+    """
+
+    def __init__(self, active_fps=20, idle_fps=4, idle_after=5.0, min_fps=1,
+                 pipelined=True, smoothing=0.2, report_interval=10.0):
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.min_fps = min_fps
+        self.pipelined = pipelined
+        self.smoothing = smoothing
+        self.report_interval = report_interval
+
+        self.stage_seconds = {}
+        self.fps = active_fps
+        self.target_fps = active_fps
+        self.last_motion = time.time()
+        self.last_report = 0
+
+        # Статистика
+        self.idle_switches = 0
+        self.shortfalls = 0
+
+    def reset(self):
+        """Начинает в активном режиме и забывает замеры (например, при запуске)"""
+        self.stage_seconds = {}
+        self.fps = self.target_fps = self.active_fps
+        self.last_motion = time.time()
+
+    def record(self, stage, seconds):
+        """Учитывает время этапа (экспоненциальное сглаживание)"""
+        if seconds is None:
+            return
+        previous = self.stage_seconds.get(stage)
+        if previous is None:
+            self.stage_seconds[stage] = seconds
+        else:
+            self.stage_seconds[stage] = previous + self.smoothing * (seconds - previous)
+
+    def achievable_fps(self):
+        """Наибольшая частота, которую позволяют замеренные этапы (None - замеров нет)"""
+        if not self.stage_seconds:
+            return None
+        values = self.stage_seconds.values()
+        frame_seconds = max(values) if self.pipelined else sum(values)
+        if frame_seconds <= 0:
+            return None
+        return 1.0 / frame_seconds
+
+    def update(self, motion, now=None):
+        """Пересчитывает частоту после кадра; возвращает новую частоту"""
+        if now is None:
+            now = time.time()
+        if motion:
+            self.last_motion = now
+
+        idle = now - self.last_motion > self.idle_after
+        target_fps = self.idle_fps if idle else self.active_fps
+        if target_fps != self.target_fps and idle:
+            self.idle_switches += 1
+        self.target_fps = target_fps
+
+        fps = target_fps
+        achievable = self.achievable_fps()
+        if achievable is not None and achievable < target_fps:
+            fps = achievable
+            self.shortfalls += 1
+            if now - self.last_report >= self.report_interval:
+                self.last_report = now
+                stages = ", ".join(f"{stage} {seconds * 1000:.1f} мс"
+                                   for stage, seconds in self.stage_seconds.items())
+                print(f"Не удается выдержать {target_fps} кадр/с, достижимо {achievable:.1f} ({stages})")
+
+        self.fps = max(self.min_fps, fps)
+        return self.fps
+
+    def interval(self):
+        """Пауза между кадрами для текущей частоты, в секундах"""
+        return 1.0 / self.fps
+
+    def stats(self):
+        achievable = self.achievable_fps()
+        return {
+            "fps": round(self.fps, 1),
+            "target_fps": self.target_fps,
+            "achievable_fps": round(achievable, 1) if achievable else None,
+            "stage_ms": {stage: round(seconds * 1000, 2)
+                         for stage, seconds in self.stage_seconds.items()},
+            "idle_switches": self.idle_switches,
+            "shortfalls": self.shortfalls,
+        }
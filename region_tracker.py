@@ -0,0 +1,333 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class RegionTracker:
+    """Общий интерфейс трекеров области захвата.
+
+    set_template() задает шаблон (серый), locate(search, prior) ищет его в
+    области поиска и возвращает (x, y, уверенность, масштаб): левый верхний
+    угол шаблона в координатах search, нормированную корреляцию шаблона
+    (с учетом масштаба) в найденном положении и масштаб относительно
+    шаблона, либо None. prior - ожидаемое положение левого верхнего угла
+    (обычно предыдущее найденное). Время каждого поиска копится в stats(),
+    а при переданном metrics попадает еще и в этап tracking_<name>.
+    """
+
+    name = None
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.template = None
+
+        # Статистика
+        self.searches = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+        self.last_seconds = None
+
+    def set_template(self, template):
+        self.template = template
+        # Центрированный шаблон для оценки уверенности
+        centered = template.astype(np.float32)
+        centered -= centered.mean()
+        self.centered = centered
+        self.centered_norm = float(np.sqrt((centered * centered).sum()))
+        self._prepare(template)
+
+    def _prepare(self, template):
+        pass
+
+    def locate(self, search, prior=None):
+        """Положение шаблона в search: (x, y, уверенность, масштаб) или None"""
+        if self.template is None:
+            return None
+        started = time.perf_counter()
+        result = self._locate(search, prior)
+        seconds = time.perf_counter() - started
+        self.searches += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        if result is None:
+            self.failures += 1
+        if self.metrics is not None:
+            self.metrics.observe(f"tracking_{self.name}", seconds)
+        return result
+
+    def _locate(self, search, prior):
+        raise NotImplementedError
+
+    def _score(self, search, x, y, scale=1.0):
+        """Нормированная корреляция шаблона с участком search в (x, y)"""
+        centered, norm = self.centered, self.centered_norm
+        if abs(scale - 1.0) > 0.01:
+            template_h, template_w = self.template.shape[:2]
+            size = (max(1, int(round(template_w * scale))), max(1, int(round(template_h * scale))))
+            centered = cv2.resize(self.template, size, interpolation=cv2.INTER_AREA).astype(np.float32)
+            centered -= centered.mean()
+            norm = float(np.sqrt((centered * centered).sum()))
+        height, width = centered.shape[:2]
+        if x < 0 or y < 0 or y + height > search.shape[0] or x + width > search.shape[1]:
+            return 0.0
+        window = search[y:y + height, x:x + width].astype(np.float32)
+        window -= window.mean()
+        norm *= float(np.sqrt((window * window).sum()))
+        if norm == 0:
+            return 0.0
+        return float((window * centered).sum()) / norm
+
+    def stats(self):
+        return {
+            "tracker": self.name,
+            "searches": self.searches,
+            "failures": self.failures,
+            "mean_ms": round(1000 * self.total_seconds / self.searches, 2) if self.searches else None,
+            "last_ms": round(1000 * self.last_seconds, 2) if self.last_seconds is not None else None,
+        }
+
+
+class PyramidTemplateTracker(RegionTracker):
+    """Поиск шаблона от грубого к точному (только сдвиг).
+
+    Шаблон и область поиска уменьшаются в 2**levels раз (levels выбирается
+    так, чтобы уменьшенный шаблон был не меньше min_template_size), и по
+    уменьшенным изображениям находится грубое положение. Оно уточняется в
+    окне ±(2**levels + refine_margin) пикселей исходного разрешения по
+    самому контрастному участку шаблона размером до refine_patch: поиск
+    по целому большому шаблону в исходном разрешении стоит почти столько
+    же, сколько полный поиск.
+
+    Если передан prior, сначала проверяется окно ±prior_margin вокруг него:
+    пока область стоит на месте или смещается медленно, грубый поиск не
+    нужен вовсе.
+    """
+
+    name = "pyramid"
+
+    def __init__(self, min_template_size=24, max_levels=3, refine_margin=2, refine_patch=96,
+                 prior_margin=4, prior_score=0.8, metrics=None):
+        super().__init__(metrics)
+        self.min_template_size = min_template_size
+        self.max_levels = max_levels
+        self.refine_margin = refine_margin
+        self.refine_patch = refine_patch
+        self.prior_margin = prior_margin
+        self.prior_score = prior_score
+        self.small_search = None
+        self.prior_hits = 0
+        self.coarse_searches = 0
+
+    def _prepare(self, template):
+        height, width = template.shape[:2]
+        levels = 0
+        while (levels < self.max_levels and
+               min(height, width) >> (levels + 1) >= self.min_template_size):
+            levels += 1
+        self.levels = levels
+        self.factor = 1 << levels
+        self.small_template = self._downscale(template) if levels else template
+
+        # Участок уточнения - самый контрастный из сетки 3x3 кандидатов
+        patch_h, patch_w = min(height, self.refine_patch), min(width, self.refine_patch)
+        candidates = [(x, y) for y in np.linspace(0, height - patch_h, 3).astype(int)
+                      for x in np.linspace(0, width - patch_w, 3).astype(int)]
+        self.patch_x, self.patch_y = max(
+            candidates, key=lambda p: template[p[1]:p[1] + patch_h, p[0]:p[0] + patch_w].std())
+        self.patch = template[self.patch_y:self.patch_y + patch_h,
+                              self.patch_x:self.patch_x + patch_w]
+
+    def _downscale(self, image, out=None):
+        height, width = image.shape[:2]
+        size = (max(1, width // self.factor), max(1, height // self.factor))
+        if out is not None and out.shape[:2] == (size[1], size[0]):
+            return cv2.resize(image, size, dst=out, interpolation=cv2.INTER_AREA)
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def _refine(self, search, x0, y0, x1, y1):
+        """Положение шаблона с левым верхним углом в [x0, x1] x [y0, y1] по участку уточнения"""
+        template_h, template_w = self.template.shape[:2]
+        search_h, search_w = search.shape[:2]
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(search_w - template_w, x1), min(search_h - template_h, y1)
+        if x1 < x0 or y1 < y0:
+            return None
+        patch_h, patch_w = self.patch.shape[:2]
+        window = search[y0 + self.patch_y:y1 + self.patch_y + patch_h,
+                        x0 + self.patch_x:x1 + self.patch_x + patch_w]
+        result = cv2.matchTemplate(window, self.patch, cv2.TM_CCOEFF_NORMED)
+        _, _, _, loc = cv2.minMaxLoc(result)
+        return x0 + loc[0], y0 + loc[1]
+
+    def _locate(self, search, prior):
+        template_h, template_w = self.template.shape[:2]
+        search_h, search_w = search.shape[:2]
+        if search_h < template_h or search_w < template_w:
+            return None
+
+        if prior is not None:
+            margin = self.prior_margin
+            found = self._refine(search, prior[0] - margin, prior[1] - margin,
+                                 prior[0] + margin, prior[1] + margin)
+            # Максимум на краю окна может оказаться склоном пика за его пределами
+            if (found is not None and
+                    abs(found[0] - prior[0]) < margin and abs(found[1] - prior[1]) < margin):
+                score = self._score(search, *found)
+                if score >= self.prior_score:
+                    self.prior_hits += 1
+                    return found[0], found[1], score, 1.0
+
+        self.coarse_searches += 1
+        if self.levels == 0:
+            result = cv2.matchTemplate(search, self.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(result)
+            return loc[0], loc[1], score, 1.0
+
+        self.small_search = self._downscale(search, self.small_search)
+        result = cv2.matchTemplate(self.small_search, self.small_template, cv2.TM_CCOEFF_NORMED)
+        _, _, _, loc = cv2.minMaxLoc(result)
+        x, y = loc[0] * self.factor, loc[1] * self.factor
+        radius = self.factor + self.refine_margin
+        found = self._refine(search, x - radius, y - radius, x + radius, y + radius)
+        if found is None:
+            return None
+        return found[0], found[1], self._score(search, *found), 1.0
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(levels=getattr(self, "levels", None), prior_hits=self.prior_hits,
+                     coarse_searches=self.coarse_searches)
+        return stats
+
+
+class PhaseCorrelationTracker(RegionTracker):
+    """Сдвиг через фазовую корреляцию (БПФ) на уменьшенных изображениях.
+
+    Из области поиска вырезается окно размером с шаблон в ожидаемом
+    положении (prior, без него - в центре), оба изображения уменьшаются до
+    стороны не больше work_size и сравниваются cv2.phaseCorrelate с окном
+    Ханна. Сдвиг надежно определяется в пределах четверти шаблона; после
+    большого сдвига окно переносится и оценка повторяется (до iterations раз).
+    """
+
+    name = "phase"
+
+    def __init__(self, work_size=128, iterations=2, metrics=None):
+        super().__init__(metrics)
+        self.work_size = work_size
+        self.iterations = iterations
+
+    def _prepare(self, template):
+        height, width = template.shape[:2]
+        self.scale = min(1.0, self.work_size / max(height, width))
+        self.work_shape = (max(8, int(round(width * self.scale))),
+                           max(8, int(round(height * self.scale))))
+        self.window = cv2.createHanningWindow(self.work_shape, cv2.CV_32F)
+        self.small_template = self._prepare_image(template)
+
+    def _prepare_image(self, image):
+        # Окно Ханна накладывается здесь: phaseCorrelate с параметром window
+        # портит свои входные массивы
+        small = cv2.resize(image, self.work_shape, interpolation=cv2.INTER_AREA)
+        return small.astype(np.float32) * self.window
+
+    def _locate(self, search, prior):
+        template_h, template_w = self.template.shape[:2]
+        search_h, search_w = search.shape[:2]
+        if search_h < template_h or search_w < template_w:
+            return None
+        if prior is None:
+            prior = ((search_w - template_w) // 2, (search_h - template_h) // 2)
+
+        x, y = prior
+        for _ in range(self.iterations):
+            x = min(max(0, x), search_w - template_w)
+            y = min(max(0, y), search_h - template_h)
+            crop = self._prepare_image(search[y:y + template_h, x:x + template_w])
+            (shift_x, shift_y), response = cv2.phaseCorrelate(self.small_template, crop)
+            # Сдвиг содержимого окна относительно шаблона - на столько же
+            # смещено и положение шаблона в области поиска
+            dx = int(round(shift_x / self.scale))
+            dy = int(round(shift_y / self.scale))
+            if dx == 0 and dy == 0:
+                break
+            x += dx
+            y += dy
+        x = min(max(0, x), search_w - template_w)
+        y = min(max(0, y), search_h - template_h)
+        return x, y, self._score(search, x, y), 1.0
+
+
+class OrbTracker(RegionTracker):
+    """Ключевые точки ORB и RANSAC: сдвиг и масштаб области.
+
+    Точки шаблона вычисляются один раз, в области поиска - на каждом
+    поиске (их число растет с площадью области поиска, чтобы плотность
+    точек была как в шаблоне). Соответствия с перекрестной проверкой
+    отбираются RANSAC по модели подобия (сдвиг, поворот, масштаб), поворот
+    не используется. Если согласных с моделью точек меньше min_matches,
+    поиск считается неудачным.
+    """
+
+    name = "orb"
+
+    def __init__(self, features=500, max_search_features=3000, min_matches=8,
+                 ransac_threshold=3.0, patch_size=15, metrics=None):
+        super().__init__(metrics)
+        self.features = features
+        self.max_search_features = max_search_features
+        self.patch_size = patch_size
+        self.orb = self._create_orb(features)
+        self.search_orb = None
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
+        self.min_matches = min_matches
+        self.ransac_threshold = ransac_threshold
+
+    def _create_orb(self, features):
+        # Уменьшенный участок дескриптора оставляет точки и у краев небольшого шаблона
+        return cv2.ORB_create(nfeatures=features, edgeThreshold=self.patch_size,
+                              patchSize=self.patch_size)
+
+    def _prepare(self, template):
+        self.keypoints, self.descriptors = self.orb.detectAndCompute(template, None)
+        self.search_orb = None
+
+    def _locate(self, search, prior):
+        if self.descriptors is None or len(self.keypoints) < self.min_matches:
+            return None
+        if self.search_orb is None or self.search_orb_shape != search.shape[:2]:
+            ratio = search.shape[0] * search.shape[1] / float(self.template.size)
+            self.search_orb = self._create_orb(
+                min(self.max_search_features, int(self.features * max(1.0, ratio))))
+            self.search_orb_shape = search.shape[:2]
+        keypoints, descriptors = self.search_orb.detectAndCompute(search, None)
+        if descriptors is None:
+            return None
+        matches = self.matcher.match(self.descriptors, descriptors)
+        if len(matches) < self.min_matches:
+            return None
+
+        source = np.float32([self.keypoints[m.queryIdx].pt for m in matches])
+        target = np.float32([keypoints[m.trainIdx].pt for m in matches])
+        transform, inliers = cv2.estimateAffinePartial2D(
+            source, target, method=cv2.RANSAC, ransacReprojThreshold=self.ransac_threshold)
+        if transform is None or int(inliers.sum()) < self.min_matches:
+            return None
+
+        # Левый верхний угол шаблона переходит в (tx, ty)
+        scale = float(np.hypot(transform[0, 0], transform[1, 0]))
+        x, y = int(round(transform[0, 2])), int(round(transform[1, 2]))
+        return x, y, self._score(search, x, y, scale), scale
+
+
+TRACKERS = {
+    PyramidTemplateTracker.name: PyramidTemplateTracker,
+    PhaseCorrelationTracker.name: PhaseCorrelationTracker,
+    OrbTracker.name: OrbTracker,
+}
+
+
+def create_tracker(name="pyramid", **kwargs):
+    """Создает трекер области по имени (см. TRACKERS)"""
+    return TRACKERS[name](**kwargs)
@@ -0,0 +1,362 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+import threading
+
+import cv2
+import numpy as np
+
+
+class CaptureBackend:
+    """Базовый класс источника захвата экрана.
+
+    grab_into(region, out) записывает область (x, y, w, h) прямо в массив out:
+    форма (h, w, 3) - кадр BGR, форма (h, w) - кадр в градациях серого.
+    """
+
+    name = "base"
+
+    def grab_into(self, region, out):
+        raise NotImplementedError
+
+    def grab(self, region, gray=False):
+        """Захватывает область в новый массив"""
+        x, y, w, h = region
+        shape = (h, w) if gray else (h, w, 3)
+        out = np.empty(shape, dtype=np.uint8)
+        if not self.grab_into(region, out):
+            return None
+        return out
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiBackend(CaptureBackend):
+    """Захват через pyautogui (PIL) - работает везде, но медленнее остальных"""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+
+    def grab_into(self, region, out):
+        screenshot = self.pyautogui.screenshot(region=tuple(region))
+        rgb = np.asarray(screenshot)
+        if rgb.shape[:2] != out.shape[:2]:
+            return False
+        code = cv2.COLOR_RGB2GRAY if out.ndim == 2 else cv2.COLOR_RGB2BGR
+        cv2.cvtColor(rgb, code, dst=out)
+        return True
+
+
+# Структуры Xlib/MIT-SHM, нужные для захвата через разделяемую память
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class _XImage(ctypes.Structure):
+    # Описываем только начало структуры - остальные поля нам не нужны
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+        ("obdata", ctypes.c_void_p),
+    ]
+
+
+_X_ERROR_HANDLER = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+_ZPIXMAP = 2
+_ALL_PLANES = 0xFFFFFFFF
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+
+
+class XShmBackend(CaptureBackend):
+    """Захват экрана X11 через расширение MIT-SHM.
+
+    Сервер X пишет пиксели прямо в сегмент разделяемой памяти, откуда они
+    одним вызовом cvtColor попадают в буфер вызывающего кода - без PIL и
+    промежуточных массивов.
+    """
+
+    name = "xshm"
+
+    def __init__(self, display_name=None):
+        x11_path = ctypes.util.find_library("X11")
+        xext_path = ctypes.util.find_library("Xext")
+        if not x11_path or not xext_path:
+            raise RuntimeError("Библиотеки X11/Xext не найдены")
+
+        self.x11 = ctypes.CDLL(x11_path)
+        self.xext = ctypes.CDLL(xext_path)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._declare_functions()
+
+        # Без собственного обработчика ошибка X завершает весь процесс
+        self.x_errors = 0
+        self._error_handler = _X_ERROR_HANDLER(self._on_x_error)
+        self.x11.XSetErrorHandler(self._error_handler)
+
+        name = display_name.encode() if display_name else None
+        self.display = self.x11.XOpenDisplay(name)
+        if not self.display:
+            raise RuntimeError("Не удается подключиться к X-серверу")
+        if not self.xext.XShmQueryExtension(self.display):
+            self.x11.XCloseDisplay(self.display)
+            raise RuntimeError("X-сервер не поддерживает MIT-SHM")
+
+        screen = self.x11.XDefaultScreen(self.display)
+        self.root = self.x11.XDefaultRootWindow(self.display)
+        self.visual = self.x11.XDefaultVisual(self.display, screen)
+        self.depth = self.x11.XDefaultDepth(self.display, screen)
+        self.screen_width = self.x11.XDisplayWidth(self.display, screen)
+        self.screen_height = self.x11.XDisplayHeight(self.display, screen)
+
+        self.lock = threading.Lock()
+        self.ximage = None
+        self.shminfo = None
+        self.capacity = (0, 0)
+
+    def _declare_functions(self):
+        x11, xext, libc = self.x11, self.xext, self.libc
+        x11.XOpenDisplay.restype = ctypes.c_void_p
+        x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        x11.XDefaultRootWindow.restype = ctypes.c_ulong
+        x11.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        x11.XDefaultVisual.restype = ctypes.c_void_p
+        x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+        x11.XSetErrorHandler.argtypes = [_X_ERROR_HANDLER]
+        x11.XSetErrorHandler.restype = ctypes.c_void_p
+
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo),
+            ctypes.c_uint, ctypes.c_uint]
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage),
+            ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+    def _on_x_error(self, display, event):
+        self.x_errors += 1
+        return 0
+
+    def _destroy_ximage(self, ximage):
+        # Данные принадлежат сегменту SHM, а obdata указывает на наш shminfo -
+        # XDestroyImage не должен освобождать ни то, ни другое
+        ximage.contents.data = None
+        ximage.contents.obdata = None
+        self.x11.XDestroyImage(ximage)
+
+    def _release_image(self):
+        if self.ximage is None:
+            return
+        self.xext.XShmDetach(self.display, ctypes.byref(self.shminfo))
+        self.x11.XSync(self.display, 0)
+        self._destroy_ximage(self.ximage)
+        self.libc.shmdt(self.shminfo.shmaddr)
+        self.ximage = None
+        self.shminfo = None
+        self.capacity = (0, 0)
+
+    def _ensure_image(self, w, h):
+        """Создает (или увеличивает) сегмент SHM под область w x h"""
+        cap_w, cap_h = self.capacity
+        if w <= cap_w and h <= cap_h:
+            return
+        self._release_image()
+        w, h = max(w, cap_w), max(h, cap_h)
+
+        shminfo = _XShmSegmentInfo()
+        ximage = self.xext.XShmCreateImage(
+            self.display, self.visual, self.depth, _ZPIXMAP, None,
+            ctypes.byref(shminfo), w, h)
+        if not ximage:
+            raise RuntimeError("XShmCreateImage завершился с ошибкой")
+        if ximage.contents.bits_per_pixel != 32:
+            self._destroy_ximage(ximage)
+            raise RuntimeError("Поддерживается только 32-битный формат пикселей")
+
+        size = ximage.contents.bytes_per_line * h
+        shmid = self.libc.shmget(_IPC_PRIVATE, size, _IPC_CREAT | 0o600)
+        if shmid < 0:
+            self._destroy_ximage(ximage)
+            raise OSError(ctypes.get_errno(), "shmget завершился с ошибкой")
+        addr = self.libc.shmat(shmid, None, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            self.libc.shmctl(shmid, _IPC_RMID, None)
+            self._destroy_ximage(ximage)
+            raise OSError(ctypes.get_errno(), "shmat завершился с ошибкой")
+
+        shminfo.shmid = shmid
+        shminfo.shmaddr = addr
+        shminfo.readOnly = 0
+        ximage.contents.data = addr
+        self.xext.XShmAttach(self.display, ctypes.byref(shminfo))
+        self.x11.XSync(self.display, 0)
+        # Сегмент удалится автоматически после отсоединения всех клиентов
+        self.libc.shmctl(shmid, _IPC_RMID, None)
+
+        self.ximage = ximage
+        self.shminfo = shminfo
+        self.capacity = (w, h)
+        self.pixels = np.ctypeslib.as_array(
+            (ctypes.c_ubyte * size).from_address(addr))
+
+    def grab_into(self, region, out):
+        x, y, w, h = (int(v) for v in region)
+
+        # Обрезаем область по границам экрана, остаток заполняем черным
+        cx0, cy0 = max(0, x), max(0, y)
+        cx1 = min(self.screen_width, x + w)
+        cy1 = min(self.screen_height, y + h)
+        if cx1 <= cx0 or cy1 <= cy0:
+            return False
+        cw, ch = cx1 - cx0, cy1 - cy0
+
+        with self.lock:
+            self._ensure_image(cw, ch)
+            # Сервер пишет строки с шагом width * 4, поэтому подгоняем размеры
+            # изображения под нужную область без пересоздания сегмента
+            image = self.ximage.contents
+            image.width, image.height = cw, ch
+            image.bytes_per_line = cw * 4
+            errors = self.x_errors
+            ok = self.xext.XShmGetImage(self.display, self.root, self.ximage,
+                                        cx0, cy0, _ALL_PLANES)
+            if not ok or self.x_errors != errors:
+                return False
+
+            bgra = self.pixels[:cw * ch * 4].reshape(ch, cw, 4)
+            code = cv2.COLOR_BGRA2GRAY if out.ndim == 2 else cv2.COLOR_BGRA2BGR
+            if (cw, ch) == (w, h):
+                cv2.cvtColor(bgra, code, dst=out)
+            else:
+                out[...] = 0
+                out[cy0 - y:cy0 - y + ch, cx0 - x:cx0 - x + cw] = cv2.cvtColor(bgra, code)
+        return True
+
+    def close(self):
+        with self.lock:
+            self._release_image()
+            if self.display:
+                self.x11.XCloseDisplay(self.display)
+                self.display = None
+
+
+class SyntheticBackend(CaptureBackend):
+    """Тестовый источник: виртуальный экран с шумным фоном и движущимися объектами.
+
+    Позволяет проверять конвейер без дисплея. objects - список
+    (x, y, w, h, dx, dy): начальная позиция, размер и скорость в пикселях за кадр.
+    pan - смещение всей картинки за кадр (имитация дрейфа камеры).
+    """
+
+    name = "synthetic"
+
+    def __init__(self, width=1920, height=1080, objects=None, pan=(0, 0), seed=0):
+        self.width = width
+        self.height = height
+        self.objects = list(objects) if objects is not None else [
+            (100, 100, 120, 160, 6, 3)]
+        self.pan = pan
+        self.frame_index = 0
+        self.lock = threading.Lock()
+
+        # Фон рисуем с запасом, чтобы панорамирование не выходило за края
+        rng = np.random.default_rng(seed)
+        noise = rng.integers(0, 256, (height // 8 + 1, width // 8 + 1, 3), dtype=np.uint8)
+        background = cv2.resize(noise, (width * 2, height * 2), interpolation=cv2.INTER_LINEAR)
+        self.background = cv2.GaussianBlur(background, (9, 9), 0)
+
+    def grab_into(self, region, out):
+        x, y, w, h = (int(v) for v in region)
+        with self.lock:
+            self.frame_index += 1
+            t = self.frame_index
+
+        # Смещение фона по кругу в пределах запаса
+        pan_x = (self.pan[0] * t) % self.width
+        pan_y = (self.pan[1] * t) % self.height
+        bx0 = min(max(0, x + pan_x), self.background.shape[1] - w)
+        by0 = min(max(0, y + pan_y), self.background.shape[0] - h)
+        crop = self.background[by0:by0 + h, bx0:bx0 + w]
+
+        if out.ndim == 2:
+            cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, dst=out)
+            color = 255
+        else:
+            np.copyto(out, crop)
+            color = (255, 255, 255)
+
+        for ox, oy, ow, oh, dx, dy in self.objects:
+            # Объекты живут в координатах фона и отражаются от краев экрана
+            px = _bounce(ox + dx * t, self.width - ow) - bx0
+            py = _bounce(oy + dy * t, self.height - oh) - by0
+            cv2.rectangle(out, (px, py), (px + ow, py + oh), color, -1)
+        return True
+
+
+def _bounce(value, limit):
+    if limit <= 0:
+        return 0
+    period = 2 * limit
+    value %= period
+    return value if value <= limit else period - value
+
+
+BACKENDS = {
+    "xshm": XShmBackend,
+    "pyautogui": PyAutoGuiBackend,
+    "synthetic": SyntheticBackend,
+}
+
+
+def create_backend(name="auto", **kwargs):
+    """Создает источник захвата по имени; 'auto' выбирает самый быстрый доступный"""
+    if name != "auto":
+        return BACKENDS[name](**kwargs)
+
+    if sys.platform.startswith("linux") and os.environ.get("DISPLAY"):
+        try:
+            return XShmBackend()
+        except Exception as e:
+            print(f"MIT-SHM недоступен ({e}), используем pyautogui")
+    return PyAutoGuiBackend()
@@ -0,0 +1,175 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from collections import deque
+
+# Флаги inotify (linux/inotify.h)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class ScreenshotIndex:
+    """Индекс папки скриншотов: количество и последние файлы за O(1).
+
+    Папка сканируется один раз при создании, дальше индекс обновляют
+    add()/remove() (например, из ScreenshotWriter.on_saved). С watch=True
+    внешние изменения отслеживаются через inotify, а там, где его нет, -
+    редким повторным сканированием раз в poll_interval секунд.
+    """
+
+    def __init__(self, directory, extensions=(".jpg",), recent_size=20,
+                 watch=False, poll_interval=30.0):
+        self.directory = directory
+        self.extensions = tuple(extensions)
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.names = set()
+        self.recent = deque(maxlen=recent_size)
+
+        self._stop_event = threading.Event()
+        self._watcher = None
+        self._inotify_fd = None
+
+        self.rescan()
+        if watch:
+            self.start_watcher()
+
+    def _matches(self, name):
+        return name.endswith(self.extensions)
+
+    def rescan(self):
+        """Полностью пересчитывает индекс по содержимому папки"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if self._matches(entry.name) and entry.is_file():
+                        entries.append((entry.stat().st_mtime, entry.name))
+        except OSError as e:
+            print(f"Ошибка сканирования папки скриншотов: {e}")
+            return
+
+        entries.sort()
+        with self.lock:
+            self.names = {name for _, name in entries}
+            self.recent.clear()
+            self.recent.extend(os.path.join(self.directory, name)
+                               for _, name in entries[-self.recent.maxlen:])
+
+    def add(self, path, size=None):
+        """Учитывает новый файл (подходит как колбэк ScreenshotWriter.on_saved)"""
+        name = os.path.basename(path)
+        if not self._matches(name):
+            return
+        with self.lock:
+            if name in self.names:
+                return
+            self.names.add(name)
+            self.recent.append(os.path.join(self.directory, name))
+
+    def remove(self, path):
+        """Учитывает удаление файла"""
+        name = os.path.basename(path)
+        with self.lock:
+            if name not in self.names:
+                return
+            self.names.discard(name)
+            full_path = os.path.join(self.directory, name)
+            if full_path in self.recent:
+                self.recent.remove(full_path)
+
+    @property
+    def count(self):
+        return len(self.names)
+
+    def recent_files(self):
+        """Последние файлы, от старых к новым"""
+        with self.lock:
+            return list(self.recent)
+
+    def start_watcher(self):
+        if self._watcher is not None:
+            return
+        self._stop_event.clear()
+        target = self._poll_loop
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify_fd = self._open_inotify()
+                target = self._inotify_loop
+            except OSError as e:
+                print(f"inotify недоступен ({e}), папка скриншотов будет пересканироваться")
+        self._watcher = threading.Thread(target=target, name="screenshot-index")
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def close(self):
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join(2.0)
+            self._watcher = None
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            self.rescan()
+
+    def _open_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        mask = (_IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_MOVED_FROM | _IN_DELETE |
+                _IN_DELETE_SELF | _IN_MOVE_SELF)
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, "inotify_add_watch")
+        return fd
+
+    def _inotify_loop(self):
+        fd = self._inotify_fd
+        while not self._stop_event.is_set():
+            # Короткий таймаут, чтобы вовремя заметить остановку
+            ready, _, _ = select.select([fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+
+                if mask & _IN_Q_OVERFLOW:
+                    # События потеряны - восстанавливаем индекс сканированием
+                    self.rescan()
+                elif mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                    self.rescan()
+                elif mask & _IN_ISDIR or not name:
+                    continue
+                elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                    self.add(name)
+                elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    self.remove(name)
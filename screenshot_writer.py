@@ -0,0 +1,234 @@
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+# Параметры кодирования для каждого формата
+ENCODERS = {
+    "jpg": cv2.IMWRITE_JPEG_QUALITY,
+    "png": cv2.IMWRITE_PNG_COMPRESSION,
+    "webp": cv2.IMWRITE_WEBP_QUALITY,
+}
+
+_STOP = object()
+
+
+class ScreenshotWriter:
+    """Фоновая запись скриншотов, чтобы диск не тормозил цикл детекции.
+
+    save() только копирует кадр в ограниченную очередь. Пул потоков кодирует
+    кадры (JPEG/PNG/WebP), отдельный поток пишет файлы и выполняет fsync
+    пачками: после fsync_batch файлов или раз в fsync_interval секунд.
+    При переполнении очереди кадр отбрасывается (policy="drop") или
+    save() ждет не дольше block_timeout секунд (policy="block").
+    Если передан metrics, время кодирования и записи каждого файла
+    попадает в его гистограммы этапов "imencode" и "imwrite".
+    """
+
+    def __init__(self, fmt="jpg", quality=90, encoder_threads=2, queue_size=16,
+                 fsync_batch=8, fsync_interval=2.0, policy="drop", block_timeout=0.5,
+                 on_saved=None, metrics=None):
+        if fmt not in ENCODERS:
+            raise ValueError(f"Неподдерживаемый формат: {fmt}")
+        self.fmt = fmt
+        self.quality = quality
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.on_saved = on_saved
+        self.metrics = metrics
+
+        self.encode_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue()
+        self.stats_lock = threading.Lock()
+
+        # Метрики очереди и записи
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.fsyncs = 0
+        self.max_depth = 0
+        self.encode_seconds = 0.0
+        self.write_seconds = 0.0
+        self.wait_seconds = 0.0
+
+        self.encoders = []
+        for i in range(encoder_threads):
+            thread = threading.Thread(target=self._encode_loop, name=f"screenshot-encoder-{i}")
+            thread.daemon = True
+            thread.start()
+            self.encoders.append(thread)
+        self.writer = threading.Thread(target=self._write_loop, name="screenshot-writer")
+        self.writer.daemon = True
+        self.writer.start()
+
+    @property
+    def extension(self):
+        return "." + self.fmt
+
+    def save(self, frame, directory, basename, copy=True):
+        """Ставит кадр в очередь записи как directory/basename.<формат>.
+
+        Возвращает путь будущего файла или None, если кадр отброшен.
+        """
+        path = os.path.join(directory, basename + self.extension)
+        job = (frame.copy() if copy else frame, path)
+        try:
+            if self.policy == "block":
+                started = time.perf_counter()
+                try:
+                    self.encode_queue.put(job, timeout=self.block_timeout)
+                finally:
+                    with self.stats_lock:
+                        self.wait_seconds += time.perf_counter() - started
+            else:
+                self.encode_queue.put_nowait(job)
+        except queue.Full:
+            with self.stats_lock:
+                self.dropped += 1
+            return None
+
+        with self.stats_lock:
+            self.queued += 1
+            self.max_depth = max(self.max_depth, self.encode_queue.qsize())
+        return path
+
+    def _encode_params(self):
+        if self.fmt == "png":
+            # Для PNG качество 0-100 переводим в степень сжатия 9-0
+            return [ENCODERS["png"], max(0, min(9, 9 - self.quality // 11))]
+        return [ENCODERS[self.fmt], int(self.quality)]
+
+    def _encode_loop(self):
+        while True:
+            job = self.encode_queue.get()
+            if job is _STOP:
+                return
+            frame, path = job
+            started = time.perf_counter()
+            ok, data = cv2.imencode(self.extension, frame, self._encode_params())
+            elapsed = time.perf_counter() - started
+            with self.stats_lock:
+                self.encode_seconds += elapsed
+            if self.metrics is not None:
+                self.metrics.observe("imencode", elapsed)
+            if ok:
+                self.write_queue.put((path, data))
+            else:
+                print(f"Ошибка кодирования скриншота: {path}")
+                with self.stats_lock:
+                    self.failed += 1
+            self.encode_queue.task_done()
+
+    def _write_loop(self):
+        pending = []  # Записанные файлы, ожидающие fsync
+        last_sync = time.time()
+        while True:
+            timeout = max(0.0, self.fsync_interval - (time.time() - last_sync)) if pending else None
+            try:
+                item = self.write_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._sync(pending)
+                return
+
+            if item is not None:
+                path, data = item
+                started = time.perf_counter()
+                try:
+                    # Пишем во временный файл и атомарно переименовываем, чтобы
+                    # никто не увидел недописанный скриншот
+                    temp_path = path + ".part"
+                    with open(temp_path, "wb") as f:
+                        f.write(data.tobytes())
+                    os.replace(temp_path, path)
+                    pending.append(path)
+                    with self.stats_lock:
+                        self.written += 1
+                        self.bytes_written += len(data)
+                    if self.on_saved is not None:
+                        self.on_saved(path, len(data))
+                except OSError as e:
+                    print(f"Ошибка записи скриншота {path}: {e}")
+                    with self.stats_lock:
+                        self.failed += 1
+                elapsed = time.perf_counter() - started
+                with self.stats_lock:
+                    self.write_seconds += elapsed
+                if self.metrics is not None:
+                    self.metrics.observe("imwrite", elapsed)
+                self.write_queue.task_done()
+
+            if pending and (len(pending) >= self.fsync_batch or
+                            time.time() - last_sync >= self.fsync_interval):
+                self._sync(pending)
+                pending = []
+                last_sync = time.time()
+
+    def _sync(self, pending):
+        """Сбрасывает на диск пачку файлов и их каталоги"""
+        if not pending:
+            return
+        started = time.perf_counter()
+        directories = set()
+        for path in pending:
+            try:
+                with open(path, "rb+") as f:
+                    os.fsync(f.fileno())
+            except OSError as e:
+                print(f"Ошибка fsync {path}: {e}")
+            directories.add(os.path.dirname(path) or ".")
+        for directory in directories:
+            # fsync каталога фиксирует переименования (недоступно на Windows)
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
+
+        with self.stats_lock:
+            self.fsyncs += 1
+            self.write_seconds += time.perf_counter() - started
+
+    def flush(self):
+        """Ждет, пока все поставленные в очередь кадры будут записаны"""
+        self.encode_queue.join()
+        self.write_queue.join()
+
+    def close(self):
+        """Дописывает очередь и останавливает потоки"""
+        self.flush()
+        for _ in self.encoders:
+            self.encode_queue.put(_STOP)
+        for thread in self.encoders:
+            thread.join()
+        self.write_queue.put(_STOP)
+        self.writer.join()
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "queued": self.queued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "depth": self.encode_queue.qsize(),
+                "max_depth": self.max_depth,
+                "bytes": self.bytes_written,
+                "fsyncs": self.fsyncs,
+                "encode_ms": 1000 * self.encode_seconds / max(1, self.queued),
+                "write_ms": 1000 * self.write_seconds / max(1, self.written),
+                "wait_ms": 1000 * self.wait_seconds,
+            }
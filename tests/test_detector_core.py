@@ -0,0 +1,63 @@
+import numpy as np
+
+from detector_core import DetectorConfig, MotionDetector, STABILIZING, ACTIVE
+from motion_prefilter import MotionPrefilter
+
+
+def scene(width=320, height=240, block=16, seed=0):
+    rng = np.random.default_rng(seed)
+    cells = rng.integers(0, 2, (height // block, width // block), dtype=np.uint8) * 255
+    gray = np.kron(cells, np.ones((block, block), np.uint8))
+    return np.dstack([gray] * 3)
+
+
+def stabilized(frame, **options):
+    detector = MotionDetector(DetectorConfig(stabilization_frames=5, **options))
+    for _ in range(6):
+        detector.detect(frame)
+    return detector
+
+
+def test_stabilization_then_motion_boxes():
+    frame = scene()
+    detector = MotionDetector(DetectorConfig(stabilization_frames=5))
+    assert detector.detect(frame) is None
+    assert detector.state == STABILIZING
+    for _ in range(10):
+        assert detector.detect(frame) is None
+    assert detector.state != STABILIZING
+
+    moving = frame.copy()
+    moving[80:160, 100:200] = 128
+    boxes, largest_area = detector.detect(moving)
+    assert detector.state == ACTIVE
+    x, y, w, h = boxes[0]
+    assert 90 <= x <= 110 and 70 <= y <= 90 and w >= 80 and h >= 60
+    assert largest_area > 0
+
+
+def test_two_shifts_before_frame_move_prefilter_by_their_sum():
+    wide = scene(width=400)
+    detector = stabilized(wide[:, :320])
+    previous = detector.prefilter.previous.copy()
+
+    # При scale 1/8 каждый сдвиг - ровно один пиксель кадра префильтра
+    detector.shift(8, 0)
+    detector.shift(8, 0)
+
+    expected = MotionPrefilter(scale=detector.prefilter.scale)
+    expected.previous = previous
+    expected.shift(16, 0)
+    assert np.array_equal(detector.prefilter.previous, expected.previous)
+    assert detector.pending_shift == (16, 0)
+
+
+def test_shifted_static_scene_is_not_motion():
+    wide = scene(width=400)
+    detector = stabilized(wide[:, :320])
+
+    detector.shift(8, 0)
+    detector.shift(8, 0)
+    assert detector.detect(wide[:, 16:336]) is None
+    assert detector.shifts_compensated == 1
+    assert detector.shift_resets == 0
@@ -0,0 +1,90 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+from event_recorder import EventRecorder
+
+# Шаг 1/8 секунды точно представим во float - границы предзаписи без погрешности
+FPS = 8
+
+
+def frame(index):
+    return np.full((48, 64, 3), 4 * index, np.uint8)
+
+
+def read_clip(path):
+    capture = cv2.VideoCapture(path)
+    levels = []
+    while True:
+        ok, image = capture.read()
+        if not ok:
+            break
+        levels.append(image.mean() / 4)
+    capture.release()
+    return levels
+
+
+def wait_buffered(recorder, timestamp, timeout=5.0):
+    # trigger() до обработки кадров отправил бы их в клип, а не в предзапись
+    deadline = time.time() + timeout
+    while not (recorder.ring and recorder.ring[-1][0] == timestamp):
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def record(tmp_path, indices, trigger_index, pre_roll=1.0, post_roll=1.0):
+    recorder = EventRecorder(fps=FPS, pre_roll=pre_roll, post_roll=post_roll, queue_size=256)
+    path = None
+    last = None
+    for i in indices:
+        timestamp = 100 + i / FPS
+        if path is None and i >= trigger_index:
+            wait_buffered(recorder, last)
+            path = recorder.trigger(str(tmp_path), "clip", timestamp)
+        assert recorder.push(frame(i), timestamp)
+        last = timestamp
+    recorder.close()
+    return recorder, path
+
+
+def test_clip_covers_pre_roll_and_post_roll(tmp_path):
+    # Движение в 102.0: предзапись с 100.875, дозапись до 103.0 включительно
+    recorder, path = record(tmp_path, range(50), trigger_index=16)
+
+    levels = read_clip(path)
+    assert len(levels) == 18
+    assert len(levels) / FPS == 2.25
+    # Кодек немного сдвигает яркость, но кадры идут по порядку, без повторов
+    assert np.all(np.diff(levels) > 0.5)
+    assert abs(levels[0] - 7) < 1 and abs(levels[-1] - 24) < 1
+    assert recorder.stats()["clips"] == 1
+    assert recorder.stats()["frames"] == 18
+    # Временная папка .recording не остается рядом с клипом
+    assert os.listdir(tmp_path) == ["clip.mp4"]
+
+
+def test_gap_in_capture_is_filled_with_repeats(tmp_path):
+    # Кадров 102.25-102.625 нет - клип все равно идет в реальном времени,
+    # пропуск заполняется повторами следующего кадра
+    indices = [i for i in range(50) if not 18 <= i <= 21]
+    recorder, path = record(tmp_path, indices, trigger_index=16)
+
+    levels = read_clip(path)
+    assert len(levels) == 18
+    assert np.ptp(levels[11:16]) < 0.1
+    assert abs(levels[11] - 22) < 1
+    assert np.all(np.diff(levels[:12]) > 0.5) and np.all(np.diff(levels[15:]) > 0.5)
+    assert recorder.stats()["frames"] == 18 - 4
+
+
+def test_frames_outside_event_stay_in_pre_roll_buffer(tmp_path):
+    recorder = EventRecorder(fps=FPS, pre_roll=0.5, queue_size=256)
+    for i in range(30):
+        recorder.push(frame(i), 100 + i / FPS)
+    recorder.close()
+
+    # В буфере - только последние pre_roll секунд
+    assert recorder.stats()["buffered"] == 5
+    assert recorder.stats()["clips"] == 0
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from frame_buffer import FrameRingBuffer, DROP_NEWEST, DROP_OLDEST
+
+
+def push(buffer, value):
+    slot = buffer.reserve()
+    if slot is None:
+        return False
+    index, out = slot
+    out[:] = value
+    buffer.commit(index)
+    return True
+
+
+def test_drop_oldest_keeps_newest_frames():
+    buffer = FrameRingBuffer(3, (2, 2), policy=DROP_OLDEST)
+    for value in range(1, 6):
+        assert push(buffer, value)
+
+    assert buffer.stats()["dropped"] == 2
+    frames = [int(buffer.get_next(timeout=0)[0][0, 0]) for _ in range(3)]
+    assert frames == [3, 4, 5]
+
+
+def test_drop_newest_rejects_frames_while_full():
+    buffer = FrameRingBuffer(3, (2, 2), policy=DROP_NEWEST)
+    results = [push(buffer, value) for value in range(1, 6)]
+
+    assert results == [True, True, True, False, False]
+    assert buffer.stats()["dropped"] == 2
+    frames = [int(buffer.get_next(timeout=0)[0][0, 0]) for _ in range(3)]
+    assert frames == [1, 2, 3]
+
+
+def test_get_latest_skips_older_frames_and_reuses_out():
+    buffer = FrameRingBuffer(4, (2, 2))
+    for value in range(1, 4):
+        push(buffer, value)
+    out = np.zeros((2, 2), np.uint8)
+
+    frame, seq, _, _ = buffer.get_latest(out, timeout=0)
+
+    assert frame is out
+    assert int(frame[0, 0]) == 3 and seq == 3
+    assert buffer.stats()["skipped"] == 2
+    assert buffer.get_latest(out, after_seq=seq, timeout=0) is None
+
+
+def test_release_returns_slot_without_publishing():
+    buffer = FrameRingBuffer(2, (2, 2))
+    index, _ = buffer.reserve()
+    buffer.release(index)
+
+    assert buffer.get_latest(timeout=0) is None
+    assert push(buffer, 7) and push(buffer, 8)
+    assert buffer.stats()["dropped"] == 0
+
+
+def test_commit_after_reallocation_is_ignored():
+    buffer = FrameRingBuffer(2, (2, 2))
+    index, _ = buffer.reserve()
+    buffer.ensure_shape((3, 3))
+    buffer.commit(index)
+
+    assert buffer.get_latest(timeout=0) is None
+    assert push(buffer, 1)
+    assert buffer.get_latest(timeout=0)[0].shape == (3, 3)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        FrameRingBuffer(1, (2, 2))
+    with pytest.raises(ValueError):
+        FrameRingBuffer(2, (2, 2), policy="random")
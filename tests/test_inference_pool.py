@@ -0,0 +1,80 @@
+import time
+
+from inference_pool import InferencePool, boxes_similar
+
+
+def wait_idle(pool, timeout=2.0):
+    deadline = time.time() + timeout
+    while pool.pending() and time.time() < deadline:
+        time.sleep(0.01)
+    assert not pool.pending()
+
+
+def run_job(pool, boxes, key=None):
+    """Отправляет задание и ждет его обработки"""
+    assert pool.submit(None, boxes, key=key)
+    wait_idle(pool)
+
+
+def test_boxes_similar_matches_by_iou():
+    assert boxes_similar([(0, 0, 10, 10)], [(1, 1, 10, 10)], 0.6)
+    assert not boxes_similar([(0, 0, 10, 10)], [(8, 8, 10, 10)], 0.6)
+    assert not boxes_similar([(0, 0, 10, 10)], [], 0.6)
+
+
+def test_lookup_returns_cached_result_for_similar_boxes():
+    pool = InferencePool(lambda frame, boxes: ["person"])
+    pool.start()
+    try:
+        run_job(pool, [(0, 0, 100, 100)])
+        assert pool.lookup([(2, 2, 100, 100)]) == ["person"]
+        assert pool.lookup([(300, 300, 100, 100)]) is None
+        assert pool.stats()["cache_hits"] == 1
+    finally:
+        pool.stop()
+
+
+def test_cache_is_separated_by_key():
+    pool = InferencePool(lambda frame, boxes: ["car"])
+    pool.start()
+    try:
+        run_job(pool, [(0, 0, 100, 100)], key="src0")
+        assert pool.lookup([(0, 0, 100, 100)], key="src0") == ["car"]
+        assert pool.lookup([(0, 0, 100, 100)], key="src1") is None
+    finally:
+        pool.stop()
+
+
+def test_cached_result_expires(monkeypatch):
+    pool = InferencePool(lambda frame, boxes: ["dog"], cache_ttl=2.0)
+    pool.start()
+    try:
+        run_job(pool, [(0, 0, 100, 100)])
+        stored = pool.cache[-1][3]
+        monkeypatch.setattr("inference_pool.time.time", lambda: stored + 3.0)
+        assert pool.lookup([(0, 0, 100, 100)]) is None
+    finally:
+        pool.stop()
+
+
+def test_failed_detection_is_not_cached():
+    calls = []
+
+    def detect(frame, boxes):
+        calls.append(boxes)
+        if len(calls) == 1:
+            return None
+        raise RuntimeError("сеть недоступна")
+
+    delivered = []
+    pool = InferencePool(detect, on_result=lambda *args: delivered.append(args))
+    pool.start()
+    try:
+        for _ in range(2):
+            run_job(pool, [(0, 0, 100, 100)])
+        assert len(calls) == 2
+        assert pool.lookup([(0, 0, 100, 100)]) is None
+        assert delivered == []
+        assert pool.stats()["completed"] == 0
+    finally:
+        pool.stop()
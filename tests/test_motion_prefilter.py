@@ -0,0 +1,68 @@
+import numpy as np
+
+from motion_prefilter import MotionPrefilter
+
+
+def scene(width=160, height=120, block=16, seed=0):
+    """Кадр из контрастных квадратов: сдвиг на пиксель заметен и после уменьшения"""
+    rng = np.random.default_rng(seed)
+    cells = rng.integers(0, 2, (height // block, width // block), dtype=np.uint8) * 255
+    return np.kron(cells, np.ones((block, block), np.uint8))
+
+
+def test_first_frame_wakes_pipeline():
+    prefilter = MotionPrefilter(scale=0.25)
+    assert prefilter.check(scene())
+
+
+def test_static_scene_sleeps_after_hold():
+    prefilter = MotionPrefilter(scale=0.25, hold_frames=2)
+    frame = scene()
+    results = [prefilter.check(frame) for _ in range(5)]
+
+    assert results == [True, True, True, False, False]
+    assert prefilter.last_ratio == 0.0
+
+
+def test_change_above_wake_ratio_wakes_pipeline():
+    prefilter = MotionPrefilter(scale=0.25, hold_frames=0, wake_ratio=0.01)
+    frame = scene()
+    prefilter.check(frame)
+    assert not prefilter.check(frame)
+
+    changed = frame.copy()
+    changed[:32, :32] = 255 - changed[:32, :32]
+    assert prefilter.check(changed)
+    assert prefilter.last_ratio >= 0.01
+    assert prefilter.woken == 1
+
+
+def test_size_change_restarts_comparison():
+    prefilter = MotionPrefilter(scale=0.25, hold_frames=0)
+    prefilter.check(scene())
+    prefilter.check(scene())
+
+    assert prefilter.check(scene(width=192))
+
+
+def test_background_due_every_interval():
+    prefilter = MotionPrefilter(background_interval=3)
+    assert [prefilter.background_due() for _ in range(6)] == [False, False, True] * 2
+
+
+def test_shift_aligns_previous_frame_with_moved_region():
+    wide = scene(width=240)
+    moved = wide[:, 8:168]
+
+    unshifted = MotionPrefilter(scale=0.25)
+    unshifted.check(wide[:, :160])
+    unshifted.check(moved)
+
+    prefilter = MotionPrefilter(scale=0.25)
+    prefilter.check(wide[:, :160])
+    prefilter.shift(8, 0)
+    prefilter.check(moved)
+
+    # Отличаться может только открывшаяся полоса справа (2 столбца из 40)
+    assert prefilter.last_ratio <= 2 / 40
+    assert prefilter.last_ratio < unshifted.last_ratio / 4
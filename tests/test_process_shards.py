@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from process_shards import SharedFrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(3, (4, 4))
+    yield ring
+    ring.close()
+
+
+def push(ring, value):
+    index, out = ring.reserve()
+    out[:] = value
+    ring.commit(index)
+
+
+def test_reader_in_another_mapping_sees_latest_frame(ring):
+    reader = SharedFrameRing.attach(ring.spec())
+    try:
+        push(ring, 1)
+        push(ring, 2)
+        frame, seq, _ = reader.get_latest()
+        assert seq == 2 and int(frame[0, 0]) == 2
+        assert reader.get_latest(after_seq=seq) is None
+    finally:
+        reader.close()
+
+
+def test_slot_being_written_is_not_read(ring):
+    push(ring, 1)
+    # Писатель зарезервировал слот кадра, который читатель считает последним
+    for _ in range(ring.capacity - 1):
+        push(ring, 5)
+    index, out = ring.reserve()
+    assert ring.slot_seq[index] == -1
+    ring.latest[0] = ring.capacity + 1
+
+    assert ring.get_latest() is None
+    assert ring.skipped == 1
+
+
+def test_frame_overwritten_during_copy_is_dropped(ring, monkeypatch):
+    push(ring, 1)
+    original = np.copyto
+
+    def copy_while_writer_runs(dst, src):
+        original(dst, src)
+        # Писатель успел обойти кольцо и занять тот же слот
+        for _ in range(ring.capacity - 1):
+            push(ring, 9)
+        ring.reserve()
+
+    monkeypatch.setattr("process_shards.np.copyto", copy_while_writer_runs)
+    assert ring.get_latest() is None
+    assert ring.skipped == 1
+
+
+def test_release_restores_previous_frame(ring):
+    push(ring, 1)
+    for _ in range(ring.capacity - 1):
+        push(ring, 2)
+    index, _ = ring.reserve()
+    ring.release(index)
+
+    frame, seq, _ = ring.get_latest()
+    assert seq == ring.capacity and int(frame[0, 0]) == 2
@@ -0,0 +1,81 @@
+from rate_controller import RateController
+
+
+def make_controller(**kwargs):
+    controller = RateController(active_fps=20, idle_fps=4, idle_after=5.0, **kwargs)
+    # Отсчет простоя - от движения в момент 100
+    controller.update(True, now=100.0)
+    return controller
+
+
+def test_switches_to_idle_after_quiet_period_and_back_on_motion():
+    controller = make_controller()
+    assert controller.update(False, now=105.0) == 20
+    assert controller.update(False, now=105.5) == 4
+    assert controller.update(False, now=106.0) == 4
+    assert controller.idle_switches == 1
+
+    assert controller.update(True, now=107.0) == 20
+    assert controller.update(False, now=112.5) == 4
+    assert controller.idle_switches == 2
+    assert controller.interval() == 0.25
+
+
+def test_slowest_stage_limits_pipelined_rate():
+    controller = make_controller()
+    controller.record("capture", 0.02)
+    controller.record("detect", 0.1)
+    assert controller.achievable_fps() == 10.0
+    assert controller.update(True, now=101.0) == 10.0
+    assert controller.shortfalls == 1
+
+    # В простое цель ниже достижимой - недобора нет
+    assert controller.update(False, now=110.0) == 4
+    assert controller.shortfalls == 1
+    assert controller.stats()["target_fps"] == 4
+
+
+def test_stages_add_up_without_pipelining():
+    controller = make_controller(pipelined=False)
+    controller.record("capture", 0.05)
+    controller.record("detect", 0.075)
+    assert controller.update(True, now=101.0) == 8.0
+    assert controller.stats()["achievable_fps"] == 8.0
+
+
+def test_stage_time_is_smoothed():
+    controller = make_controller(smoothing=0.25)
+    controller.record("detect", 0.1)
+    controller.record("detect", 0.5)
+    controller.record("detect", None)
+    assert controller.stats()["stage_ms"] == {"detect": 200.0}
+
+
+def test_rate_does_not_fall_below_minimum():
+    controller = make_controller(min_fps=2)
+    controller.record("detect", 2.0)
+    assert controller.update(True, now=101.0) == 2
+    assert controller.shortfalls == 1
+
+
+def test_shortfall_is_reported_once_per_interval(capsys):
+    controller = make_controller(report_interval=10.0)
+    controller.record("detect", 0.1)
+    for now in (101.0, 105.0, 110.0):
+        controller.update(True, now=now)
+    assert controller.shortfalls == 3
+    assert capsys.readouterr().out.count("Не удается выдержать 20") == 1
+
+    controller.update(True, now=110.5)
+    assert capsys.readouterr().out == ""
+    controller.update(True, now=111.0)
+    assert "detect 100.0 мс" in capsys.readouterr().out
+
+
+def test_reset_forgets_stage_times():
+    controller = make_controller()
+    controller.record("detect", 1.0)
+    controller.update(False, now=110.0)
+    controller.reset()
+    assert controller.achievable_fps() is None
+    assert controller.fps == controller.target_fps == 20
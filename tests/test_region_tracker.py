@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+import pytest
+
+from region_tracker import create_tracker
+
+TEMPLATE_X, TEMPLATE_Y = 150, 100
+SHIFT_X, SHIFT_Y = 17, -11
+
+
+def textured_frame(shape=(480, 640), seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, shape, dtype=np.uint8)
+    frame = cv2.GaussianBlur(noise, (0, 0), 2)
+    return cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX)
+
+
+@pytest.fixture
+def scene():
+    frame = textured_frame()
+    template = frame[TEMPLATE_Y:TEMPLATE_Y + 200, TEMPLATE_X:TEMPLATE_X + 256].copy()
+    # Вся сцена сдвинута на известное смещение (камера или область захвата сместились)
+    shifted = np.roll(frame, (SHIFT_Y, SHIFT_X), axis=(0, 1))
+    return template, shifted
+
+
+@pytest.mark.parametrize("name, kwargs, tolerance", [
+    ("pyramid", {}, 0),
+    ("orb", {}, 0),
+    ("phase", {"work_size": 256}, 0),
+    # Уменьшенный вдвое шаблон дает точность в пиксель уменьшенного изображения
+    ("phase", {}, 1),
+])
+def test_tracker_finds_shifted_template(scene, name, kwargs, tolerance):
+    template, shifted = scene
+    tracker = create_tracker(name, **kwargs)
+    tracker.set_template(template)
+
+    x, y, confidence, scale = tracker.locate(shifted, prior=(TEMPLATE_X, TEMPLATE_Y))
+    assert abs(x - (TEMPLATE_X + SHIFT_X)) <= tolerance
+    assert abs(y - (TEMPLATE_Y + SHIFT_Y)) <= tolerance
+    # Со сдвигом на пиксель корреляция размытого шума заметно ниже
+    assert confidence > (0.95 if tolerance == 0 else 0.8)
+    assert scale == pytest.approx(1.0, abs=0.01)
+    assert tracker.stats()["searches"] == 1
+
+
+@pytest.mark.parametrize("name", ["pyramid", "orb"])
+def test_tracker_finds_template_without_prior(scene, name):
+    template, shifted = scene
+    tracker = create_tracker(name)
+    tracker.set_template(template)
+
+    x, y, _, _ = tracker.locate(shifted)
+    assert (x, y) == (TEMPLATE_X + SHIFT_X, TEMPLATE_Y + SHIFT_Y)
+
+
+def test_pyramid_uses_prior_window_for_small_moves(scene):
+    template, shifted = scene
+    tracker = create_tracker("pyramid")
+    tracker.set_template(template)
+
+    found = (TEMPLATE_X + SHIFT_X, TEMPLATE_Y + SHIFT_Y)
+    assert tracker.locate(shifted, prior=(found[0] - 2, found[1] + 3))[:2] == found
+    assert tracker.stats()["prior_hits"] == 1
+    assert tracker.stats()["coarse_searches"] == 0
+
+
+def test_tracker_fails_on_unrelated_frame(scene):
+    template, _ = scene
+    tracker = create_tracker("orb")
+    tracker.set_template(template)
+
+    assert tracker.locate(textured_frame(seed=1)) is None
+    assert tracker.stats()["failures"] == 1
+
+
+def test_search_smaller_than_template_is_rejected(scene):
+    template, shifted = scene
+    for name in ("pyramid", "phase"):
+        tracker = create_tracker(name)
+        tracker.set_template(template)
+        assert tracker.locate(shifted[:100, :100]) is None
@@ -0,0 +1,112 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from screenshot_writer import ScreenshotWriter
+
+
+def frames(count, shape=(48, 64, 3)):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+
+def test_frames_are_written_and_decode(tmp_path):
+    saved = []
+    writer = ScreenshotWriter(fmt="png", on_saved=lambda path, size: saved.append(path))
+    images = frames(5)
+    paths = [writer.save(image, str(tmp_path), f"shot_{i}") for i, image in enumerate(images)]
+    writer.close()
+
+    assert sorted(saved) == sorted(paths)
+    for image, path in zip(images, paths):
+        assert path.endswith(".png")
+        assert np.array_equal(cv2.imread(path), image)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+    stats = writer.stats()
+    assert stats["written"] == 5 and stats["failed"] == 0
+
+
+def test_jpeg_frames_decode_with_same_size(tmp_path):
+    writer = ScreenshotWriter(fmt="jpg", quality=80)
+    path = writer.save(frames(1)[0], str(tmp_path), "shot")
+    writer.close()
+
+    assert cv2.imread(path).shape == (48, 64, 3)
+    assert os.listdir(tmp_path) == ["shot.jpg"]
+
+
+def test_save_copies_frame(tmp_path):
+    writer = ScreenshotWriter(fmt="png")
+    image = frames(1)[0]
+    expected = image.copy()
+    path = writer.save(image, str(tmp_path), "shot")
+    image[:] = 0
+    writer.close()
+
+    assert np.array_equal(cv2.imread(path), expected)
+
+
+def test_fsync_in_batches(tmp_path):
+    writer = ScreenshotWriter(fmt="png", fsync_batch=2, fsync_interval=60.0)
+    for i, image in enumerate(frames(5)):
+        writer.save(image, str(tmp_path), f"shot_{i}")
+    writer.close()
+
+    # Две полные пачки и остаток при закрытии
+    assert writer.stats()["fsyncs"] == 3
+
+
+@pytest.fixture
+def blocked_encoder(monkeypatch):
+    """Кодировщик ждет разрешения, чтобы очередь заполнилась предсказуемо"""
+    release = threading.Event()
+    started = threading.Event()
+    encode = cv2.imencode
+
+    def slow_imencode(*args, **kwargs):
+        started.set()
+        release.wait(5.0)
+        return encode(*args, **kwargs)
+
+    monkeypatch.setattr("screenshot_writer.cv2.imencode", slow_imencode)
+    return started, release
+
+
+def test_drop_policy_rejects_frames_when_queue_is_full(tmp_path, blocked_encoder):
+    started, release = blocked_encoder
+    writer = ScreenshotWriter(fmt="png", encoder_threads=1, queue_size=2, policy="drop")
+    images = frames(4)
+    assert writer.save(images[0], str(tmp_path), "shot_0")
+    started.wait(5.0)
+    assert writer.save(images[1], str(tmp_path), "shot_1")
+    assert writer.save(images[2], str(tmp_path), "shot_2")
+    assert writer.save(images[3], str(tmp_path), "shot_3") is None
+
+    release.set()
+    writer.close()
+    assert sorted(os.listdir(tmp_path)) == ["shot_0.png", "shot_1.png", "shot_2.png"]
+    assert writer.stats()["dropped"] == 1
+
+
+def test_block_policy_waits_then_gives_up(tmp_path, blocked_encoder):
+    started, release = blocked_encoder
+    writer = ScreenshotWriter(fmt="png", encoder_threads=1, queue_size=1, policy="block",
+                              block_timeout=0.05)
+    images = frames(3)
+    writer.save(images[0], str(tmp_path), "shot_0")
+    started.wait(5.0)
+    writer.save(images[1], str(tmp_path), "shot_1")
+    assert writer.save(images[2], str(tmp_path), "shot_2") is None
+
+    release.set()
+    writer.close()
+    stats = writer.stats()
+    assert stats["dropped"] == 1 and stats["wait_ms"] >= 40
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        ScreenshotWriter(fmt="bmp")
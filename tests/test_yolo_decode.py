@@ -0,0 +1,58 @@
+import numpy as np
+
+from yolo_detector import decode_outputs
+
+CLASSES = 3
+
+
+def detection(cx, cy, w, h, class_id, confidence):
+    """Строка выхода YOLO: центр и размер в долях входа, objectness, оценки классов"""
+    row = np.zeros(5 + CLASSES, np.float32)
+    row[:5] = cx, cy, w, h, 1.0
+    row[5 + class_id] = confidence
+    return row
+
+
+def outputs(*per_roi):
+    """Выход одного слоя в форме (число ROI, строки, 5 + классы)"""
+    return [np.stack([np.stack(rows) for rows in per_roi])]
+
+
+def test_boxes_are_mapped_from_roi_to_frame_coordinates():
+    rois = [(100, 50, 200, 100), (400, 300, 80, 160)]
+    outs = outputs(
+        [detection(0.5, 0.5, 0.25, 0.5, 0, 0.9), detection(0.1, 0.1, 0.1, 0.1, 1, 0.1)],
+        [detection(0.25, 0.75, 0.5, 0.25, 2, 0.8), detection(0.9, 0.9, 0.1, 0.1, 1, 0.2)],
+    )
+
+    boxes, confidences, class_ids = decode_outputs(outs, rois, 0.5)
+
+    found = {int(c): (box.tolist(), float(conf))
+             for box, conf, c in zip(boxes, confidences, class_ids)}
+    # ROI 0: ширина 50, высота 50, центр (200, 100) -> левый верхний угол (175, 75)
+    assert found[0][0] == [175, 75, 50, 50]
+    assert abs(found[0][1] - 0.9) < 1e-6
+    # ROI 1: ширина 40, высота 40, центр (420, 420) -> (400, 400)
+    assert found[2][0] == [400, 400, 40, 40]
+    assert len(found) == 2
+
+
+def test_class_filter_is_applied_before_nms():
+    rois = [(0, 0, 100, 100)]
+    # Две почти совпадающие рамки: без фильтра NMS оставил бы более уверенную
+    outs = outputs([detection(0.5, 0.5, 0.4, 0.4, 1, 0.9),
+                    detection(0.5, 0.5, 0.42, 0.42, 0, 0.7)])
+
+    boxes, _, class_ids = decode_outputs(outs, rois, 0.5, class_filter=np.array([0]))
+
+    assert class_ids.tolist() == [0]
+    assert boxes.shape == (1, 4)
+
+
+def test_no_detections_returns_empty_arrays():
+    outs = outputs([detection(0.5, 0.5, 0.2, 0.2, 0, 0.3)])
+
+    boxes, confidences, class_ids = decode_outputs(outs, [(0, 0, 100, 100)], 0.5)
+
+    assert boxes.shape == (0, 4)
+    assert len(confidences) == 0 and len(class_ids) == 0
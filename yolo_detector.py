@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Бэкенды OpenCV DNN, доступные движку
+DNN_BACKENDS = {
+    "opencv": cv2.dnn.DNN_BACKEND_OPENCV,
+    "openvino": cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE,
+}
+
+# Цели вычислений на CPU для каждой точности (int8 - квантованная сеть на FP32-цели)
+PRECISION_TARGETS = {
+    "fp32": cv2.dnn.DNN_TARGET_CPU,
+    "fp16": getattr(cv2.dnn, "DNN_TARGET_CPU_FP16", None),
+    "int8": cv2.dnn.DNN_TARGET_CPU,
+}
+
+INPUT_SIZES = (320, 416, 608)
+
+
+def merge_motion_boxes(boxes, frame_shape, padding=32, min_size=96):
+    """Объединяет области движения в прямоугольники интереса (ROI).
+
+    Каждая область расширяется на padding, дополняется до квадрата не меньше
+    min_size (сеть принимает квадратный вход), пересекающиеся ROI сливаются.
+    Возвращает список (x, y, w, h) в координатах кадра.
+    """
+    height, width = frame_shape[:2]
+    rois = []
+    for x, y, w, h in boxes:
+        side = max(w + 2 * padding, h + 2 * padding, min_size)
+        center_x = x + w / 2
+        center_y = y + h / 2
+        rois.append([int(center_x - side / 2), int(center_y - side / 2),
+                     int(center_x + side / 2), int(center_y + side / 2)])
+
+    # Сливаем пересекающиеся ROI, пока есть что сливать
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rois[i] = [min(a[0], b[0]), min(a[1], b[1]),
+                               max(a[2], b[2]), max(a[3], b[3])]
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    result = []
+    for x0, y0, x1, y1 in rois:
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(width, x1), min(height, y1)
+        if x1 > x0 and y1 > y0:
+            result.append((x0, y0, x1 - x0, y1 - y0))
+    return result
+
+
+def select_rois(boxes, frame_shape, padding=32, min_size=96, max_rois=4, max_coverage=0.6):
+    """Возвращает ROI для распознавания или None, если выгоднее весь кадр.
+
+    Каждый ROI - отдельный вход сети, поэтому при большом числе ROI или
+    когда они покрывают почти весь кадр, один проход по кадру дешевле.
+    """
+    if not boxes:
+        return None
+    rois = merge_motion_boxes(boxes, frame_shape, padding, min_size)
+    if not rois or len(rois) > max_rois:
+        return None
+    frame_area = frame_shape[0] * frame_shape[1]
+    if sum(w * h for _, _, w, h in rois) > max_coverage * frame_area:
+        return None
+    return rois
+
+
+def forward_rois(net, output_layers, frame, rois, input_size=(416, 416)):
+    """Прогоняет все ROI через сеть одним батчем.
+
+    Возвращает выходы слоев в форме (число ROI, строки, 5 + классы).
+    """
+    crops = [frame[y:y + h, x:x + w] for x, y, w, h in rois]
+    blob = cv2.dnn.blobFromImages(crops, 0.00392, input_size, (0, 0, 0), True, crop=False)
+    net.setInput(blob)
+    outs = net.forward(output_layers)
+    # При батче из одного изображения слой YOLO возвращает двумерный массив
+    return [out.reshape(len(rois), -1, out.shape[-1]) for out in outs]
+
+
+def decode_outputs(outs, rois, min_confidence, class_filter=None, nms_threshold=0.4):
+    """Векторно декодирует выходы YOLO и применяет NMS.
+
+    outs - выходы forward_rois, rois - участки кадра, на которых они получены.
+    class_filter - массив допустимых id классов (None - все классы); фильтр
+    применяется до NMS. Возвращает (boxes Nx4 int, confidences N, class_ids N).
+    """
+    roi_array = np.asarray(rois, dtype=np.float32)
+    all_boxes, all_confidences, all_class_ids = [], [], []
+
+    for out in outs:
+        scores = out[:, :, 5:]
+        class_ids = scores.argmax(axis=2)
+        confidences = np.take_along_axis(scores, class_ids[..., None], axis=2)[..., 0]
+
+        mask = confidences > min_confidence
+        if class_filter is not None:
+            mask &= np.isin(class_ids, class_filter)
+        if not mask.any():
+            continue
+
+        # Координаты в долях ROI переводим в пиксели кадра
+        roi_index, _ = np.nonzero(mask)
+        detections = out[mask]
+        roi = roi_array[roi_index]
+        w = detections[:, 2] * roi[:, 2]
+        h = detections[:, 3] * roi[:, 3]
+        x = roi[:, 0] + detections[:, 0] * roi[:, 2] - w / 2
+        y = roi[:, 1] + detections[:, 1] * roi[:, 3] - h / 2
+
+        all_boxes.append(np.stack([x, y, w, h], axis=1))
+        all_confidences.append(confidences[mask])
+        all_class_ids.append(class_ids[mask])
+
+    if not all_boxes:
+        return np.empty((0, 4), dtype=int), np.empty(0, dtype=np.float32), np.empty(0, dtype=int)
+
+    boxes = np.concatenate(all_boxes).astype(int)
+    confidences = np.concatenate(all_confidences).astype(np.float32)
+    class_ids = np.concatenate(all_class_ids)
+
+    # Non-maximum suppression для устранения дубликатов
+    keep = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), min_confidence, nms_threshold)
+    keep = np.asarray(keep, dtype=int).reshape(-1)
+    return boxes[keep], confidences[keep], class_ids[keep]
+
+
+def available_configs():
+    """Возвращает пары (бэкенд, точность), поддерживаемые текущей сборкой OpenCV"""
+    configs = []
+    for backend, backend_id in DNN_BACKENDS.items():
+        try:
+            targets = set(cv2.dnn.getAvailableTargets(backend_id))
+        except cv2.error:
+            continue
+        for precision, target in PRECISION_TARGETS.items():
+            if target is None or target not in targets:
+                continue
+            # Квантование OpenCV работает только со своим бэкендом
+            if precision == "int8" and backend != "opencv":
+                continue
+            configs.append((backend, precision))
+    return configs
+
+
+class YoloEngine:
+    """Движок YOLO: бэкенд, точность, размер входа и число потоков OpenCV DNN"""
+
+    def __init__(self, weights, cfg, backend="opencv", precision="fp32",
+                 input_size=416, threads=0, calibration_frames=None):
+        self.weights = weights
+        self.cfg = cfg
+        self.lock = threading.Lock()
+        self.net = None
+        self.configure(backend, precision, input_size, threads, calibration_frames)
+
+    def configure(self, backend="opencv", precision="fp32", input_size=416,
+                  threads=0, calibration_frames=None):
+        """Загружает сеть с заданной конфигурацией (можно вызывать на ходу)"""
+        if backend not in DNN_BACKENDS:
+            raise ValueError(f"Неизвестный бэкенд: {backend}")
+        if (backend, precision) not in available_configs():
+            raise RuntimeError(f"Конфигурация {backend}/{precision} недоступна в этой сборке OpenCV")
+        if input_size % 32 != 0:
+            raise ValueError("Размер входа YOLO должен быть кратен 32")
+
+        net = cv2.dnn.readNet(self.weights, self.cfg)
+        net.setPreferableBackend(DNN_BACKENDS[backend])
+        net.setPreferableTarget(PRECISION_TARGETS[precision])
+        if precision == "int8":
+            net = self._quantize(net, input_size, calibration_frames)
+
+        layer_names = net.getLayerNames()
+        output_layers = [layer_names[i - 1] for i in np.asarray(net.getUnconnectedOutLayers()).reshape(-1)]
+
+        # Число потоков OpenCV общее для всего процесса; 0 - значение по умолчанию
+        cv2.setNumThreads(threads if threads else -1)
+
+        with self.lock:
+            self.net = net
+            self.output_layers = output_layers
+            self.backend = backend
+            self.precision = precision
+            self.input_size = input_size
+            self.threads = threads
+
+    def _quantize(self, net, input_size, calibration_frames):
+        """Квантует сеть в INT8 по калибровочным кадрам"""
+        if not calibration_frames:
+            calibration_frames = [_synthetic_frame()]
+        calibration = [
+            cv2.dnn.blobFromImage(frame, 0.00392, (input_size, input_size), (0, 0, 0), True, crop=False)
+            for frame in calibration_frames
+        ]
+        return net.quantize(calibration, cv2.CV_32F, cv2.CV_32F)
+
+    def forward(self, frame, rois):
+        """Прогоняет ROI кадра через сеть (см. forward_rois)"""
+        with self.lock:
+            size = (self.input_size, self.input_size)
+            return forward_rois(self.net, self.output_layers, frame, rois, size)
+
+    def benchmark(self, frame=None, runs=5):
+        """Возвращает среднее время одного прохода по кадру в секундах"""
+        if frame is None:
+            frame = _synthetic_frame()
+        rois = [(0, 0, frame.shape[1], frame.shape[0])]
+        self.forward(frame, rois)  # Прогрев: первый проход включает инициализацию
+        started = time.perf_counter()
+        for _ in range(runs):
+            self.forward(frame, rois)
+        return (time.perf_counter() - started) / runs
+
+    def settings(self):
+        """Конфигурация движка в виде аргументов YoloEngine"""
+        return {"backend": self.backend, "precision": self.precision,
+                "input_size": self.input_size, "threads": self.threads}
+
+    def describe(self):
+        threads = self.threads or cv2.getNumThreads()
+        return f"{self.backend}/{self.precision}, вход {self.input_size}, потоков {threads}"
+
+
+def _synthetic_frame(width=640, height=480):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def autotune(weights, cfg, input_sizes=(416,), latency_budget=None, sample_frame=None,
+             runs=3, calibration_frames=None):
+    """Подбирает самую быструю конфигурацию движка на текущей машине.
+
+    Перебирает доступные бэкенды, точности и число потоков для каждого
+    размера входа. Без latency_budget выбирается самый большой размер входа
+    (точность важнее), с бюджетом - самый большой размер, укладывающийся в
+    него. Возвращает (движок, [(конфигурация, секунды), ...]).
+    """
+    cpu_count = os.cpu_count() or 1
+    thread_options = sorted({0, max(1, cpu_count // 2)})
+
+    results = []
+    for input_size in input_sizes:
+        for backend, precision in available_configs():
+            for threads in thread_options:
+                config = {"backend": backend, "precision": precision,
+                          "input_size": input_size, "threads": threads}
+                try:
+                    engine = YoloEngine(weights, cfg, calibration_frames=calibration_frames, **config)
+                    seconds = engine.benchmark(sample_frame, runs)
+                except Exception as e:
+                    print(f"Конфигурация {config} пропущена: {e}")
+                    continue
+                results.append((config, seconds))
+
+    if not results:
+        raise RuntimeError("Ни одна конфигурация движка YOLO не запустилась")
+
+    candidates = results
+    if latency_budget is not None:
+        fitting = [item for item in results if item[1] <= latency_budget]
+        candidates = fitting or [min(results, key=lambda item: item[1])]
+    best_size = max(config["input_size"] for config, _ in candidates)
+    best_config, _ = min((item for item in candidates if item[0]["input_size"] == best_size),
+                         key=lambda item: item[1])
+
+    engine = YoloEngine(weights, cfg, calibration_frames=calibration_frames, **best_config)
+    return engine, results